@@ -0,0 +1,274 @@
+import importlib.util
+import os
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from xcube_smos.mldataset.chunkcache import DEFAULT_VARIANT
+from xcube_smos.mldataset.chunkcache import DiskCacheBackend
+from xcube_smos.mldataset.chunkcache import MemoryCacheBackend
+from xcube_smos.mldataset.chunkcache import RedisCacheBackend
+from xcube_smos.mldataset.chunkcache import SmosChunkCache
+from xcube_smos.mldataset.chunkcache import get_chunk_cache_variant
+from xcube_smos.mldataset.l2cube import SmosTimeStepLoader
+from xcube_smos.mldataset.newdgg import new_dgg
+from ..catalog.simple import SmosSimpleCatalog
+from .test_l2cube import SM_PATHS
+
+HAS_FAKEREDIS = importlib.util.find_spec("fakeredis") is not None
+
+
+class MemoryCacheBackendTest(unittest.TestCase):
+    def test_get_put(self):
+        backend = MemoryCacheBackend(max_bytes=10)
+        self.assertIsNone(backend.get("a/b"))
+        backend.put("a/b", b"12345")
+        backend.put("a/c", b"123")
+        self.assertEqual(b"12345", backend.get("a/b"))
+        # Exceeds max_bytes, drops "a/c"
+        backend.put("a/d", b"1234")
+        self.assertIsNone(backend.get("a/c"))
+        self.assertEqual(b"1234", backend.get("a/d"))
+
+    def test_serializable(self):
+        backend = MemoryCacheBackend(max_bytes=10)
+        backend.put("a/b", b"12345")
+        backend2 = pickle.loads(pickle.dumps(backend))
+        self.assertEqual(10, backend2.max_bytes)
+        # Values are process-local
+        self.assertIsNone(backend2.get("a/b"))
+
+
+class DiskCacheBackendTest(unittest.TestCase):
+    def test_get_put(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backend = DiskCacheBackend(temp_dir)
+            self.assertIsNone(backend.get("a/b"))
+            backend.put("a/b", b"12345")
+            self.assertEqual(Path(temp_dir) / "a" / "b", backend.get_path("a/b"))
+            self.assertEqual(["b"], [p.name for p in (Path(temp_dir) / "a").iterdir()])
+            self.assertEqual(b"12345", backend.get("a/b"))
+            backend2 = pickle.loads(pickle.dumps(backend))
+            self.assertEqual(b"12345", backend2.get("a/b"))
+
+    def test_max_bytes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backend = DiskCacheBackend(temp_dir, max_bytes=10)
+            backend.put("a/b", b"12345")
+            backend.put("a/c", b"123")
+            self.assertEqual(b"12345", backend.get("a/b"))
+            # Exceeds max_bytes, evicts least recently used "a/c"
+            backend.put("a/d", b"1234")
+            self.assertIsNone(backend.get("a/c"))
+            self.assertFalse(backend.get_path("a/c").exists())
+            self.assertEqual(b"12345", backend.get("a/b"))
+            self.assertEqual(b"1234", backend.get("a/d"))
+            self.assertEqual(9, backend.cache_dir.stats["nbytes"])
+
+            backend2 = pickle.loads(pickle.dumps(backend))
+            self.assertEqual(10, backend2.max_bytes)
+            self.assertEqual(b"1234", backend2.get("a/d"))
+
+    def test_get_does_not_write_index(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backend = DiskCacheBackend(temp_dir, max_bytes=100)
+            backend.put("a/b", b"12345")
+            index_path = backend.cache_dir.index_path
+            mtime = os.stat(index_path).st_mtime_ns
+            for _ in range(10):
+                self.assertEqual(b"12345", backend.get("a/b"))
+                self.assertIsNone(backend.get("a/c"))
+            self.assertEqual(mtime, os.stat(index_path).st_mtime_ns)
+            # Hits are written along with the next change
+            self.assertEqual(10, backend.cache_dir.stats["hits"])
+            self.assertEqual(0, backend.cache_dir.stats["misses"])
+
+    def test_unbounded(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backend = DiskCacheBackend(temp_dir)
+            self.assertIsNone(backend.max_bytes)
+            self.assertIsNone(backend.cache_dir)
+            backend.put("a/b", b"12345")
+            # No index is written
+            self.assertEqual(["a"], [p.name for p in Path(temp_dir).iterdir()])
+
+
+class RedisCacheBackendTest(unittest.TestCase):
+    def test_url_or_client_required(self):
+        with self.assertRaises(ValueError):
+            RedisCacheBackend()
+
+    def test_serializable(self):
+        backend = RedisCacheBackend("redis://localhost:6379/0", ttl=60)
+        backend2 = pickle.loads(pickle.dumps(backend))
+        self.assertEqual("redis://localhost:6379/0", backend2.url)
+        self.assertEqual(60, backend2.ttl)
+        with self.assertRaises(RuntimeError):
+            pickle.dumps(RedisCacheBackend(client=object()))
+
+    @unittest.skipUnless(HAS_FAKEREDIS, "fakeredis not installed")
+    def test_get_put(self):
+        import fakeredis
+
+        client = fakeredis.FakeRedis()
+        backend = RedisCacheBackend(client=client, key_prefix="test/")
+        self.assertIsNone(backend.get("a/b"))
+        backend.put("a/b", b"12345")
+        self.assertEqual(b"12345", backend.get("a/b"))
+        self.assertEqual(b"12345", client.get("test/a/b"))
+
+        cache = SmosChunkCache(backend)
+        array = np.arange(12, dtype=np.float32).reshape((1, 3, 4))
+        cache.put_chunk("P.nc", 2, "Chi_2", (0, 3, 4, 8), array)
+        np.testing.assert_array_equal(
+            array, cache.get_chunk("P.nc", 2, "Chi_2", (0, 3, 4, 8))
+        )
+
+
+class SmosChunkCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name) / "chunks"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_get_put(self):
+        cache = SmosChunkCache(self.root)
+        self.assertEqual(DEFAULT_VARIANT, cache.variant)
+        bounds = (0, 60, 128, 256)
+        self.assertIsNone(cache.get_chunk("P.nc", 4, "Soil_Moisture", bounds))
+
+        array = np.full((1, 60, 128), np.nan, dtype=np.float32)
+        array[0, 10:20, 30:40] = 0.25
+        cache.put_chunk("P.nc", 4, "Soil_Moisture", bounds, array)
+        key = cache.get_chunk_key("P.nc", 4, "Soil_Moisture", bounds)
+        self.assertEqual("v1/default/P.nc/4/Soil_Moisture/0-60-128-256", key)
+        self.assertIsInstance(cache.backend, DiskCacheBackend)
+        path = cache.backend.get_path(key)
+        self.assertEqual(
+            self.root
+            / "v1"
+            / "default"
+            / "P.nc"
+            / "4"
+            / "Soil_Moisture"
+            / "0-60-128-256",
+            path,
+        )
+        self.assertTrue(path.is_file())
+        self.assertEqual([path], list(path.parent.iterdir()))
+
+        cached_array = cache.get_chunk("P.nc", 4, "Soil_Moisture", bounds)
+        self.assertEqual(np.float32, cached_array.dtype)
+        np.testing.assert_array_equal(array, cached_array)
+        # Other keys are not affected
+        self.assertIsNone(cache.get_chunk("P.nc", 3, "Soil_Moisture", bounds))
+        self.assertIsNone(cache.get_chunk("P.nc", 4, "Chi_2", bounds))
+
+    def test_memory_backend(self):
+        cache = SmosChunkCache(MemoryCacheBackend(max_bytes=1024**2))
+        bounds = (0, 60, 128, 256)
+        array = np.ones((1, 60, 128), dtype=np.float32)
+        cache.put_chunk("P.nc", 4, "Soil_Moisture", bounds, array)
+        np.testing.assert_array_equal(
+            array, cache.get_chunk("P.nc", 4, "Soil_Moisture", bounds)
+        )
+
+    def test_empty_marker(self):
+        cache = SmosChunkCache(self.root)
+        bounds = (0, 60, 0, 128)
+        cache.put_chunk("P.nc", 4, "Chi_2", bounds, np.empty(0, dtype=np.uint8))
+        marker = cache.get_chunk("P.nc", 4, "Chi_2", bounds)
+        self.assertEqual((0,), marker.shape)
+
+    def test_serializable(self):
+        cache = SmosChunkCache(self.root, variant="abc")
+        cache2 = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(cache.backend.root, cache2.backend.root)
+        self.assertEqual("abc", cache2.variant)
+
+    def test_get_chunk_cache_variant(self):
+        self.assertEqual(DEFAULT_VARIANT, get_chunk_cache_variant())
+        self.assertEqual(
+            DEFAULT_VARIANT, get_chunk_cache_variant(mask_rules=None, mapping_mode=None)
+        )
+        variant = get_chunk_cache_variant(
+            mask_rules={"Chi_2_P": {"min": 0.05}}, mapping_mode="index"
+        )
+        self.assertEqual(16, len(variant))
+        self.assertEqual(
+            variant,
+            get_chunk_cache_variant(
+                mapping_mode="index", mask_rules={"Chi_2_P": {"min": 0.05}}
+            ),
+        )
+        self.assertNotEqual(
+            variant,
+            get_chunk_cache_variant(
+                mask_rules={"Chi_2_P": {"min": 0.05}}, mapping_mode="sparse"
+            ),
+        )
+        self.assertNotEqual(variant, get_chunk_cache_variant(mapping_mode="index"))
+
+    def test_load_time_step(self):
+        opened_paths = []
+
+        def open_dataset(path: str, **kwargs):
+            opened_paths.append(path)
+            return SmosSimpleCatalog.open_dataset(path, **kwargs)
+
+        def new_time_step_loader():
+            return SmosTimeStepLoader(
+                dgg,
+                open_dataset,
+                {},
+                SM_PATHS,
+                0,
+                chunk_cache=SmosChunkCache(self.root),
+            )
+
+        dgg = new_dgg()
+        array_info = {"name": "Soil_Moisture"}
+        # Chunks of region (20:90, 0:256)
+        region = slice(20, 90), slice(0, 256)
+        chunk_info = {
+            "index": (0, 0, 0),
+            "shape": (1, 40, 128),
+            "slices": (slice(0, 1), slice(0, 40), slice(0, 128)),
+        }
+        empty_chunk_info = {
+            "index": (0, 1, 0),
+            "shape": (1, 30, 128),
+            "slices": (slice(0, 1), slice(40, 70), slice(0, 128)),
+        }
+
+        time_step_loader = new_time_step_loader()
+        values = time_step_loader.load_time_step(
+            4, array_info, chunk_info, region=region
+        )
+        with self.assertRaises(KeyError):
+            time_step_loader.load_time_step(
+                4, array_info, empty_chunk_info, region=region
+            )
+        self.assertEqual(1, len(opened_paths))
+        product_dir = self.root / "v1" / "default" / Path(SM_PATHS[0]).name / "4"
+        self.assertEqual(
+            ["20-60-0-128", "60-90-0-128"],
+            sorted(p.name for p in (product_dir / "Soil_Moisture").iterdir()),
+        )
+
+        # New loader, e.g., after restart, reads chunks from cache
+        time_step_loader = new_time_step_loader()
+        np.testing.assert_array_equal(
+            values,
+            time_step_loader.load_time_step(4, array_info, chunk_info, region=region),
+        )
+        with self.assertRaises(KeyError):
+            time_step_loader.load_time_step(
+                4, array_info, empty_chunk_info, region=region
+            )
+        self.assertEqual(1, len(opened_paths))
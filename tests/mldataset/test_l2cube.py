@@ -0,0 +1,1197 @@
+import unittest
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+import zarr
+from xcube.core.zarrstore import GenericArray
+
+from xcube_smos.constants import SM_VAR_NAMES
+from xcube_smos.mldataset.dgg import SmosDiscreteGlobalGrid
+from xcube_smos.mldataset.l2cube import MAPPING_MODES
+from xcube_smos.mldataset.l2cube import STATS_NAMES
+from xcube_smos.mldataset.l2cube import SmosL2Cube
+from xcube_smos.mldataset.l2cube import SmosL2CubeZarrStore
+from xcube_smos.mldataset.l2cube import SmosL2Product
+from xcube_smos.mldataset.l2cube import SmosL2ProductConsumption
+from xcube_smos.mldataset.l2cube import SmosMappedL2Product
+from xcube_smos.mldataset.l2cube import SmosTimeStepLoader
+from xcube_smos.mldataset.l2cube import compute_l2_footprint
+from xcube_smos.mldataset.l2cube import compute_l2_mask
+from xcube_smos.mldataset.l2cube import compute_seqnum_extents
+from xcube_smos.mldataset.l2cube import compute_weighted_stats
+from xcube_smos.mldataset.l2cube import crop_footprint
+from xcube_smos.mldataset.l2cube import get_bbox_region
+from xcube_smos.mldataset.l2cube import get_bbox_seqnum_mask
+from xcube_smos.mldataset.l2cube import get_dataset_spatial_subset
+from xcube_smos.mldataset.l2cube import has_grid_point_id_range_coverage
+from xcube_smos.mldataset.l2cube import has_seqnum_coverage
+from xcube_smos.mldataset.l2cube import ingest_grid_point_ids
+from xcube_smos.mldataset.l2cube import is_global_bbox
+from xcube_smos.mldataset.l2cube import map_l2_products_vars
+from xcube_smos.mldataset.l2cube import map_l2_values
+from xcube_smos.mldataset.l2cube import map_l2_values_multi
+from xcube_smos.mldataset.l2cube import map_seqnum_to_l2_index
+from xcube_smos.mldataset.l2cube import seqnum_to_index
+from xcube_smos.mldataset.newdgg import new_dgg
+from ..catalog.simple import SmosSimpleCatalog
+
+SM_PATHS = sorted(
+    str(p)
+    for p in (Path(__file__).parent / ".." / ".." / "testdata" / "SM").glob("*.nc")
+)
+
+
+class MapL2ValuesTest(unittest.TestCase):
+    index_2d = np.array(
+        [
+            [0, 1, 5, 5],
+            [2, 3, 4, 5],
+            [5, 5, 1, 0],
+        ],
+        dtype=np.uint32,
+    )
+    missing_index = 5
+
+    def test_map_l2_values(self):
+        var_data = np.array([0.1, 0.2, 0.3, 0.4, 0.5], dtype=np.float32)
+        mapped_values = map_l2_values(
+            self.index_2d, var_data, self.missing_index, -999.0
+        )
+        self.assertEqual(np.float32, mapped_values.dtype)
+        np.testing.assert_equal(
+            mapped_values,
+            np.array(
+                [
+                    [0.1, 0.2, -999.0, -999.0],
+                    [0.3, 0.4, 0.5, -999.0],
+                    [-999.0, -999.0, 0.2, 0.1],
+                ],
+                dtype=np.float32,
+            ),
+        )
+
+    def test_map_l2_values_preserves_dtype(self):
+        var_data = np.array([1, 2, 3, 4, 5], dtype=np.dtype(">i2"))
+        mapped_values = map_l2_values(self.index_2d, var_data, self.missing_index, -1)
+        self.assertEqual(np.int16, mapped_values.dtype)
+        np.testing.assert_equal(
+            mapped_values,
+            np.array(
+                [
+                    [1, 2, -1, -1],
+                    [3, 4, 5, -1],
+                    [-1, -1, 2, 1],
+                ],
+                dtype=np.int16,
+            ),
+        )
+
+    def test_map_l2_values_parallel(self):
+        var_data = np.array([0.1, 0.2, 0.3, 0.4, 0.5], dtype=np.float32)
+        np.testing.assert_equal(
+            map_l2_values(
+                self.index_2d, var_data, self.missing_index, np.nan, parallel=True
+            ),
+            map_l2_values(self.index_2d, var_data, self.missing_index, np.nan),
+        )
+
+    def test_map_l2_values_multi(self):
+        var_data_2d = np.array(
+            [
+                [10, 20, 30, 40, 50],
+                [11, 21, 31, 41, 51],
+            ],
+            dtype=np.int16,
+        )
+        fill_values = np.array([-1, 0], dtype=np.int16)
+        mapped_values = map_l2_values_multi(
+            self.index_2d, var_data_2d, self.missing_index, fill_values
+        )
+        self.assertEqual(np.int16, mapped_values.dtype)
+        self.assertEqual((2, 3, 4), mapped_values.shape)
+        for k in range(2):
+            np.testing.assert_equal(
+                mapped_values[k],
+                map_l2_values(
+                    self.index_2d,
+                    var_data_2d[k],
+                    self.missing_index,
+                    fill_values[k],
+                ),
+            )
+
+    def test_map_l2_values_multi_with_seqnum_to_index(self):
+        var_data_2d = np.array([[0.1, 0.2, 0.3, 0.4, 0.5]], dtype=np.float32)
+        fill_values = np.array([np.nan], dtype=np.float32)
+        # seqnum raster and table that resolve to self.index_2d
+        seqnum_2d = self.index_2d + 100
+        seqnum_to_index = np.full(106, self.missing_index, dtype=np.uint32)
+        seqnum_to_index[100:105] = np.arange(5)
+        mapped_values = map_l2_values_multi(
+            seqnum_2d,
+            var_data_2d,
+            self.missing_index,
+            fill_values,
+            seqnum_to_index,
+        )
+        np.testing.assert_equal(
+            mapped_values,
+            map_l2_values_multi(
+                self.index_2d, var_data_2d, self.missing_index, fill_values
+            ),
+        )
+
+    def test_map_l2_values_multi_parallel(self):
+        var_data_2d = np.array(
+            [
+                [10, 20, 30, 40, 50],
+                [11, 21, 31, 41, 51],
+            ],
+            dtype=np.int32,
+        )
+        fill_values = np.array([-1, 0], dtype=np.int32)
+        footprint = np.array([[0, 4], [1, 3], [2, 3]], dtype=np.int32)
+        for kwargs in (dict(), dict(footprint=footprint)):
+            np.testing.assert_equal(
+                map_l2_values_multi(
+                    self.index_2d,
+                    var_data_2d,
+                    self.missing_index,
+                    fill_values,
+                    parallel=True,
+                    **kwargs,
+                ),
+                map_l2_values_multi(
+                    self.index_2d,
+                    var_data_2d,
+                    self.missing_index,
+                    fill_values,
+                    **kwargs,
+                ),
+            )
+
+    def test_map_l2_values_multi_out(self):
+        var_data_2d = np.array([[0.1, 0.2, 0.3, 0.4, 0.5]], dtype=np.float64)
+        fill_values = np.array([np.nan], dtype=np.float64)
+        out = np.empty((1, 3, 4), dtype=np.float64)
+        mapped_values = map_l2_values_multi(
+            self.index_2d, var_data_2d, self.missing_index, fill_values, out=out
+        )
+        self.assertIs(out, mapped_values)
+        np.testing.assert_equal(
+            out[0],
+            map_l2_values(self.index_2d, var_data_2d[0], self.missing_index, np.nan),
+        )
+        with self.assertRaises(ValueError):
+            map_l2_values_multi(
+                self.index_2d,
+                var_data_2d,
+                self.missing_index,
+                fill_values,
+                out=np.empty((1, 3, 4), dtype=np.float32),
+            )
+
+    def test_map_l2_values_multi_empty(self):
+        mapped_values = map_l2_values_multi(
+            np.zeros((0, 0), dtype=np.uint32),
+            np.zeros((3, 0), dtype=np.float32),
+            0,
+            np.zeros(3, dtype=np.float32),
+        )
+        self.assertEqual((3, 0, 0), mapped_values.shape)
+
+    def test_map_l2_values_multi_with_footprint(self):
+        var_data_2d = np.array([[0.1, 0.2, 0.3, 0.4, 0.5]], dtype=np.float32)
+        fill_values = np.array([-999.0], dtype=np.float32)
+        footprint = np.array([[0, 1], [1, 3], [0, 0]], dtype=np.int32)
+        mapped_values = map_l2_values_multi(
+            self.index_2d,
+            var_data_2d,
+            self.missing_index,
+            fill_values,
+            footprint=footprint,
+        )
+        np.testing.assert_equal(
+            mapped_values,
+            np.array(
+                [
+                    [
+                        [0.1, -999.0, -999.0, -999.0],
+                        [-999.0, 0.4, 0.5, -999.0],
+                        [-999.0, -999.0, -999.0, -999.0],
+                    ]
+                ],
+                dtype=np.float32,
+            ),
+        )
+
+
+class FootprintTest(unittest.TestCase):
+    seqnum_2d = np.array(
+        [
+            [1, 1, 2, 2],
+            [3, 3, 4, 4],
+            [3, 3, 5, 5],
+        ],
+        dtype=np.uint32,
+    )
+
+    def test_compute_seqnum_extents(self):
+        extents = compute_seqnum_extents(self.seqnum_2d, 7)
+        self.assertEqual((7, 4), extents.shape)
+        np.testing.assert_equal(extents[1], [0, 0, 0, 1])
+        np.testing.assert_equal(extents[3], [1, 2, 0, 1])
+        np.testing.assert_equal(extents[5], [2, 2, 2, 3])
+        # not in raster
+        self.assertGreater(extents[0, 0], extents[0, 1])
+        self.assertGreater(extents[6, 0], extents[6, 1])
+
+    def test_compute_l2_footprint(self):
+        extents = compute_seqnum_extents(self.seqnum_2d, 7)
+        footprint = compute_l2_footprint(
+            np.array([2, 5, 6], dtype=np.uint32), extents, 3
+        )
+        np.testing.assert_equal(footprint, [[2, 4], [0, 0], [2, 4]])
+        footprint = compute_l2_footprint(np.array([3, 2], dtype=np.uint32), extents, 3)
+        np.testing.assert_equal(footprint, [[2, 4], [0, 2], [0, 2]])
+
+    def test_map_seqnum_to_l2_index_with_footprint(self):
+        seqnum_to_index = np.array([9, 0, 1, 2, 3, 4, 9], dtype=np.uint32)
+        footprint = np.array([[2, 4], [0, 0], [0, 3]], dtype=np.int32)
+        index_2d = map_seqnum_to_l2_index(self.seqnum_2d, seqnum_to_index, footprint, 9)
+        np.testing.assert_equal(
+            index_2d,
+            [
+                [9, 9, 1, 1],
+                [9, 9, 9, 9],
+                [2, 2, 4, 9],
+            ],
+        )
+        np.testing.assert_equal(
+            map_seqnum_to_l2_index(self.seqnum_2d, seqnum_to_index),
+            seqnum_to_index[self.seqnum_2d],
+        )
+
+    def test_map_seqnum_to_l2_index_parallel(self):
+        seqnum_to_index = np.array([9, 0, 1, 2, 3, 4, 9], dtype=np.uint32)
+        footprint = np.array([[2, 4], [0, 0], [0, 3]], dtype=np.int32)
+        for args in ((), (footprint, 9)):
+            np.testing.assert_equal(
+                map_seqnum_to_l2_index(
+                    self.seqnum_2d, seqnum_to_index, *args, parallel=True
+                ),
+                map_seqnum_to_l2_index(self.seqnum_2d, seqnum_to_index, *args),
+            )
+
+
+class SeqnumToIndexTest(unittest.TestCase):
+    def test_seqnum_to_index(self):
+        seqnum = np.array([4, 1, 6], dtype=np.uint32)
+        expected = np.array([3, 1, 3, 3, 0, 3, 2, 3], dtype=np.uint32)
+        for parallel in (False, True):
+            index = seqnum_to_index(seqnum, 8, 3, parallel=parallel)
+            self.assertEqual(np.uint32, index.dtype)
+            np.testing.assert_equal(index, expected)
+
+    def test_crop_footprint(self):
+        footprint = np.array([[2, 4], [0, 0], [0, 3], [5, 9]], dtype=np.int32)
+        np.testing.assert_equal(
+            crop_footprint(footprint, 1, 4), [[1, 3], [0, 0], [0, 2], [0, 0]]
+        )
+        np.testing.assert_equal(
+            crop_footprint(footprint, 3, 8), [[0, 1], [0, 0], [0, 0], [2, 5]]
+        )
+
+
+class IngestGridPointIdsTest(unittest.TestCase):
+    def test_ok(self):
+        grid_point_id = np.array([3, 1000001, 9262086, 999999], dtype=np.uint32)
+        l2_seqnum, l2_seqnum_to_index = ingest_grid_point_ids(grid_point_id)
+        self.assertEqual(np.uint32, l2_seqnum.dtype)
+        np.testing.assert_equal(
+            l2_seqnum, SmosDiscreteGlobalGrid.grid_point_id_to_seqnum(grid_point_id)
+        )
+        np.testing.assert_equal(
+            l2_seqnum_to_index,
+            seqnum_to_index(l2_seqnum, SmosDiscreteGlobalGrid.MAX_SEQNUM + 1, 4),
+        )
+
+    def test_out_of_range(self):
+        with self.assertRaisesRegex(
+            ValueError,
+            "Grid point ID 0 at index 1 is out of range,"
+            " its seqnum 0 is not in the range 1 to 2621442",
+        ):
+            ingest_grid_point_ids(np.array([5, 0, 7], dtype=np.uint32))
+
+    def test_duplicate(self):
+        with self.assertRaisesRegex(
+            ValueError, "Duplicate grid point ID 7 at indexes 1 and 3"
+        ):
+            ingest_grid_point_ids(np.array([5, 7, 9, 7], dtype=np.uint32))
+
+
+class ComputeWeightedStatsTest(unittest.TestCase):
+    def test_stats(self):
+        stats = compute_weighted_stats(
+            np.array([2, 0, 4, 6, 8], dtype=np.uint8),
+            np.array([1, 3, 2, 0, 1], dtype=np.int32),
+            np.array(0, dtype=np.uint8),
+            0.5,
+            1.0,
+        )
+        # Decoded valid values 2, 3, 3, 5
+        np.testing.assert_almost_equal(np.array([4.0, 2.0, 5.0, 13 / 4, 47.0]), stats)
+
+    def test_no_valid_values(self):
+        stats = compute_weighted_stats(
+            np.array([np.nan, -999.0, 0.5], dtype=np.float32),
+            np.array([1, 3, 0], dtype=np.int32),
+            np.array(-999.0, dtype=np.float32),
+            1.0,
+            0.0,
+        )
+        self.assertEqual(0.0, stats[0])
+        self.assertTrue(np.all(np.isnan(stats[1:])))
+
+
+class ComputeL2MaskTest(unittest.TestCase):
+    l2_dataset = xr.Dataset(
+        dict(
+            Grid_Point_ID=xr.DataArray(
+                np.array([1, 2, 3, 4, 5], dtype=np.uint32), dims="n"
+            ),
+            Chi_2_P=xr.DataArray(
+                np.array([0, 10, 100, 200, 255], dtype=np.uint8),
+                dims="n",
+                attrs=dict(scale_factor=0.01),
+            ),
+            RFI_Prob=xr.DataArray(
+                np.array([0.1, np.nan, 0.2, 0.3, 0.05], dtype=np.float32),
+                dims="n",
+            ),
+        )
+    )
+    l2_fill_values = dict(Grid_Point_ID=0, Chi_2_P=0, RFI_Prob=-999.0)
+
+    def test_min_max(self):
+        l2_mask = compute_l2_mask(
+            self.l2_dataset,
+            {"Chi_2_P": {"min": 0.05}, "RFI_Prob": {"max": 0.25}},
+            self.l2_fill_values,
+        )
+        np.testing.assert_equal(np.array([False, False, True, False, True]), l2_mask)
+
+    def test_fill_values_only(self):
+        l2_mask = compute_l2_mask(self.l2_dataset, {"Chi_2_P": {}}, self.l2_fill_values)
+        np.testing.assert_equal(np.array([False, True, True, True, True]), l2_mask)
+
+    def test_invalid_rules(self):
+        with self.assertRaisesRegex(ValueError, "Variable 'Chi_2' of quality mask"):
+            compute_l2_mask(
+                self.l2_dataset, {"Chi_2": {"max": 0.5}}, self.l2_fill_values
+            )
+        with self.assertRaisesRegex(ValueError, "Invalid keys .* 'Chi_2_P': lo"):
+            compute_l2_mask(
+                self.l2_dataset, {"Chi_2_P": {"lo": 0.5}}, self.l2_fill_values
+            )
+
+
+class SmosMappedL2ProductTest(unittest.TestCase):
+    dgg = new_dgg()
+
+    def open_l2_product(self, mapping_mode: str) -> SmosL2Product:
+        l2_dataset = SmosSimpleCatalog.open_dataset(SM_PATHS[0])
+        return SmosL2Product(self.dgg, l2_dataset, mapping_mode=mapping_mode)
+
+    def test_map_l2_vars_window(self):
+        for mapping_mode in MAPPING_MODES:
+            l2_product = self.open_l2_product(mapping_mode)
+            var_names = [
+                n for n in l2_product.l2_dataset.data_vars if n in SM_VAR_NAMES
+            ]
+            mapped_l2_product = l2_product.get_mapped_s2_product(4)
+            self.assertEqual((252, 512), mapped_l2_product.shape)
+            mapped_l2_vars = mapped_l2_product.map_l2_vars(var_names)
+            window = slice(100, 200), slice(384, 512)
+            mapped_l2_window_vars = mapped_l2_product.map_l2_vars(
+                var_names, window=window
+            )
+            for var_name in var_names:
+                mapped_l2_window_values = mapped_l2_window_vars[var_name]
+                self.assertEqual((1, 100, 128), mapped_l2_window_values.shape)
+                np.testing.assert_equal(
+                    mapped_l2_window_values,
+                    mapped_l2_vars[var_name][(slice(None), *window)],
+                )
+                np.testing.assert_equal(
+                    mapped_l2_window_values,
+                    mapped_l2_product.map_l2_var(var_name, window=window),
+                )
+
+    def test_get_mapped_s2_product_region(self):
+        for mapping_mode in MAPPING_MODES:
+            l2_product = self.open_l2_product(mapping_mode)
+            var_names = [
+                n for n in l2_product.l2_dataset.data_vars if n in SM_VAR_NAMES
+            ]
+            mapped_l2_product = l2_product.get_mapped_s2_product(4)
+            region = slice(50, 150), slice(300, 450)
+            mapped_l2_region_product = l2_product.get_mapped_s2_product(
+                4, region=region
+            )
+            self.assertIsNot(mapped_l2_product, mapped_l2_region_product)
+            self.assertIs(
+                mapped_l2_region_product,
+                l2_product.get_mapped_s2_product(4, region=region),
+            )
+            self.assertEqual((100, 150), mapped_l2_region_product.shape)
+            mapped_l2_vars = mapped_l2_product.map_l2_vars(var_names)
+            mapped_l2_region_vars = mapped_l2_region_product.map_l2_vars(var_names)
+            for var_name in var_names:
+                np.testing.assert_equal(
+                    mapped_l2_region_vars[var_name],
+                    mapped_l2_vars[var_name][(slice(None), *region)],
+                )
+
+    def test_compute_l2_var_stats(self):
+        l2_product = self.open_l2_product("compact")
+        for region in (None, (slice(20, 150), slice(0, 300))):
+            mapped_l2_product = l2_product.get_mapped_s2_product(4, region=region)
+            for var_name in ("Soil_Moisture", "Chi_2"):
+                l2_var = l2_product.l2_dataset[var_name]
+                values = mapped_l2_product.map_l2_var(var_name)
+                values = values[values != l2_product.l2_fill_values[var_name]]
+                values = values * l2_var.attrs.get("scale_factor", 1.0)
+                stats = mapped_l2_product.compute_l2_var_stats(var_name)
+                self.assertEqual((len(STATS_NAMES),), stats.shape)
+                self.assertEqual(values.size, stats[0])
+                self.assertTrue(values.size > 0)
+                np.testing.assert_allclose(
+                    np.array(
+                        [
+                            values.min(),
+                            values.max(),
+                            values.mean(),
+                            np.sum(np.square(values, dtype=np.float64)),
+                        ]
+                    ),
+                    stats[1:],
+                    rtol=1e-6,
+                )
+
+    def test_mask_rules(self):
+        mask_rules = {"Chi_2_P": {"min": 0.5}, "RFI_Prob": {"max": 0.2}}
+        var_names = ["Soil_Moisture", "Chi_2", "N_RFI_X"]
+        expected_l2_vars = None
+        for mapping_mode in MAPPING_MODES:
+            l2_dataset = SmosSimpleCatalog.open_dataset(SM_PATHS[0])
+            l2_product = SmosL2Product(
+                self.dgg, l2_dataset, mapping_mode=mapping_mode, mask_rules=mask_rules
+            )
+            l2_mask = l2_product.l2_mask
+            self.assertTrue(np.any(l2_mask))
+            self.assertFalse(np.all(l2_mask))
+            mapped_l2_vars = l2_product.get_mapped_s2_product(4).map_l2_vars(var_names)
+            if expected_l2_vars is None:
+                # Mask the mapped L2 values as users would do
+                unmasked_l2_product = self.open_l2_product(mapping_mode)
+                unmasked_l2_vars = unmasked_l2_product.get_mapped_s2_product(
+                    4
+                ).map_l2_vars(var_names + ["Chi_2_P", "RFI_Prob"])
+                chi_2_p = unmasked_l2_vars["Chi_2_P"]
+                rfi_prob = unmasked_l2_vars["RFI_Prob"]
+                chi_2_p_attrs = l2_dataset.Chi_2_P.attrs
+                rfi_prob_attrs = l2_dataset.RFI_Prob.attrs
+                valid = (
+                    (chi_2_p != chi_2_p_attrs["_FillValue"])
+                    & (chi_2_p * chi_2_p_attrs["scale_factor"] >= 0.5)
+                    & (rfi_prob != rfi_prob_attrs["_FillValue"])
+                    & (rfi_prob * rfi_prob_attrs["scale_factor"] <= 0.2)
+                )
+                expected_l2_vars = {
+                    var_name: np.where(
+                        valid,
+                        unmasked_l2_vars[var_name],
+                        l2_product.l2_fill_values[var_name],
+                    )
+                    for var_name in var_names
+                }
+            for var_name in var_names:
+                self.assertEqual(
+                    expected_l2_vars[var_name].dtype, mapped_l2_vars[var_name].dtype
+                )
+                np.testing.assert_equal(
+                    mapped_l2_vars[var_name], expected_l2_vars[var_name]
+                )
+
+    def test_is_window_empty(self):
+        l2_product = self.open_l2_product("index")
+        mapped_l2_product = l2_product.get_mapped_s2_product(4)
+        self.assertFalse(mapped_l2_product.is_window_empty())
+        self.assertFalse(
+            mapped_l2_product.is_window_empty((slice(20, 60), slice(0, 128)))
+        )
+        empty_window = slice(90, 130), slice(100, 512)
+        self.assertTrue(mapped_l2_product.is_window_empty(empty_window))
+        for var_name in ("Soil_Moisture", "Chi_2"):
+            np.testing.assert_equal(
+                mapped_l2_product.map_l2_var(var_name, window=empty_window),
+                l2_product.l2_fill_values[var_name],
+            )
+
+    def test_load_l2_product_is_single_flight(self):
+        opened_paths = []
+
+        def open_dataset(path: str, **kwargs):
+            opened_paths.append(path)
+            return SmosSimpleCatalog.open_dataset(path, **kwargs)
+
+        # Product cache disabled
+        time_step_loader = SmosTimeStepLoader(self.dgg, open_dataset, {}, SM_PATHS, 0)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            l2_products = list(
+                executor.map(time_step_loader.load_l2_product, [0, 1, 0, 1, 0, 1])
+            )
+        self.assertEqual(2, len(opened_paths))
+        self.assertEqual(2, len({id(p) for p in l2_products}))
+        self.assertIs(l2_products[0], time_step_loader.load_l2_product(0))
+        self.assertEqual(2, len(opened_paths))
+
+    def test_load_time_step_consumption(self):
+        opened_paths = []
+
+        def open_dataset(path: str, **kwargs):
+            opened_paths.append(path)
+            return SmosSimpleCatalog.open_dataset(path, **kwargs)
+
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg,
+            open_dataset,
+            {},
+            SM_PATHS,
+            0,
+            l2_product_cache_mode="consumption",
+        )
+        # Two variables with one chunk each
+        time_step_loader.set_num_time_step_requests(4, 2)
+        chunk_info = {
+            "index": (0, 0, 0),
+            "shape": (1, 60, 128),
+            "slices": (slice(0, 1), slice(0, 60), slice(0, 128)),
+        }
+        consumption = time_step_loader.l2_product_consumption
+
+        time_step_loader.load_time_step(4, {"name": "Soil_Moisture"}, chunk_info)
+        self.assertEqual(1, consumption.size)
+        l2_product = consumption.get(0)
+        self.assertIsNotNone(l2_product)
+
+        time_step_loader.load_time_step(4, {"name": "Chi_2"}, chunk_info)
+        # All chunks consumed, product is disposed
+        self.assertEqual(0, consumption.size)
+        self.assertEqual(0, l2_product.mapped_l2_product_cache.size)
+        self.assertEqual(1, len(opened_paths))
+
+        # Next round
+        time_step_loader.load_time_step(4, {"name": "Soil_Moisture"}, chunk_info)
+        self.assertEqual(1, consumption.size)
+        self.assertEqual(2, len(opened_paths))
+
+    def test_l2_product_cache_bytes(self):
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg,
+            SmosSimpleCatalog.open_dataset,
+            {},
+            SM_PATHS,
+            0,
+            l2_product_cache_bytes=1024**3,
+        )
+        cache = time_step_loader.l2_product_cache
+        self.assertEqual(1024**3, cache.max_bytes)
+        self.assertEqual(len(SM_PATHS), cache.max_size)
+
+        l2_product = time_step_loader.load_l2_product(0)
+        nbytes = cache.nbytes
+        self.assertEqual(l2_product.nbytes, nbytes)
+        self.assertGreater(nbytes, l2_product.l2_dataset.nbytes)
+        l2_product.get_mapped_s2_product(4).map_l2_var("Soil_Moisture")
+        self.assertIs(l2_product, time_step_loader.load_l2_product(0))
+        # Mapped product is accounted for
+        self.assertGreater(cache.nbytes, nbytes)
+
+        # Budget too small to cache anything
+        time_step_loader.l2_product_cache_bytes = 1
+        time_step_loader.l2_product_cache = time_step_loader.new_l2_product_cache()
+        time_step_loader.load_l2_product(1)
+        self.assertEqual(0, time_step_loader.l2_product_cache.size)
+
+    def test_load_time_step_mapped_cache(self):
+        opened_paths = []
+
+        def open_dataset(path: str, **kwargs):
+            opened_paths.append(path)
+            return SmosSimpleCatalog.open_dataset(path, **kwargs)
+
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg, open_dataset, {}, SM_PATHS, 0, mapped_cache_bytes=1024**2
+        )
+        array_info = {"name": "Soil_Moisture"}
+        chunk_info = {
+            "index": (0, 0, 0),
+            "shape": (1, 60, 128),
+            "slices": (slice(0, 1), slice(0, 60), slice(0, 128)),
+        }
+        empty_chunk_info = {
+            "index": (0, 2, 0),
+            "shape": (1, 30, 128),
+            "slices": (slice(0, 1), slice(60, 90), slice(0, 128)),
+        }
+        values = time_step_loader.load_time_step(4, array_info, chunk_info)
+        with self.assertRaises(KeyError):
+            time_step_loader.load_time_step(4, array_info, empty_chunk_info)
+        self.assertEqual(2, time_step_loader.mapped_cache.size)
+
+        # Products are no longer needed
+        time_step_loader.l2_product_flight.clear()
+        num_opened = len(opened_paths)
+        np.testing.assert_array_equal(
+            values, time_step_loader.load_time_step(4, array_info, chunk_info)
+        )
+        with self.assertRaises(KeyError):
+            time_step_loader.load_time_step(4, array_info, empty_chunk_info)
+        self.assertEqual(num_opened, len(opened_paths))
+
+    def test_load_time_step_maps_siblings(self):
+        var_names = ("Soil_Moisture", "Chi_2", "RFI_Prob", "N_RFI_X")
+        chunk_info = {
+            "index": (0, 0, 0),
+            "shape": (1, 60, 128),
+            "slices": (slice(0, 1), slice(0, 60), slice(0, 128)),
+        }
+        expected = {
+            name: SmosTimeStepLoader(
+                self.dgg, SmosSimpleCatalog.open_dataset, {}, SM_PATHS, 2
+            ).load_time_step(4, {"name": name}, chunk_info)
+            for name in var_names
+        }
+
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg, SmosSimpleCatalog.open_dataset, {}, SM_PATHS, 2
+        )
+        map_l2_vars = SmosMappedL2Product.map_l2_vars
+        with patch.object(
+            SmosMappedL2Product,
+            "map_l2_vars",
+            autospec=True,
+            side_effect=map_l2_vars,
+        ) as mock:
+            for name in var_names:
+                values = time_step_loader.load_time_step(
+                    4, {"name": name}, chunk_info, var_names=var_names
+                )
+                np.testing.assert_array_equal(expected[name], values)
+                # Served chunks are no longer kept
+                self.assertEqual(
+                    len(var_names) - 1 - var_names.index(name),
+                    time_step_loader.sibling_cache.size,
+                )
+        self.assertEqual(1, mock.call_count)
+        self.assertEqual(list(var_names), mock.call_args.args[1])
+
+    def test_load_time_step_maps_evicted_siblings_alone(self):
+        var_names = ("Soil_Moisture", "Chi_2", "RFI_Prob", "N_RFI_X")
+        chunk_info = {
+            "index": (0, 0, 0),
+            "shape": (1, 60, 128),
+            "slices": (slice(0, 1), slice(0, 60), slice(0, 128)),
+        }
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg, SmosSimpleCatalog.open_dataset, {}, SM_PATHS, 2
+        )
+        chunk_bounds = time_step_loader.get_chunk_bounds(
+            4, (slice(0, 60), slice(0, 128))
+        )
+        map_l2_vars = SmosMappedL2Product.map_l2_vars
+        with patch.object(
+            SmosMappedL2Product,
+            "map_l2_vars",
+            autospec=True,
+            side_effect=map_l2_vars,
+        ) as mock:
+            for name in ("Soil_Moisture", "Chi_2"):
+                time_step_loader.load_time_step(
+                    4, {"name": name}, chunk_info, var_names=var_names
+                )
+            self.assertEqual(2, time_step_loader.sibling_cache.size)
+            # Evict a sibling before it is requested
+            time_step_loader.sibling_cache.pop((0, 4, "RFI_Prob", chunk_bounds))
+            values = time_step_loader.load_time_step(
+                4, {"name": "RFI_Prob"}, chunk_info, var_names=var_names
+            )
+            self.assertEqual((1, 60, 128), values.shape)
+            self.assertEqual(2, mock.call_count)
+            self.assertEqual(["RFI_Prob"], mock.call_args.args[1])
+            # Served siblings are not put again
+            self.assertEqual(1, time_step_loader.sibling_cache.size)
+            time_step_loader.load_time_step(
+                4, {"name": "N_RFI_X"}, chunk_info, var_names=var_names
+            )
+            self.assertEqual(2, mock.call_count)
+            self.assertEqual(0, time_step_loader.sibling_cache.size)
+
+    def test_load_time_step_siblings_exceed_cache_bytes(self):
+        var_names = ("Soil_Moisture", "Chi_2", "RFI_Prob", "N_RFI_X")
+        chunk_info = {
+            "index": (0, 0, 0),
+            "shape": (1, 60, 128),
+            "slices": (slice(0, 1), slice(0, 60), slice(0, 128)),
+        }
+        l2_dataset = SmosSimpleCatalog.open_dataset(SM_PATHS[0])
+        sibling_bytes = (
+            60 * 128 * sum(l2_dataset[n].dtype.itemsize for n in var_names[1:])
+        )
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg,
+            SmosSimpleCatalog.open_dataset,
+            {},
+            SM_PATHS,
+            2,
+            sibling_cache_bytes=sibling_bytes - 1,
+        )
+        map_l2_vars = SmosMappedL2Product.map_l2_vars
+        with patch.object(
+            SmosMappedL2Product,
+            "map_l2_vars",
+            autospec=True,
+            side_effect=map_l2_vars,
+        ) as mock:
+            for name in var_names:
+                values = time_step_loader.load_time_step(
+                    4, {"name": name}, chunk_info, var_names=var_names
+                )
+                self.assertEqual((1, 60, 128), values.shape)
+                self.assertEqual(0, time_step_loader.sibling_cache.size)
+        # Every variable is mapped exactly once
+        self.assertEqual(len(var_names), mock.call_count)
+        self.assertEqual(
+            [[name] for name in var_names],
+            [call.args[1] for call in mock.call_args_list],
+        )
+
+    def test_load_time_step_sibling_cache_bytes(self):
+        var_names = ("Soil_Moisture", "Chi_2")
+        chunk_info = {
+            "index": (0, 0, 0),
+            "shape": (1, 60, 128),
+            "slices": (slice(0, 1), slice(0, 60), slice(0, 128)),
+        }
+        # Disabled
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg,
+            SmosSimpleCatalog.open_dataset,
+            {},
+            SM_PATHS,
+            2,
+            sibling_cache_bytes=0,
+        )
+        time_step_loader.load_time_step(
+            4, {"name": "Soil_Moisture"}, chunk_info, var_names=var_names
+        )
+        self.assertEqual(0, time_step_loader.sibling_cache.size)
+        # Too small for a chunk
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg,
+            SmosSimpleCatalog.open_dataset,
+            {},
+            SM_PATHS,
+            2,
+            sibling_cache_bytes=1024,
+        )
+        time_step_loader.load_time_step(
+            4, {"name": "Soil_Moisture"}, chunk_info, var_names=var_names
+        )
+        self.assertEqual(0, time_step_loader.sibling_cache.size)
+        values = time_step_loader.load_time_step(
+            4, {"name": "Chi_2"}, chunk_info, var_names=var_names
+        )
+        self.assertEqual((1, 60, 128), values.shape)
+
+    def test_invalid_l2_product_cache_mode(self):
+        with self.assertRaises(ValueError):
+            SmosTimeStepLoader(
+                self.dgg,
+                SmosSimpleCatalog.open_dataset,
+                {},
+                SM_PATHS,
+                0,
+                l2_product_cache_mode="fifo",
+            )
+
+    def test_load_time_step_elides_empty_chunks(self):
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg, SmosSimpleCatalog.open_dataset, {}, SM_PATHS, 2
+        )
+        array_info = {"name": "Soil_Moisture"}
+        values = time_step_loader.load_time_step(
+            4,
+            array_info,
+            {
+                "index": (0, 0, 0),
+                "shape": (1, 60, 128),
+                "slices": (slice(0, 1), slice(0, 60), slice(0, 128)),
+            },
+        )
+        self.assertEqual((1, 60, 128), values.shape)
+        self.assertTrue(np.any(np.isfinite(values)))
+        with self.assertRaisesRegex(KeyError, "Soil_Moisture/0.1.3"):
+            time_step_loader.load_time_step(
+                4,
+                array_info,
+                {
+                    "index": (0, 1, 3),
+                    "shape": (1, 60, 128),
+                    "slices": (slice(0, 1), slice(60, 120), slice(384, 512)),
+                },
+            )
+
+    def test_map_l2_products_vars(self):
+        region = slice(20, 200), slice(100, 400)
+        mapped_l2_products = []
+        expected_l2_vars = []
+        for path in SM_PATHS:
+            l2_dataset = SmosSimpleCatalog.open_dataset(path)
+            mapped_l2_products.append(
+                SmosL2Product(
+                    self.dgg, l2_dataset, mapping_mode="sparse"
+                ).get_mapped_s2_product(4, region=region)
+            )
+            expected_l2_vars.append(
+                SmosL2Product(self.dgg, l2_dataset, mapping_mode="index")
+                .get_mapped_s2_product(4, region=region)
+                .map_l2_vars(["Soil_Moisture", "Chi_2"])
+            )
+        mapped_l2_vars = map_l2_products_vars(
+            mapped_l2_products, ["Soil_Moisture", "Chi_2"]
+        )
+        self.assertEqual(len(SM_PATHS), len(mapped_l2_vars))
+        for actual, expected in zip(mapped_l2_vars, expected_l2_vars):
+            self.assertEqual({"Soil_Moisture", "Chi_2"}, set(actual))
+            for var_name in actual:
+                self.assertEqual((1, 180, 300), actual[var_name].shape)
+                self.assertEqual(expected[var_name].dtype, actual[var_name].dtype)
+                np.testing.assert_equal(actual[var_name], expected[var_name])
+
+    def test_map_l2_products_vars_fails(self):
+        mapped_l2_product = self.open_l2_product("index").get_mapped_s2_product(4)
+        with self.assertRaisesRegex(ValueError, "must use mapping mode 'sparse'"):
+            map_l2_products_vars([mapped_l2_product], ["Soil_Moisture"])
+
+
+class GetBboxRegionTest(unittest.TestCase):
+    dgg = new_dgg()
+
+    def test_same_as_spatial_subset(self):
+        dataset = self.dgg.get_dataset(3)
+        lon = dataset.lon.values
+        lat = dataset.lat.values
+        for bbox in ((0, 40, 20, 60), (-10.3, -5.7, 3.9, 12.1), (170, 80, 180, 90)):
+            region = get_bbox_region(bbox, lon, lat, self.dgg.grid_mapping)
+            y_slice, x_slice = region
+            subset = get_dataset_spatial_subset(dataset, bbox, self.dgg.grid_mapping)
+            np.testing.assert_equal(lon[x_slice], subset.lon.values)
+            np.testing.assert_equal(lat[y_slice], subset.lat.values)
+
+    def test_global(self):
+        dataset = self.dgg.get_dataset(3)
+        self.assertIsNone(
+            get_bbox_region(
+                (-180, -90, 180, 90),
+                dataset.lon.values,
+                dataset.lat.values,
+                self.dgg.grid_mapping,
+            )
+        )
+
+
+class SeqnumCoverageTest(unittest.TestCase):
+    dgg = new_dgg()
+
+    def test_get_bbox_seqnum_mask(self):
+        seqnum_mask = get_bbox_seqnum_mask(self.dgg, None, [4])
+        self.assertEqual((SmosDiscreteGlobalGrid.MAX_SEQNUM + 1,), seqnum_mask.shape)
+        self.assertFalse(seqnum_mask[0])
+        bbox = (0.0, 40.0, 20.0, 60.0)
+        bbox_seqnum_mask = get_bbox_seqnum_mask(self.dgg, bbox, [4])
+        self.assertTrue(np.any(bbox_seqnum_mask))
+        self.assertTrue(np.all(seqnum_mask[bbox_seqnum_mask]))
+        self.assertLess(np.count_nonzero(bbox_seqnum_mask), seqnum_mask.sum())
+        levels_seqnum_mask = get_bbox_seqnum_mask(self.dgg, bbox, [3, 4])
+        self.assertTrue(np.all(levels_seqnum_mask[bbox_seqnum_mask]))
+
+    def test_has_seqnum_coverage(self):
+        grid_point_id = SmosSimpleCatalog.open_dataset(SM_PATHS[0]).Grid_Point_ID.values
+        self.assertTrue(
+            has_seqnum_coverage(
+                grid_point_id, get_bbox_seqnum_mask(self.dgg, None, [4])
+            )
+        )
+        # The product has no grid points between 15 and 0 degrees north
+        self.assertFalse(
+            has_seqnum_coverage(
+                grid_point_id,
+                get_bbox_seqnum_mask(self.dgg, (-180.0, 0.5, 180.0, 15.0), [4]),
+            )
+        )
+        self.assertFalse(
+            has_seqnum_coverage(
+                np.array([], dtype=np.uint32),
+                get_bbox_seqnum_mask(self.dgg, None, [4]),
+            )
+        )
+
+    def test_has_grid_point_id_range_coverage(self):
+        seqnum_mask = np.zeros(SmosDiscreteGlobalGrid.MAX_SEQNUM + 1, dtype=np.bool_)
+        # Seqnum of grid point ID 1000010
+        seqnum_mask[262155] = True
+        self.assertTrue(has_grid_point_id_range_coverage(2, 9262086, seqnum_mask))
+        self.assertTrue(has_grid_point_id_range_coverage(1000010, 1000010, seqnum_mask))
+        self.assertFalse(has_grid_point_id_range_coverage(2, 262144, seqnum_mask))
+        self.assertFalse(
+            has_grid_point_id_range_coverage(1000011, 9262086, seqnum_mask)
+        )
+
+    def test_is_global_bbox(self):
+        global_gm = self.dgg.grid_mapping
+        self.assertTrue(is_global_bbox((-180.0, -90.0, 180.0, 90.0), global_gm))
+        self.assertFalse(is_global_bbox((-180.0, -90.0, 180.0, 80.0), global_gm))
+        self.assertFalse(is_global_bbox((0.0, 40.0, 20.0, 60.0), global_gm))
+
+
+class SmosL2ProductConsumptionTest(unittest.TestCase):
+    def test_dispose_when_consumed(self):
+        disposed = []
+        consumption = SmosL2ProductConsumption(dispose_l2_product=disposed.append)
+        # Not kept, if no requests in progress
+        self.assertFalse(consumption.put(0, "P0"))
+        self.assertIsNone(consumption.get(0))
+
+        consumption.begin(0, 1, 2)
+        self.assertTrue(consumption.put(0, "P0"))
+        self.assertEqual("P0", consumption.get(0))
+        consumption.begin(0, 2, 1)
+        consumption.end(0, 1)
+        consumption.end(0, 2)
+        self.assertEqual([], disposed)
+        self.assertEqual(1, consumption.size)
+
+        # Exceeds the expected number of requests, but in progress
+        consumption.begin(0, 1, 2)
+        consumption.begin(0, 1, 2)
+        consumption.end(0, 1)
+        self.assertEqual([], disposed)
+        consumption.end(0, 1)
+        self.assertEqual(["P0"], disposed)
+        self.assertEqual(0, consumption.size)
+        self.assertIsNone(consumption.get(0))
+
+
+# GenericZarrStore implements the Zarr v2 store interface
+IS_ZARR_V2 = zarr.__version__.startswith("2.")
+
+
+class SmosL2CubeZarrStoreTest(unittest.TestCase):
+    dgg = new_dgg()
+
+    def new_zarr_store(
+        self, dataset_opener=SmosSimpleCatalog.open_dataset, **loader_kwargs
+    ) -> SmosL2CubeZarrStore:
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg, dataset_opener, {}, SM_PATHS, 2, **loader_kwargs
+        )
+        return SmosL2CubeZarrStore(
+            time_step_loader,
+            GenericArray(name="lon", dims="lon", data=np.arange(512)),
+            GenericArray(
+                name="Soil_Moisture",
+                dtype=np.dtype(np.float32).str,
+                dims=("time", "lat", "lon"),
+                shape=(1, 252, 512),
+                chunks=(1, 30, 512),
+                get_data=time_step_loader.load_time_step,
+                get_data_params=dict(level=4, region=None),
+                fill_value=-999.0,
+                chunk_encoding="ndarray",
+            ),
+        )
+
+    def test_empty_chunks_are_absent(self):
+        zarr_store = self.new_zarr_store()
+        # Rows 60 to 90 of the first product are empty
+        self.assertNotIn("Soil_Moisture/0.2.0", zarr_store)
+        self.assertIn("Soil_Moisture/0.1.0", zarr_store)
+        self.assertIn("Soil_Moisture/.zarray", zarr_store)
+        self.assertIn("lon/0", zarr_store)
+        self.assertIn(".zgroup", zarr_store)
+        self.assertNotIn("Soil_Moisture/0.9.0", zarr_store)
+        self.assertNotIn("Chi_2/0.0.0", zarr_store)
+
+    def test_empty_chunks_are_consumed(self):
+        zarr_store = self.new_zarr_store(l2_product_cache_mode="consumption")
+        time_step_loader = zarr_store._time_step_loader
+        consumption = time_step_loader.l2_product_consumption
+        # Only the chunks 0.1.0 and 0.2.0 are requested
+        time_step_loader.set_num_time_step_requests(4, 2)
+
+        self.assertIn("Soil_Moisture/0.1.0", zarr_store)
+        # Product is kept for the request
+        self.assertEqual(1, consumption.size)
+        self.assertNotIn("Soil_Moisture/0.2.0", zarr_store)
+        self.assertEqual(1, consumption.size)
+        # noinspection PyStatementEffect
+        zarr_store["Soil_Moisture/0.1.0"]
+        # All chunks consumed, product is disposed
+        self.assertEqual(0, consumption.size)
+
+    def test_keys_do_not_load_products(self):
+        opened_paths = []
+
+        def open_dataset(dataset_path, **kwargs):
+            opened_paths.append(dataset_path)
+            return SmosSimpleCatalog.open_dataset(dataset_path, **kwargs)
+
+        zarr_store = self.new_zarr_store(dataset_opener=open_dataset)
+        keys = set(zarr_store.keys())
+        self.assertEqual(
+            sorted(k for k in keys if k.startswith("Soil_Moisture/")),
+            zarr_store.listdir("Soil_Moisture"),
+        )
+        self.assertEqual([], opened_paths)
+        # Keys of empty chunks are listed
+        self.assertIn("Soil_Moisture/0.2.0", keys)
+        self.assertIn("Soil_Moisture/0.1.0", keys)
+        self.assertIn("Soil_Moisture/.zattrs", keys)
+        self.assertEqual(
+            {f"Soil_Moisture/0.{i}.0" for i in range(9)},
+            {k for k in keys if k.startswith("Soil_Moisture/0.")},
+        )
+
+    def test_keys_are_consistent_with_data(self):
+        zarr_store = self.new_zarr_store()
+        for chunk_key in (f"Soil_Moisture/0.{i}.0" for i in range(9)):
+            if chunk_key in zarr_store:
+                self.assertEqual((1, 30, 512), zarr_store[chunk_key].shape)
+            else:
+                with self.assertRaises(KeyError):
+                    # noinspection PyStatementEffect
+                    zarr_store[chunk_key]
+
+
+@unittest.skipUnless(IS_ZARR_V2, "requires zarr v2")
+class SmosL2CubeTileSizeTest(unittest.TestCase):
+    dgg = new_dgg()
+    time_bounds = np.array(
+        [["2023-04-01T15:06:13", "2023-04-01T15:59:31"]],
+        dtype="datetime64[ns]",
+    )
+
+    def test_empty_chunks_read_as_fill_values(self):
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg, SmosSimpleCatalog.open_dataset, {}, SM_PATHS[:1], 2
+        )
+        l2_cube = SmosL2Cube(
+            self.dgg,
+            "SMOS-L2C-SM",
+            self.time_bounds,
+            None,
+            time_step_loader,
+            tile_size=30,
+        )
+        dataset = l2_cube.get_dataset(4)
+        zarr_store = dataset.zarr_store.get()
+        self.assertNotIn("Soil_Moisture/0.2.0", zarr_store)
+        self.assertIn("Soil_Moisture/0.1.0", zarr_store)
+
+        soil_moisture = xr.open_zarr(zarr_store, mask_and_scale=False).Soil_Moisture
+        self.assertEqual(
+            ((1,), (30,) * 8 + (12,), (30,) * 17 + (2,)), soil_moisture.chunks
+        )
+        values = soil_moisture.values[0]
+        # Rows 60 to 90 of the first product are empty
+        np.testing.assert_array_equal(np.float32(-999.0), values[60:90])
+        expected = (
+            time_step_loader.load_l2_product(0)
+            .get_mapped_s2_product(4)
+            .map_l2_var("Soil_Moisture")[0]
+        )
+        np.testing.assert_array_equal(expected, values)
+
+
+class SmosL2CubeLazyIndexingTest(unittest.TestCase):
+    dgg = new_dgg()
+    time_bounds = np.array(
+        [
+            ["2023-04-01T15:06:13", "2023-04-01T15:59:31"],
+            ["2023-04-01T19:16:29", "2023-04-01T20:09:42"],
+        ],
+        dtype="datetime64[ns]",
+    )
+
+    def new_l2_cube(self, compute_stats: bool = False) -> SmosL2Cube:
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg, SmosSimpleCatalog.open_dataset, {}, SM_PATHS, 2
+        )
+        return SmosL2Cube(
+            self.dgg,
+            "SMOS-L2C-SM",
+            self.time_bounds,
+            None,
+            time_step_loader,
+            lazy_indexing=True,
+            compute_stats=compute_stats,
+        )
+
+    def test_indexing(self):
+        dataset = self.new_l2_cube().get_dataset(4)
+        soil_moisture = dataset.Soil_Moisture
+        self.assertEqual(("time", "lat", "lon"), soil_moisture.dims)
+        self.assertEqual((2, 252, 512), soil_moisture.shape)
+        self.assertEqual(np.float32, soil_moisture.dtype)
+        self.assertEqual({"time_bnds"}, set(dataset.coords) - set(dataset.dims))
+
+        values = soil_moisture.values
+        self.assertTrue(np.any(np.isnan(values)))
+        self.assertTrue(np.any(np.isfinite(values)))
+        np.testing.assert_equal(
+            soil_moisture.isel(time=1, lat=slice(40, 90, 2), lon=[7, 3, 400]).values,
+            values[1, 40:90:2][:, [7, 3, 400]],
+        )
+        np.testing.assert_equal(
+            soil_moisture.isel(lat=60, lon=100).values, values[:, 60, 100]
+        )
+        np.testing.assert_equal(
+            soil_moisture.isel(time=0, lat=60, lon=100).values, values[0, 60, 100]
+        )
+
+    def test_stats(self):
+        dataset = self.new_l2_cube(compute_stats=True).get_dataset(4)
+        self.assertEqual(list(STATS_NAMES), list(dataset.stat.values))
+        stats = dataset.Soil_Moisture_stats
+        self.assertEqual(("time", "stat"), stats.dims)
+        self.assertEqual((2, len(STATS_NAMES)), stats.shape)
+        values = dataset.Soil_Moisture.values
+        for time_idx in range(2):
+            time_values = values[time_idx]
+            time_values = time_values[np.isfinite(time_values)]
+            self.assertEqual(time_values.size, stats.values[time_idx, 0])
+            np.testing.assert_allclose(
+                [time_values.min(), time_values.max(), time_values.mean()],
+                stats.sel(stat=["min", "max", "mean"]).values[time_idx],
+                rtol=1e-5,
+            )
+        self.assertEqual(
+            stats.values[1, 0], stats.isel(time=1).sel(stat="count").values
+        )
@@ -8,6 +8,7 @@ from xcube.core.mldataset import MultiLevelDataset
 from xcube_smos.mldataset.newdgg import NUM_LEVELS
 from xcube_smos.mldataset.newdgg import MAX_WIDTH
 from xcube_smos.mldataset.newdgg import MAX_HEIGHT
+from xcube_smos.mldataset.newdgg import get_dgg_seqnum
 from xcube_smos.mldataset.newdgg import new_dgg
 from xcube_smos.mldataset.newdgg import get_package_path
 
@@ -42,6 +43,17 @@ class NewDggTest(unittest.TestCase):
         self.assertIsInstance(dgg2, MultiLevelDataset)
         self.assertIsNot(dgg1, dgg2)
 
+    def test_get_dgg_seqnum(self):
+        dgg = new_dgg()
+        seqnum = get_dgg_seqnum(dgg, 4)
+        self.assertIsInstance(seqnum, np.ndarray)
+        self.assertEqual(np.dtype("uint32"), seqnum.dtype)
+        self.assertEqual((MAX_HEIGHT // 16, MAX_WIDTH // 16), seqnum.shape)
+        self.assertFalse(seqnum.flags.writeable)
+        # Loaded once per DGG instance
+        self.assertIs(seqnum, get_dgg_seqnum(dgg, 4))
+        self.assertIsNot(seqnum, get_dgg_seqnum(new_dgg(), 4))
+
     def test_get_package_path(self):
         expected_path = (
             (Path(__file__).parent / ".." / ".." / "xcube_smos" / "mldataset")
@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+
+from xcube_smos.mldataset.sparse import map_seqnum_columns
+from xcube_smos.mldataset.sparse import new_selection_matrix
+from xcube_smos.mldataset.sparse import select_window_rows
+
+
+class SparseMappingTest(unittest.TestCase):
+    seqnum_2d = np.array(
+        [
+            [1, 1, 2, 2],
+            [3, 3, 4, 4],
+            [3, 3, 5, 5],
+        ],
+        dtype=np.uint32,
+    )
+
+    def test_new_selection_matrix(self):
+        selection_matrix = new_selection_matrix(self.seqnum_2d, 7)
+        self.assertEqual((12, 7), selection_matrix.shape)
+        self.assertEqual(12, selection_matrix.nnz)
+        dense = selection_matrix.toarray()
+        np.testing.assert_equal(dense.sum(axis=1), np.ones(12))
+        np.testing.assert_equal(np.argmax(dense, axis=1), self.seqnum_2d.ravel())
+
+    def test_map_seqnum_columns(self):
+        selection_matrix = new_selection_matrix(self.seqnum_2d, 7)
+        out = np.empty((2, 3, 4), dtype=np.int16)
+        map_seqnum_columns(
+            selection_matrix,
+            [
+                (np.array([3, 1]), np.array([30, 10], dtype=np.int16), -1),
+                (np.array([5, 2, 4]), np.array([5, 2, 4], dtype=np.int16), 0),
+            ],
+            np.dtype(np.int16),
+            out,
+        )
+        np.testing.assert_equal(
+            out,
+            [
+                [[10, 10, -1, -1], [30, 30, -1, -1], [30, 30, -1, -1]],
+                [[0, 0, 2, 2], [0, 0, 4, 4], [0, 0, 5, 5]],
+            ],
+        )
+
+    def test_select_window_rows(self):
+        selection_matrix = new_selection_matrix(self.seqnum_2d, 7)
+        window_matrix = select_window_rows(selection_matrix, (3, 4), (1, 3, 1, 3))
+        np.testing.assert_equal(
+            window_matrix.toarray(),
+            new_selection_matrix(self.seqnum_2d[1:3, 1:3], 7).toarray(),
+        )
@@ -0,0 +1,202 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from xcube_smos.cachedir import INDEX_FILE_NAME
+from xcube_smos.cachedir import SmosProductCacheDir
+from xcube_smos.catalog.direct import SmosDirectCatalog
+from xcube_smos.catalog.direct import open_dataset
+
+SM_PATHS = sorted(
+    str(p.resolve())
+    for p in (Path(__file__).parent / ".." / "testdata" / "SM").glob("*.nc")
+)
+
+
+class SmosProductCacheDirTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_file(self, cache_dir: SmosProductCacheDir, file_path: str, size: int):
+        local_path = cache_dir.get_path(file_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        with open(local_path, "wb") as fp:
+            fp.write(b"x" * size)
+        # Ensure distinct access times
+        time.sleep(0.01)
+        return cache_dir.add_file(file_path)
+
+    def test_get_add_file(self):
+        cache_dir = SmosProductCacheDir(self.root)
+        self.assertIsNone(cache_dir.get_file("a/p1.nc"))
+        self.assertEqual([], self.write_file(cache_dir, "a/p1.nc", 10))
+        self.assertEqual(f"{self.root}/a/p1.nc", cache_dir.get_file("a/p1.nc"))
+        self.assertTrue(os.path.isfile(f"{self.root}/{INDEX_FILE_NAME}"))
+        self.assertEqual(
+            {
+                "files": 1,
+                "nbytes": 10,
+                "max_bytes": None,
+                "hits": 1,
+                "misses": 1,
+                "evictions": 0,
+            },
+            cache_dir.stats,
+        )
+        cache_dir.reset_stats()
+        self.assertEqual(0, cache_dir.stats["hits"])
+        self.assertEqual(1, cache_dir.stats["files"])
+
+    def test_unrecorded_and_removed_files(self):
+        cache_dir = SmosProductCacheDir(self.root)
+        # Written by a previous version
+        os.makedirs(f"{self.root}/a")
+        Path(f"{self.root}/a/p1.nc").write_bytes(b"x" * 10)
+        self.assertEqual(0, cache_dir.stats["files"])
+        self.assertEqual(f"{self.root}/a/p1.nc", cache_dir.get_file("a/p1.nc"))
+        self.assertEqual(1, cache_dir.stats["files"])
+        # Removed by someone else
+        os.remove(f"{self.root}/a/p1.nc")
+        self.assertIsNone(cache_dir.get_file("a/p1.nc"))
+        self.assertEqual(0, cache_dir.stats["files"])
+
+    def test_lru_eviction(self):
+        cache_dir = SmosProductCacheDir(self.root, max_bytes=25)
+        self.write_file(cache_dir, "a/p1.nc", 10)
+        self.write_file(cache_dir, "a/p2.nc", 10)
+        self.assertIsNotNone(cache_dir.get_file("a/p1.nc"))
+        self.assertEqual(["a/p2.nc"], self.write_file(cache_dir, "b/p3.nc", 10))
+        self.assertFalse(os.path.exists(f"{self.root}/a/p2.nc"))
+        self.assertEqual(["a/p1.nc"], self.write_file(cache_dir, "b/p4.nc", 10))
+        # Empty directories are removed
+        self.assertFalse(os.path.exists(f"{self.root}/a"))
+        stats = cache_dir.stats
+        self.assertEqual(2, stats["files"])
+        self.assertEqual(20, stats["nbytes"])
+        self.assertEqual(2, stats["evictions"])
+
+    def test_lfu_eviction(self):
+        cache_dir = SmosProductCacheDir(self.root, max_bytes=25, eviction_policy="lfu")
+        self.write_file(cache_dir, "p1.nc", 10)
+        self.write_file(cache_dir, "p2.nc", 10)
+        cache_dir.get_file("p1.nc")
+        cache_dir.get_file("p1.nc")
+        cache_dir.get_file("p2.nc")
+        self.assertEqual(["p2.nc"], self.write_file(cache_dir, "p3.nc", 10))
+        self.assertEqual(["p3.nc"], self.write_file(cache_dir, "p4.nc", 10))
+
+    def test_file_exceeding_quota_is_kept(self):
+        cache_dir = SmosProductCacheDir(self.root, max_bytes=5)
+        self.assertEqual([], self.write_file(cache_dir, "p1.nc", 10))
+        self.assertEqual(["p1.nc"], self.write_file(cache_dir, "p2.nc", 10))
+        self.assertEqual(1, cache_dir.stats["files"])
+
+    def test_evict_and_purge(self):
+        cache_dir = SmosProductCacheDir(self.root)
+        for i in range(4):
+            self.write_file(cache_dir, f"p{i}.nc", 10)
+        self.assertEqual([], cache_dir.evict())
+        self.assertEqual(["p0.nc", "p1.nc"], cache_dir.evict(20))
+        Path(f"{self.root}/other.json").write_text("{}")
+        self.assertEqual(["p2.nc", "p3.nc"], cache_dir.purge())
+        self.assertEqual(0, cache_dir.stats["nbytes"])
+        # Unrecorded files are kept
+        self.assertEqual({INDEX_FILE_NAME, "other.json"}, set(os.listdir(self.root)))
+
+    def test_accesses_are_collected(self):
+        def get_access_count() -> int:
+            with sqlite3.connect(f"{self.root}/{INDEX_FILE_NAME}") as conn:
+                return conn.execute(
+                    "SELECT access_count FROM files WHERE path = 'p1.nc'"
+                ).fetchone()[0]
+
+        cache_dir = SmosProductCacheDir(self.root, access_interval=3600)
+        self.write_file(cache_dir, "p1.nc", 10)
+        for _ in range(3):
+            cache_dir.get_file("p1.nc")
+        # Not yet written to the index
+        self.assertEqual(1, get_access_count())
+        # Written along with the next change
+        self.assertEqual(3, cache_dir.stats["hits"])
+        self.assertEqual(4, get_access_count())
+        cache_dir = SmosProductCacheDir(self.root, access_interval=0)
+        cache_dir.get_file("p1.nc")
+        self.assertEqual(5, get_access_count())
+
+    def test_invalid_args(self):
+        with self.assertRaises(ValueError):
+            SmosProductCacheDir(self.root, eviction_policy="fifo")
+        with self.assertRaises(ValueError):
+            SmosProductCacheDir(self.root, max_bytes=-1)
+
+    def test_serializable(self):
+        cache_dir = SmosProductCacheDir(self.root, max_bytes=10)
+        cache_dir2 = pickle.loads(pickle.dumps(cache_dir))
+        self.assertEqual(self.root, cache_dir2.root)
+        self.assertEqual(10, cache_dir2.max_bytes)
+
+    def test_open_dataset(self):
+        kwargs = dict(
+            source_protocol="file",
+            cache_path=self.root,
+            xarray_kwargs=dict(engine="h5netcdf"),
+        )
+        open_dataset(SM_PATHS[0], **kwargs).close()
+        size = SmosProductCacheDir(self.root).stats["nbytes"]
+        self.assertGreater(size, 0)
+        kwargs.update(cache_max_bytes=size)
+        open_dataset(SM_PATHS[0], **kwargs).close()
+        open_dataset(SM_PATHS[1], **kwargs).close()
+        catalog = SmosDirectCatalog(cache_path=self.root, cache_max_bytes=size)
+        stats = catalog.get_cache_dir().stats
+        self.assertEqual(1, stats["files"])
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(2, stats["misses"])
+        self.assertEqual(1, stats["evictions"])
+        self.assertFalse(os.path.exists(f"{self.root}/{SM_PATHS[0]}"))
+        self.assertTrue(os.path.exists(f"{self.root}/{SM_PATHS[1]}"))
+
+    def test_open_dataset_evicted_after_lookup(self):
+        kwargs = dict(
+            source_protocol="file",
+            cache_path=self.root,
+            xarray_kwargs=dict(engine="h5netcdf"),
+        )
+        open_dataset(SM_PATHS[0], **kwargs).close()
+        local_path = f"{self.root}/{SM_PATHS[0]}"
+        # Evicted by another process right after the lookup
+        with patch.object(SmosProductCacheDir, "get_file", return_value=local_path):
+            os.remove(local_path)
+            open_dataset(SM_PATHS[0], **kwargs).close()
+        self.assertTrue(os.path.exists(local_path))
+        # No temporary files are left
+        self.assertEqual(
+            [os.path.basename(local_path)], os.listdir(os.path.dirname(local_path))
+        )
+
+    def test_catalog_get_cache_dir(self):
+        self.assertIsNone(SmosDirectCatalog().get_cache_dir())
+        catalog = SmosDirectCatalog(
+            cache_path=self.root, cache_max_bytes=100, cache_eviction_policy="lfu"
+        )
+        cache_dir = catalog.get_cache_dir()
+        self.assertIsInstance(cache_dir, SmosProductCacheDir)
+        self.assertEqual(100, cache_dir.max_bytes)
+        self.assertEqual("lfu", cache_dir.eviction_policy)
+        self.assertEqual(
+            dict(cache_max_bytes=100, cache_eviction_policy="lfu"),
+            {
+                k: v
+                for k, v in catalog.get_dataset_opener_kwargs().items()
+                if k.startswith("cache_") and k != "cache_path"
+            },
+        )
@@ -14,6 +14,8 @@ class SmosSchemaTest(unittest.TestCase):
         self.assertIn("source_protocol", schema.properties)
         self.assertIn("source_storage_options", schema.properties)
         self.assertIn("cache_path", schema.properties)
+        self.assertIn("cache_max_bytes", schema.properties)
+        self.assertIn("cache_eviction_policy", schema.properties)
         self.assertIn("xarray_kwargs", schema.properties)
 
     def test_dataset_open_params_schema(self):
@@ -23,7 +25,20 @@ class SmosSchemaTest(unittest.TestCase):
         self.assertIn("time_range", schema.properties)
         self.assertIn("res_level", schema.properties)
         self.assertIn("bbox", schema.properties)
+        self.assertIn("mapping_mode", schema.properties)
+        self.assertIn("parallel_mapping", schema.properties)
+        self.assertIn("tile_size", schema.properties)
+        self.assertIn("lazy_indexing", schema.properties)
+        self.assertIn("compute_stats", schema.properties)
+        self.assertIn("mask_rules", schema.properties)
+        self.assertIn("skip_empty_time_steps", schema.properties)
+        self.assertIn("l2_product_cache_mode", schema.properties)
+        self.assertIn("chunk_cache_path", schema.properties)
+        self.assertIn("chunk_cache_url", schema.properties)
+        self.assertIn("chunk_cache_max_bytes", schema.properties)
         self.assertNotIn("l2_product_cache_size", schema.properties)
+        self.assertNotIn("l2_product_cache_bytes", schema.properties)
+        self.assertNotIn("mapped_cache_bytes", schema.properties)
         # TODO: support variable_names
         # self.assertIn("variable_names", DATASET_OPEN_PARAMS_SCHEMA.properties)
 
@@ -33,7 +48,20 @@ class SmosSchemaTest(unittest.TestCase):
         self.assertEqual(["time_range"], schema.required)
         self.assertIn("time_range", schema.properties)
         self.assertIn("bbox", schema.properties)
+        self.assertIn("mapping_mode", schema.properties)
+        self.assertIn("parallel_mapping", schema.properties)
+        self.assertIn("tile_size", schema.properties)
+        self.assertIn("lazy_indexing", schema.properties)
+        self.assertIn("compute_stats", schema.properties)
+        self.assertIn("mask_rules", schema.properties)
+        self.assertIn("skip_empty_time_steps", schema.properties)
+        self.assertIn("l2_product_cache_mode", schema.properties)
+        self.assertIn("chunk_cache_path", schema.properties)
+        self.assertIn("chunk_cache_url", schema.properties)
+        self.assertIn("chunk_cache_max_bytes", schema.properties)
         self.assertIn("l2_product_cache_size", schema.properties)
+        self.assertIn("l2_product_cache_bytes", schema.properties)
+        self.assertIn("mapped_cache_bytes", schema.properties)
         self.assertNotIn("res_level", schema.properties)
         # TODO: support variable_names
         # self.assertIn("variable_names", DATASET_OPEN_PARAMS_SCHEMA.properties)
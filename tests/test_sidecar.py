@@ -0,0 +1,243 @@
+import json
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from xcube_smos.catalog.direct import SmosDirectCatalog
+from xcube_smos.catalog.stac import SmosStacCatalog
+from xcube_smos.mldataset.l2cube import SmosL2Cube
+from xcube_smos.mldataset.l2cube import SmosL2Product
+from xcube_smos.mldataset.l2cube import SmosTimeStepLoader
+from xcube_smos.mldataset.newdgg import new_dgg
+from xcube_smos.sidecar import SIDECAR_VERSION
+from xcube_smos.sidecar import SmosProductSidecarStore
+from xcube_smos.sidecar import get_product_name
+from xcube_smos.sidecar import new_product_sidecar
+from .catalog.simple import SmosSimpleCatalog
+from .mldataset.test_l2cube import SM_PATHS
+
+
+class SidecarCatalog(SmosSimpleCatalog):
+    def __init__(self, sidecar_store: Optional[SmosProductSidecarStore] = None):
+        super().__init__(smos_l2_sm_paths=SM_PATHS, smos_l2_os_paths=[])
+        self.sidecar_store = sidecar_store
+        self.opened_paths = []
+
+    def get_dataset_opener(self):
+        def open_dataset(path: str, **kwargs):
+            self.opened_paths.append(path)
+            return SmosSimpleCatalog.open_dataset(path, **kwargs)
+
+        return open_dataset
+
+    def get_sidecar_store(self) -> Optional[SmosProductSidecarStore]:
+        return self.sidecar_store
+
+
+class NewProductSidecarTest(unittest.TestCase):
+    def test_new_product_sidecar(self):
+        with SmosSimpleCatalog.open_dataset(SM_PATHS[0]) as l2_dataset:
+            sidecar = new_product_sidecar(l2_dataset)
+            grid_point_id = l2_dataset.Grid_Point_ID.values
+            attrs = dict(l2_dataset.attrs)
+            var_names = list(l2_dataset.data_vars.keys())
+        self.assertEqual(SIDECAR_VERSION, sidecar["version"])
+        self.assertEqual(attrs["Ascending_Flag"], sidecar["attrs"]["Ascending_Flag"])
+        self.assertEqual(var_names, list(sidecar["variables"].keys()))
+        soil_moisture = sidecar["variables"]["Soil_Moisture"]
+        self.assertEqual("<f4", soil_moisture["dtype"])
+        self.assertEqual(-999.0, soil_moisture["fill_value"])
+        self.assertEqual(
+            {
+                "count": grid_point_id.size,
+                "min": int(grid_point_id.min()),
+                "max": int(grid_point_id.max()),
+            },
+            sidecar["grid_point_id"],
+        )
+        # Must be JSON-serializable
+        self.assertEqual(sidecar, json.loads(json.dumps(sidecar)))
+
+    def test_get_product_name(self):
+        self.assertEqual("P.nc", get_product_name("/data/SM/P.nc"))
+        self.assertEqual("P.nc", get_product_name("s3://data/SM/P.nc/"))
+        self.assertEqual("P.nc", get_product_name("P.nc"))
+
+
+class SmosProductSidecarStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name) / "sidecars"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_sidecar(self):
+        store = SmosProductSidecarStore(self.root)
+        self.assertIsNone(store.get_sidecar("P.nc"))
+        sidecar = {"version": SIDECAR_VERSION, "attrs": {"a": 1}, "variables": {}}
+        store.put_sidecar("P.nc", sidecar)
+        self.assertEqual(self.root / "P.nc.json", store.get_sidecar_path("P.nc"))
+        self.assertEqual(["P.nc.json"], [p.name for p in self.root.iterdir()])
+        self.assertEqual(sidecar, store.get_sidecar("P.nc"))
+
+        # Sidecars of other versions are ignored
+        store.put_sidecar("Q.nc", {**sidecar, "version": SIDECAR_VERSION + 1})
+        self.assertIsNone(store.get_sidecar("Q.nc"))
+
+    def test_seqnum(self):
+        store = SmosProductSidecarStore(self.root)
+        self.assertIsNone(store.get_seqnum("P.nc"))
+        store.put_seqnum("P.nc", np.array([3, 1, 2]))
+        self.assertTrue(store.get_seqnum_path("P.nc").is_file())
+        seqnum = store.get_seqnum("P.nc")
+        self.assertEqual(np.uint32, seqnum.dtype)
+        np.testing.assert_array_equal([3, 1, 2], seqnum)
+
+    def test_serializable(self):
+        store = SmosProductSidecarStore(self.root)
+        store2 = pickle.loads(pickle.dumps(store))
+        self.assertEqual(self.root, store2.root)
+
+
+class SidecarUsageTest(unittest.TestCase):
+    dgg = new_dgg()
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = SmosProductSidecarStore(Path(self.temp_dir.name) / "sidecars")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_catalog_get_dataset_sidecar(self):
+        catalog = SidecarCatalog(self.store)
+        sidecar = catalog.get_dataset_sidecar(SM_PATHS[0])
+        self.assertEqual(1, len(catalog.opened_paths))
+        product_name = Path(SM_PATHS[0]).name
+        self.assertEqual(sidecar, self.store.get_sidecar(product_name))
+
+        # From now on, the product need not be opened
+        self.assertEqual(sidecar, catalog.get_dataset_sidecar(SM_PATHS[0]))
+        attrs = catalog.get_dataset_attrs(SM_PATHS[0])
+        self.assertEqual(sidecar["attrs"], attrs)
+        self.assertIn(attrs["Ascending_Flag"], ("A", "D"))
+        self.assertEqual(1, len(catalog.opened_paths))
+
+    def test_catalog_without_store(self):
+        catalog = SmosSimpleCatalog(smos_l2_sm_paths=SM_PATHS, smos_l2_os_paths=[])
+        self.assertIsNone(catalog.get_sidecar_store())
+        sidecar = catalog.get_dataset_sidecar(SM_PATHS[0])
+        self.assertEqual(SIDECAR_VERSION, sidecar["version"])
+        self.assertEqual(
+            sidecar["attrs"]["Ascending_Flag"],
+            catalog.get_dataset_attrs(SM_PATHS[0])["Ascending_Flag"],
+        )
+
+    def test_direct_catalog_get_sidecar_store(self):
+        self.assertIsNone(SmosDirectCatalog().get_sidecar_store())
+        catalog = SmosDirectCatalog(cache_path=self.temp_dir.name)
+        store = catalog.get_sidecar_store()
+        self.assertIsInstance(store, SmosProductSidecarStore)
+        self.assertEqual(Path(self.temp_dir.name) / "sidecars", store.root)
+
+        catalog = SmosStacCatalog(cache_path=self.temp_dir.name)
+        store = catalog.get_sidecar_store()
+        self.assertEqual(Path(self.temp_dir.name) / "sidecars", store.root)
+
+    def test_l2_product_with_seqnum(self):
+        with SmosSimpleCatalog.open_dataset(SM_PATHS[0]) as l2_dataset:
+            l2_product = SmosL2Product(self.dgg, l2_dataset)
+            l2_product_2 = SmosL2Product(
+                self.dgg, l2_dataset, l2_seqnum=l2_product.l2_seqnum
+            )
+            np.testing.assert_array_equal(
+                l2_product.l2_seqnum_to_index, l2_product_2.l2_seqnum_to_index
+            )
+            self.assertEqual(l2_product.l2_missing_index, l2_product_2.l2_missing_index)
+            with self.assertRaises(ValueError):
+                SmosL2Product(self.dgg, l2_dataset, l2_seqnum=l2_product.l2_seqnum[:-1])
+
+    def test_time_step_loader_puts_and_uses_seqnum(self):
+        def new_time_step_loader():
+            return SmosTimeStepLoader(
+                self.dgg,
+                SmosSimpleCatalog.open_dataset,
+                {},
+                SM_PATHS,
+                0,
+                sidecar_store=self.store,
+            )
+
+        product_name = Path(SM_PATHS[1]).name
+        l2_product = new_time_step_loader().load_l2_product(1)
+        seqnum = self.store.get_seqnum(product_name)
+        np.testing.assert_array_equal(l2_product.l2_seqnum, seqnum)
+
+        # Stale seqnums are ignored
+        self.store.put_seqnum(product_name, seqnum[:-1])
+        l2_product_2 = new_time_step_loader().load_l2_product(1)
+        np.testing.assert_array_equal(
+            l2_product.l2_seqnum_to_index, l2_product_2.l2_seqnum_to_index
+        )
+        np.testing.assert_array_equal(seqnum, self.store.get_seqnum(product_name))
+
+    def test_time_step_loader_puts_sidecar(self):
+        catalog = SidecarCatalog(self.store)
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg,
+            catalog.get_dataset_opener(),
+            {},
+            SM_PATHS,
+            2,
+            sidecar_store=self.store,
+        )
+        product_name = get_product_name(SM_PATHS[0])
+        self.assertIsNone(self.store.get_sidecar(product_name))
+        time_step_loader.load_l2_product(0)
+        with SmosSimpleCatalog.open_dataset(SM_PATHS[0]) as l2_dataset:
+            expected_sidecar = json.loads(json.dumps(new_product_sidecar(l2_dataset)))
+        self.assertEqual(expected_sidecar, self.store.get_sidecar(product_name))
+        # A single open serves both, the product and its sidecar
+        self.assertEqual(SM_PATHS[:1], catalog.opened_paths)
+        self.assertEqual(expected_sidecar, catalog.get_dataset_sidecar(SM_PATHS[0]))
+        self.assertEqual(SM_PATHS[:1], catalog.opened_paths)
+
+    def test_l2_cube_with_sidecar(self):
+        catalog = SidecarCatalog(self.store)
+        product_sidecar = catalog.get_dataset_sidecar(SM_PATHS[0])
+        time_step_loader = SmosTimeStepLoader(
+            self.dgg, catalog.get_dataset_opener(), {}, SM_PATHS, 2
+        )
+        ml_dataset = SmosL2Cube(
+            self.dgg,
+            "SMOS-L2C-SM",
+            np.array(
+                [
+                    ["2023-04-01T15:06:13", "2023-04-01T15:59:31"],
+                    ["2023-04-01T19:16:29", "2023-04-01T20:09:42"],
+                ],
+                dtype="datetime64[ns]",
+            ),
+            None,
+            time_step_loader,
+            lazy_indexing=True,
+            product_sidecar=product_sidecar,
+        )
+        self.assertEqual(1, len(catalog.opened_paths))
+        dataset = ml_dataset.get_dataset(4)
+        # The cube is described without opening a product
+        self.assertEqual(1, len(catalog.opened_paths))
+        soil_moisture = dataset.Soil_Moisture
+        self.assertEqual(np.float32, soil_moisture.dtype)
+        self.assertEqual((2, 252, 512), soil_moisture.shape)
+        self.assertEqual(
+            product_sidecar["variables"]["Soil_Moisture"]["attrs"]["units"],
+            soil_moisture.attrs["units"],
+        )
+        self.assertTrue(np.any(np.isfinite(soil_moisture.isel(time=0).values)))
+        self.assertEqual(2, len(catalog.opened_paths))
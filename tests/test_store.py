@@ -1,3 +1,4 @@
+import tempfile
 import unittest
 from typing import Any, Type
 
@@ -12,8 +13,15 @@ from xcube.core.store import DatasetDescriptor
 from xcube.core.store import MultiLevelDatasetDescriptor
 from xcube.util.jsonschema import JsonObjectSchema
 
+from tests.catalog.simple import SmosSimpleCatalog
 from tests.catalog.test_simple import new_simple_catalog
+from tests.mldataset.test_l2cube import SM_PATHS
+from tests.test_sidecar import SidecarCatalog
 from xcube_smos.dsiter import DatasetIterator
+from xcube_smos.mldataset.l2cube import ingest_grid_point_ids
+from xcube_smos.sidecar import SmosProductSidecarStore
+from xcube_smos.sidecar import get_product_name
+from xcube_smos.sidecar import new_product_sidecar
 from xcube_smos.schema import DATASET_OPEN_PARAMS_SCHEMA
 from xcube_smos.schema import ML_DATASET_OPEN_PARAMS_SCHEMA
 from xcube_smos.schema import STORE_PARAMS_SCHEMA
@@ -397,6 +405,52 @@ class SmosDataStoreTest(unittest.TestCase):
         self.assertAlmostEqual(expected_bbox[3], actual_bbox[3], places=places)
 
 
+class SmosDataStoreSkipEmptyDatasetsTest(unittest.TestCase):
+    dataset_records = [(path, None, None) for path in SM_PATHS]
+    # The first product has no grid points between 15 and 0 degrees north
+    bbox = (-180.0, 0.5, 180.0, 15.0)
+
+    def skip_empty_datasets(self, catalog: SmosSimpleCatalog, bbox) -> list[str]:
+        store = SmosDataStore(_catalog=catalog)
+        _, dataset_paths = store._skip_empty_datasets(
+            self.dataset_records, list(SM_PATHS), bbox, [4]
+        )
+        return dataset_paths
+
+    def test_without_sidecars(self):
+        catalog = SidecarCatalog()
+        self.assertEqual(SM_PATHS[1:], self.skip_empty_datasets(catalog, self.bbox))
+        self.assertEqual(SM_PATHS, catalog.opened_paths)
+
+    def test_no_or_global_bbox(self):
+        catalog = SidecarCatalog()
+        self.assertEqual(SM_PATHS, self.skip_empty_datasets(catalog, None))
+        self.assertEqual(
+            SM_PATHS,
+            self.skip_empty_datasets(catalog, (-180.0, -90.0, 180.0, 90.0)),
+        )
+        self.assertEqual([], catalog.opened_paths)
+
+    def test_with_sidecars(self):
+        with tempfile.TemporaryDirectory() as root:
+            sidecar_store = SmosProductSidecarStore(root)
+            for path in SM_PATHS:
+                l2_dataset = SmosSimpleCatalog.open_dataset(path)
+                sidecar_store.put_sidecar(
+                    get_product_name(path), new_product_sidecar(l2_dataset)
+                )
+            catalog = SidecarCatalog(sidecar_store)
+            # Grid point ID extents span the entire DGG
+            self.assertEqual(SM_PATHS, self.skip_empty_datasets(catalog, self.bbox))
+
+            for path in SM_PATHS:
+                l2_dataset = SmosSimpleCatalog.open_dataset(path)
+                l2_seqnum, _ = ingest_grid_point_ids(l2_dataset.Grid_Point_ID.values)
+                sidecar_store.put_seqnum(get_product_name(path), l2_seqnum)
+            self.assertEqual(SM_PATHS[1:], self.skip_empty_datasets(catalog, self.bbox))
+            self.assertEqual([], catalog.opened_paths)
+
+
 class SmosDistributedDataStoreTest(unittest.TestCase):
     def setUp(self) -> None:
         import dask.distributed
@@ -1,10 +1,16 @@
 import pickle
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
 import pytest
 
+from xcube_smos.utils import BufferPool
+from xcube_smos.utils import CompressedArrayCache
 from xcube_smos.utils import LruCache
+from xcube_smos.utils import SingleFlight
 from xcube_smos.utils import normalize_time_range
 
 
@@ -52,6 +58,111 @@ class LruCacheTest(unittest.TestCase):
         self.assertEqual(3, c.size)
         self.assertEqual(["y", "u", "z"], list(c.keys()))
 
+    def test_put_weighted(self):
+        disposed = []
+        c = LruCache[str, np.ndarray](
+            max_size=10, max_bytes=100, dispose_value=disposed.append
+        )
+        self.assertEqual(100, c.max_bytes)
+        self.assertEqual(0, c.nbytes)
+
+        x = np.zeros(40, dtype=np.uint8)
+        y = np.zeros(40, dtype=np.uint8)
+        z = np.zeros(40, dtype=np.uint8)
+        c.put("x", x)
+        c.put("y", y)
+        self.assertEqual(80, c.nbytes)
+        self.assertEqual(["y", "x"], list(c.keys()))
+
+        # Exceeds budget, drop 'x'
+        c.put("z", z)
+        self.assertEqual(80, c.nbytes)
+        self.assertEqual(["z", "y"], list(c.keys()))
+        self.assertEqual(1, len(disposed))
+        self.assertIs(x, disposed[0])
+
+        # Too large to be cached at all
+        c.put("u", np.zeros(101, dtype=np.uint8))
+        self.assertEqual(["z", "y"], list(c.keys()))
+        self.assertEqual(1, len(disposed))
+
+        c.clear()
+        self.assertEqual(0, c.nbytes)
+
+    def test_weighted_size_is_measured_on_access(self):
+        sizes = {"x": 10, "y": 10}
+        c = LruCache[str, str](
+            max_size=10, max_bytes=100, get_value_size=lambda v: sizes[v]
+        )
+        c.put("x", "x")
+        c.put("y", "y")
+        self.assertEqual(20, c.nbytes)
+        # 'x' grows while cached
+        sizes["x"] = 95
+        self.assertEqual("x", c.get("x"))
+        self.assertEqual(["x"], list(c.keys()))
+        self.assertEqual(95, c.nbytes)
+
+    def test_pop(self):
+        disposed = []
+        c = LruCache[str, np.ndarray](
+            max_size=10, max_bytes=100, dispose_value=disposed.append
+        )
+        x = np.zeros(40, dtype=np.uint8)
+        c.put("x", x)
+        c.put("y", np.zeros(20, dtype=np.uint8))
+        self.assertIs(x, c.pop("x"))
+        self.assertEqual(["y"], list(c.keys()))
+        self.assertEqual(20, c.nbytes)
+        self.assertEqual([], disposed)
+        self.assertIsNone(c.pop("x"))
+        self.assertEqual("default", c.pop("x", "default"))
+        self.assertEqual(1, c.stats["hits"])
+        self.assertEqual(2, c.stats["misses"])
+
+    def test_stats(self):
+        c = LruCache[str, int](max_size=2)
+        c.put("x", 13)
+        c.put("y", 58)
+        self.assertEqual(13, c.get("x"))
+        self.assertEqual(None, c.get("z"))
+        c.put("z", 32)
+        self.assertEqual(
+            {"hits": 1, "misses": 1, "evictions": 1, "size": 2, "nbytes": 0},
+            c.stats,
+        )
+        c.reset_stats()
+        self.assertEqual(
+            {"hits": 0, "misses": 0, "evictions": 0, "size": 2, "nbytes": 0},
+            c.stats,
+        )
+
+    def test_thread_safety(self):
+        disposed = []
+        c = LruCache[int, np.ndarray](
+            max_size=8, max_bytes=80 * 8, dispose_value=disposed.append
+        )
+
+        def use_cache(offset: int):
+            for i in range(1000):
+                key = (offset + i) % 16
+                value = c.get(key)
+                if value is None:
+                    c.put(key, np.full(10, key, dtype=np.int64))
+                else:
+                    self.assertEqual(key, value[0])
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(use_cache, range(8)))
+        stats = c.stats
+        self.assertEqual(8000, stats["hits"] + stats["misses"])
+        self.assertLessEqual(stats["size"], 8)
+        self.assertEqual(80 * stats["size"], stats["nbytes"])
+        # Values replaced by concurrent puts are disposed too
+        self.assertGreaterEqual(len(disposed), stats["evictions"])
+        for key in c.keys():
+            self.assertEqual(key, c[key][0])
+
     def test_clear(self):
         c = LruCache[str, int](max_size=3)
 
@@ -162,6 +273,170 @@ class LruCacheTest(unittest.TestCase):
             pickle.dumps(c)
 
 
+class SingleFlightTest(unittest.TestCase):
+    def test_concurrent_calls_are_coalesced(self):
+        flight = SingleFlight[str, int]()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait()
+            return 42
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(flight.do, "a", compute) for _ in range(4)]
+            release.set()
+            values = [future.result() for future in futures]
+        self.assertEqual([42, 42, 42, 42], values)
+        self.assertEqual(1, len(calls))
+
+        # Not retained, so computed again
+        self.assertEqual(43, flight.do("a", lambda: 43))
+
+    def test_retain(self):
+        flight = SingleFlight[str, int](retain=2)
+        self.assertEqual(2, flight.retain)
+        self.assertEqual(1, flight.do("a", lambda: 1))
+        self.assertEqual(2, flight.do("b", lambda: 2))
+        self.assertEqual(1, flight.do("a", lambda: -1))
+        self.assertEqual(3, flight.do("c", lambda: 3))
+        # "b" was the least recently used one
+        self.assertEqual(-2, flight.do("b", lambda: -2))
+        self.assertEqual(3, flight.do("c", lambda: -3))
+        flight.forget("c")
+        self.assertEqual(-3, flight.do("c", lambda: -3))
+        flight.clear()
+        self.assertEqual(-1, flight.do("a", lambda: -1))
+
+    def test_error_is_shared(self):
+        flight = SingleFlight[str, int](retain=1)
+        release = threading.Event()
+
+        def compute():
+            release.wait()
+            raise ValueError("bad")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(flight.do, "a", compute) for _ in range(2)]
+            release.set()
+            for future in futures:
+                with pytest.raises(ValueError, match="bad"):
+                    future.result()
+        # Errors are not retained
+        self.assertEqual(1, flight.do("a", lambda: 1))
+
+    def test_not_serializable(self):
+        with pytest.raises(RuntimeError):
+            pickle.dumps(SingleFlight())
+
+
+class CompressedArrayCacheTest(unittest.TestCase):
+    def test_get_put(self):
+        c = CompressedArrayCache[str](max_bytes=10_000)
+        self.assertEqual(10_000, c.max_bytes)
+        self.assertIsNone(c.get("x"))
+
+        x = np.full((100, 200), np.nan, dtype=np.float32)
+        x[10:20, 30:40] = 0.5
+        c.put("x", x)
+        self.assertEqual(1, c.size)
+        self.assertLess(c.nbytes, x.nbytes / 10)
+
+        y = c.get("x")
+        self.assertIsNot(x, y)
+        self.assertEqual(np.float32, y.dtype)
+        np.testing.assert_array_equal(x, y)
+        # Hits are copies
+        y[0, 0] = 1
+        self.assertTrue(np.isnan(c.get("x")[0, 0]))
+        self.assertEqual(
+            {"hits": 2, "misses": 1, "evictions": 0},
+            {k: v for k, v in c.stats.items() if k in ("hits", "misses", "evictions")},
+        )
+
+    def test_sized_by_compressed_bytes(self):
+        rng = np.random.default_rng(0)
+        c = CompressedArrayCache[str](max_bytes=10_000)
+        # Noise hardly compresses, so it does not fit
+        c.put("noise", rng.random((100, 100)))
+        self.assertEqual(0, c.size)
+        for i in range(10):
+            c.put(str(i), np.zeros((100, 100)))
+        self.assertEqual(10, c.size)
+        self.assertLessEqual(c.nbytes, 10_000)
+        c.clear()
+        self.assertEqual(0, c.size)
+
+    def test_not_serializable(self):
+        with pytest.raises(RuntimeError):
+            pickle.dumps(CompressedArrayCache(max_bytes=100))
+
+
+class BufferPoolTest(unittest.TestCase):
+    def test_acquire(self):
+        pool = BufferPool(max_size=2)
+        self.assertEqual(2, pool.max_size)
+        self.assertEqual(0, pool.size)
+
+        a = pool.acquire((2, 3), np.float32)
+        self.assertEqual((2, 3), a.shape)
+        self.assertEqual(np.float32, a.dtype)
+        a_address = a.ctypes.data
+        # Views, also views of views, keep the buffer in use
+        view = a[0:1][:, 1:]
+        del a
+        b = pool.acquire((2, 3), np.float32)
+        self.assertNotEqual(a_address, b.ctypes.data)
+        self.assertEqual(2, pool.size)
+        self.assertEqual(48, pool.nbytes)
+        # Pool is full, so buffer is not pooled
+        c = pool.acquire((2, 3), np.float32)
+        self.assertEqual(2, pool.size)
+        del c
+        del view
+        # Free now, so it is reused
+        d = pool.acquire((2, 3), np.float32)
+        self.assertEqual(a_address, d.ctypes.data)
+        self.assertEqual((2, 3), d.shape)
+
+        e = pool.acquire((2, 3), np.int16)
+        self.assertEqual(np.int16, e.dtype)
+        self.assertEqual(3, pool.size)
+
+        pool.clear()
+        self.assertEqual(0, pool.size)
+        self.assertEqual(0, pool.nbytes)
+        # Buffers in use when cleared are not returned to the pool
+        del b, d, e
+        self.assertEqual(0, pool.size)
+
+    def test_max_bytes(self):
+        pool = BufferPool(max_size=4, max_bytes=100)
+        self.assertEqual(100, pool.max_bytes)
+        a = pool.acquire((10,), np.float32)
+        b = pool.acquire((10,), np.float32)
+        self.assertEqual(80, pool.nbytes)
+        # Would exceed the budget, so buffer is not pooled
+        c = pool.acquire((10,), np.float32)
+        self.assertEqual(2, pool.size)
+        self.assertEqual(80, pool.nbytes)
+        del a, b, c
+        # Buffers not in use are dropped to make room
+        d = pool.acquire((5,), np.float64)
+        self.assertEqual(2, pool.size)
+        self.assertEqual(80, pool.nbytes)
+        del d
+        # Too large to be pooled at all
+        e = pool.acquire((200,), np.uint8)
+        self.assertEqual((200,), e.shape)
+        self.assertEqual(2, pool.size)
+
+    def test_not_serializable(self):
+        with pytest.raises(RuntimeError):
+            pickle.dumps(BufferPool())
+
+
 class NormalizeTimeRangeTest(unittest.TestCase):
     def test_normalize_time_range(self):
         self.assertEqual(
@@ -0,0 +1,390 @@
+# The MIT License (MIT)
+# Copyright (c) 2023 by the xcube development team and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+"""Managed local cache directory of files, such as downloaded
+SMOS L2 product files, see :mod:catalog.direct, or mapped chunks,
+see :mod:mldataset.chunkcache.
+
+Files written into the cache directory are recorded in
+an SQLite index file in the directory, together with their size,
+time of last access, and number of accesses. If the total size of
+the recorded files exceeds a quota, files are evicted according to
+an eviction policy, see :class:SmosProductCacheDir.
+
+The index is shared by all processes that use the same directory.
+Files in the directory that are not recorded, such as product
+sidecars, are never evicted.
+
+Accesses of cached files are collected in memory and written to the
+index at most once per access interval, or along with the next
+change of the index made by the same process, so that cache hits
+do not each require a write transaction.
+"""
+
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+# Eviction policies:
+#   - "lru": evict the least recently used files first.
+#   - "lfu": evict the least frequently used files first,
+#     and among those, the least recently used ones.
+EVICTION_POLICY_LRU = "lru"
+EVICTION_POLICY_LFU = "lfu"
+EVICTION_POLICIES = (EVICTION_POLICY_LRU, EVICTION_POLICY_LFU)
+DEFAULT_EVICTION_POLICY = EVICTION_POLICY_LRU
+
+# Name of the index file within the cache directory
+INDEX_FILE_NAME = ".cache-index.sqlite"
+
+# Default interval in seconds, after which collected accesses
+# are written to the index
+DEFAULT_ACCESS_INTERVAL = 10.0
+
+_EVICTION_ORDERS = {
+    EVICTION_POLICY_LRU: "last_access ASC",
+    EVICTION_POLICY_LFU: "access_count ASC, last_access ASC",
+}
+
+_COUNTER_NAMES = ("hits", "misses", "evictions")
+
+LOG = logging.getLogger("xcube-smos")
+
+
+class _AccessLog:
+    """Accesses of cached files not yet written to an index."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Source path --> [size, last_access, access_count]
+        self.accesses: Dict[str, List] = {}
+        self.hits = 0
+        self.last_flush = time.monotonic()
+
+
+# Index path --> access log, shared by all instances in a process
+_ACCESS_LOGS: Dict[str, _AccessLog] = {}
+_ACCESS_LOGS_LOCK = threading.Lock()
+
+
+class SmosProductCacheDir:
+    """A local cache directory of SMOS L2 product files
+    with an optional quota.
+
+    A file is given by its source path, which is also its
+    path relative to the cache directory. Files are looked up
+    using :meth:get_file and recorded once written using
+    :meth:add_file, which evicts other files, if the quota
+    is exceeded. Instances are serializable.
+
+    :param root: Root directory. Created on first use,
+        if it does not exist.
+    :param max_bytes: Optional maximum number of bytes of the
+        recorded files. If not given, files are never evicted,
+        unless :meth:evict or :meth:purge is called.
+    :param eviction_policy: Eviction policy,
+        one of :const:EVICTION_POLICIES.
+    :param access_interval: Interval in seconds, after which
+        accesses collected by :meth:get_file are written to the
+        index. Until then, other processes do not see them.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        max_bytes: Optional[int] = None,
+        eviction_policy: str = DEFAULT_EVICTION_POLICY,
+        access_interval: float = DEFAULT_ACCESS_INTERVAL,
+    ):
+        if eviction_policy not in EVICTION_POLICIES:
+            raise ValueError(f"Invalid eviction policy {eviction_policy!r}")
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+        self.root = str(root)
+        self.max_bytes = max_bytes
+        self.eviction_policy = eviction_policy
+        self.access_interval = access_interval
+
+    @property
+    def index_path(self) -> str:
+        """The path of the index file."""
+        return f"{self.root}/{INDEX_FILE_NAME}"
+
+    def get_path(self, file_path: str) -> str:
+        """Get the local path of the file given by its source *file_path*."""
+        return f"{self.root}/{file_path}"
+
+    def get_file(self, file_path: str) -> Optional[str]:
+        """Look up a cached file and record the access.
+
+        Files that exist, but are not yet recorded, e.g., because
+        they have been written by a previous version, are recorded.
+
+        The returned file may still be evicted by another process
+        before it is opened, hence callers should download the
+        file again, if opening it fails.
+
+        :param file_path: Source path of the file.
+        :return: The local path of the file, or None,
+            if the file is not cached.
+        """
+        local_path = self.get_path(file_path)
+        try:
+            size = os.path.getsize(local_path)
+        except OSError:
+            size = None
+        if size is None:
+            with self._connect() as conn:
+                self._flush_accesses(conn)
+                conn.execute("DELETE FROM files WHERE path = ?", (file_path,))
+                self._increment(conn, "misses")
+            return None
+        self.record_access(file_path, size)
+        return local_path
+
+    def record_access(self, file_path: str, size: int):
+        """Record an access of a cached file that has been read
+        without looking it up using :meth:get_file, counted as hit.
+
+        The access is collected in memory and written to the index
+        once *access_interval* has passed since the last write.
+
+        :param file_path: Source path of the file.
+        :param size: Size of the file in bytes.
+        """
+        access_log = self._access_log
+        with access_log.lock:
+            access = access_log.accesses.get(file_path)
+            if access is None:
+                access_log.accesses[file_path] = [size, time.time(), 1]
+            else:
+                access[0] = size
+                access[1] = time.time()
+                access[2] += 1
+            access_log.hits += 1
+            must_flush = (
+                time.monotonic() - access_log.last_flush >= self.access_interval
+            )
+        if must_flush:
+            with self._connect() as conn:
+                self._flush_accesses(conn)
+
+    def add_file(self, file_path: str) -> List[str]:
+        """Record a file that has been written to its local path,
+        see :meth:get_path. If the quota is exceeded, other files
+        are evicted.
+
+        :param file_path: Source path of the file.
+        :return: Source paths of the evicted files.
+        """
+        size = os.path.getsize(self.get_path(file_path))
+        with self._connect() as conn:
+            self._flush_accesses(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, last_access, access_count)"
+                " VALUES (?, ?, ?, 1)",
+                (file_path, size, time.time()),
+            )
+        if self.max_bytes is None:
+            return []
+        return self.evict(self.max_bytes, keep=file_path)
+
+    def evict(
+        self, max_bytes: Optional[int] = None, keep: Optional[str] = None
+    ) -> List[str]:
+        """Evict files until their total size does not exceed *max_bytes*.
+
+        :param max_bytes: Maximum number of bytes of the remaining files.
+            Defaults to the quota given by the constructor. If neither
+            is given, no files are evicted.
+        :param keep: Optional source path of a file that must not be
+            evicted, e.g., the one just written.
+        :return: Source paths of the evicted files.
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        if max_bytes is None:
+            return []
+        with self._connect() as conn:
+            # Lock the index, so that concurrent evictions
+            # do not select the same files
+            conn.execute("BEGIN IMMEDIATE")
+            # Collected accesses affect the eviction order
+            self._flush_accesses(conn)
+            (nbytes,) = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM files"
+            ).fetchone()
+            evicted_paths = []
+            if nbytes > max_bytes:
+                order = _EVICTION_ORDERS[self.eviction_policy]
+                for file_path, size in conn.execute(
+                    f"SELECT path, size FROM files ORDER BY {order}"
+                ).fetchall():
+                    if nbytes <= max_bytes:
+                        break
+                    if file_path == keep:
+                        continue
+                    evicted_paths.append(file_path)
+                    nbytes -= size
+                conn.executemany(
+                    "DELETE FROM files WHERE path = ?",
+                    [(file_path,) for file_path in evicted_paths],
+                )
+                self._increment(conn, "evictions", len(evicted_paths))
+        for file_path in evicted_paths:
+            LOG.debug("Evicting %s from cache %s", file_path, self.root)
+            self._remove_file(file_path)
+        return evicted_paths
+
+    def purge(self) -> List[str]:
+        """Evict all recorded files.
+
+        :return: Source paths of the evicted files.
+        """
+        return self.evict(0)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Statistics of the cache directory,
+        shared by all processes that use it.
+
+        A dictionary with the number of recorded "files", their
+        total size "nbytes", the quota "max_bytes", and the
+        number of "hits", "misses", and "evictions".
+        Accesses collected by other processes are included
+        once written, see *access_interval*.
+        """
+        with self._connect() as conn:
+            self._flush_accesses(conn)
+            num_files, nbytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files"
+            ).fetchone()
+            counters = dict(conn.execute("SELECT name, value FROM counters"))
+        return {
+            "files": num_files,
+            "nbytes": nbytes,
+            "max_bytes": self.max_bytes,
+            **{name: counters.get(name, 0) for name in _COUNTER_NAMES},
+        }
+
+    def reset_stats(self):
+        """Reset the counters of hits, misses, and evictions."""
+        with self._connect() as conn:
+            self._flush_accesses(conn)
+            conn.execute("DELETE FROM counters")
+
+    @property
+    def _access_log(self) -> _AccessLog:
+        with _ACCESS_LOGS_LOCK:
+            access_log = _ACCESS_LOGS.get(self.index_path)
+            if access_log is None:
+                access_log = _AccessLog()
+                _ACCESS_LOGS[self.index_path] = access_log
+            return access_log
+
+    def _flush_accesses(self, conn: sqlite3.Connection):
+        access_log = self._access_log
+        with access_log.lock:
+            accesses = access_log.accesses
+            hits = access_log.hits
+            access_log.accesses = {}
+            access_log.hits = 0
+            access_log.last_flush = time.monotonic()
+        # Files removed meanwhile, e.g., evicted by another
+        # process, must not be recorded again
+        records = [
+            (file_path, size, last_access, access_count)
+            for file_path, (size, last_access, access_count) in accesses.items()
+            if os.path.exists(self.get_path(file_path))
+        ]
+        conn.executemany(
+            "INSERT INTO files (path, size, last_access, access_count)"
+            " VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (path) DO UPDATE SET"
+            " size = excluded.size,"
+            " last_access = MAX(last_access, excluded.last_access),"
+            " access_count = access_count + excluded.access_count",
+            records,
+        )
+        self._increment(conn, "hits", hits)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        os.makedirs(self.root, exist_ok=True)
+        # Autocommit mode, transactions are begun explicitly
+        conn = sqlite3.connect(self.index_path, timeout=60, isolation_level=None)
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " path TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL,"
+                " access_count INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                " name TEXT PRIMARY KEY,"
+                " value INTEGER NOT NULL)"
+            )
+            yield conn
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    @classmethod
+    def _increment(cls, conn: sqlite3.Connection, name: str, value: int = 1):
+        if value:
+            conn.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?)"
+                " ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                (name, value),
+            )
+
+    def _remove_file(self, file_path: str):
+        local_path = self.get_path(file_path)
+        try:
+            os.remove(local_path)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            # E.g., on Windows, if the file is still open
+            LOG.warning("Failed to evict %s: %s", local_path, e)
+            return
+        # Remove directories that became empty, but not the root
+        root = os.path.abspath(self.root)
+        dir_path = os.path.dirname(os.path.abspath(local_path))
+        while dir_path != root and dir_path.startswith(root + os.sep):
+            try:
+                os.rmdir(dir_path)
+            except OSError:
+                break
+            dir_path = os.path.dirname(dir_path)
@@ -24,6 +24,10 @@ from typing import Dict, Any, Optional, Tuple, List
 
 import pandas as pd
 
+from ..sidecar import ProductSidecar
+from ..sidecar import SmosProductSidecarStore
+from ..sidecar import get_product_name
+from ..sidecar import new_product_sidecar
 from ..utils import NotSerializable
 from .producttype import ProductTypeLike
 from .types import DatasetOpener
@@ -43,13 +47,18 @@ class AbstractSmosCatalog(NotSerializable, abc.ABC):
 
         The default implementation resolves the given *dataset_path*
         and returns the attributes of the dataset opened using the function
-        returned by ``get_dataset_opener()``.
+        returned by ``get_dataset_opener()``. If the catalog has a
+        sidecar store, see ``get_sidecar_store()``, the attributes are
+        taken from the dataset's sidecar instead.
 
         :param dataset_path: Unresolved dataset path as returned by
             ``find_datasets()``.
         :return: The dictionary of dataset attributes
             or ``None``, if they cannot be retrieved.
         """
+        if self.get_sidecar_store() is not None:
+            sidecar = self.get_dataset_sidecar(dataset_path)
+            return None if sidecar is None else dict(sidecar["attrs"])
         resolved_path = self.resolve_path(dataset_path)
         open_dataset = self.get_dataset_opener()
         try:
@@ -60,6 +69,47 @@ class AbstractSmosCatalog(NotSerializable, abc.ABC):
         except OSError:
             return None
 
+    def get_dataset_sidecar(self, dataset_path: str) -> Optional[ProductSidecar]:
+        """Get the sidecar of the dataset given by *dataset_path*,
+        see :func:new_product_sidecar.
+
+        The sidecar is taken from the store returned by
+        ``get_sidecar_store()``, if available. Otherwise, the dataset
+        is opened, its sidecar is computed and then put into the store,
+        if any.
+
+        :param dataset_path: Unresolved dataset path as returned by
+            ``find_datasets()``.
+        :return: The sidecar or ``None``, if it cannot be retrieved.
+        """
+        resolved_path = self.resolve_path(dataset_path)
+        product_name = get_product_name(resolved_path)
+        sidecar_store = self.get_sidecar_store()
+        if sidecar_store is not None:
+            sidecar = sidecar_store.get_sidecar(product_name)
+            if sidecar is not None:
+                return sidecar
+        open_dataset = self.get_dataset_opener()
+        try:
+            with open_dataset(
+                resolved_path, **(self.get_dataset_opener_kwargs() or {})
+            ) as ds:
+                sidecar = new_product_sidecar(ds)
+        except OSError:
+            return None
+        if sidecar_store is not None:
+            sidecar_store.put_sidecar(product_name, sidecar)
+        return sidecar
+
+    # noinspection PyMethodMayBeStatic
+    def get_sidecar_store(self) -> Optional[SmosProductSidecarStore]:
+        """Get the store in which the sidecars of datasets are kept.
+
+        The default implementation returns ``None``,
+        that is, sidecars are not kept.
+        """
+        return None
+
     # noinspection PyMethodMayBeStatic,PyUnusedLocal
     def get_dataset_opener_kwargs(self) -> Dict[str, Any]:
         """Get keyword arguments passed to the function returned by
@@ -28,17 +28,21 @@ from pathlib import Path
 import re
 import shutil
 import tempfile
+import uuid
 from typing import Dict, Any, Set, Iterable, Union, Tuple, Optional, List, Callable
 
 import fsspec
 import pandas as pd
 import xarray as xr
 
+from ..cachedir import DEFAULT_EVICTION_POLICY
+from ..cachedir import SmosProductCacheDir
 from ..constants import COMPACT_DATETIME_FORMAT
 from ..constants import DEFAULT_ARCHIVE_URL
 from ..constants import DEFAULT_STORAGE_OPTIONS
 from ..constants import OS_VAR_NAMES
 from ..constants import SM_VAR_NAMES
+from ..sidecar import SmosProductSidecarStore
 from .base import AbstractSmosCatalog
 from .producttype import ProductType
 from .producttype import ProductTypeLike
@@ -51,6 +55,9 @@ GetFilesForPath = Callable[[str], Iterable[str]]
 
 _ONE_DAY = pd.Timedelta(1, unit="days")
 
+# Name of the directory within the cache path that holds product sidecars
+SIDECARS_DIR_NAME = "sidecars"
+
 LOG = logging.getLogger("xcube-smos")
 
 
@@ -64,6 +71,8 @@ class SmosDirectCatalog(AbstractSmosCatalog):
         source_storage_options: Optional[Dict[str, Any]] = None,
         cache_path: Optional[str] = None,
         xarray_kwargs: Dict[str, Any] = None,
+        cache_max_bytes: Optional[int] = None,
+        cache_eviction_policy: str = DEFAULT_EVICTION_POLICY,
         **extra_source_storage_options,
     ):
         source_path = str(source_path or DEFAULT_ARCHIVE_URL)
@@ -81,6 +90,8 @@ class SmosDirectCatalog(AbstractSmosCatalog):
         self._source_protocol = source_protocol
         self._source_storage_options = source_storage_options or {}
         self._cache_path = os.path.expanduser(cache_path) if cache_path else None
+        self._cache_max_bytes = cache_max_bytes
+        self._cache_eviction_policy = cache_eviction_policy
         self._xarray_kwargs = xarray_kwargs or {}
 
     @cached_property
@@ -93,11 +104,33 @@ class SmosDirectCatalog(AbstractSmosCatalog):
             source_storage_options=self._source_storage_options,
             cache_path=self._cache_path,
             xarray_kwargs=self._xarray_kwargs,
+            cache_max_bytes=self._cache_max_bytes,
+            cache_eviction_policy=self._cache_eviction_policy,
         )
 
     def get_dataset_opener(self) -> DatasetOpener:
         return open_dataset
 
+    def get_cache_dir(self) -> Optional[SmosProductCacheDir]:
+        """Get the cache directory of downloaded product files,
+        e.g., to inspect its statistics or to purge it.
+
+        :return: The cache directory, or ``None``,
+            if no *cache_path* is given.
+        """
+        if not self._cache_path:
+            return None
+        return SmosProductCacheDir(
+            self._cache_path,
+            max_bytes=self._cache_max_bytes,
+            eviction_policy=self._cache_eviction_policy,
+        )
+
+    def get_sidecar_store(self) -> Optional[SmosProductSidecarStore]:
+        if not self._cache_path:
+            return None
+        return SmosProductSidecarStore(f"{self._cache_path}/{SIDECARS_DIR_NAME}")
+
     def find_datasets(
         self,
         product_type: ProductTypeLike,
@@ -161,6 +194,8 @@ def open_dataset(
     source_storage_options: Dict[str, Any] = None,
     cache_path: Optional[str] = None,
     xarray_kwargs: Dict[str, Any] = None,
+    cache_max_bytes: Optional[int] = None,
+    cache_eviction_policy: str = DEFAULT_EVICTION_POLICY,
 ) -> xr.Dataset:
     open_dataset_kwargs = dict(xarray_kwargs or {})
     open_dataset_kwargs.update(decode_cf=False, chunks={})
@@ -186,20 +221,43 @@ def open_dataset(
             ds = xr.open_dataset(local_file, **open_dataset_kwargs)
         return filter_dataset(ds, var_names)
     else:
-        local_file = f"{cache_path}/{source_file}"
-        if not os.path.isfile(local_file):
-            os.makedirs(os.path.dirname(local_file), exist_ok=True)
-            temp_file = local_file + ".temp"
-            LOG.debug("Downloading %s to %s", source_file, temp_file)
-            remote_fs.get(source_file, temp_file)
-            LOG.debug("Opening dataset from %s", temp_file)
-            with xr.open_dataset(temp_file, **open_dataset_kwargs) as ds:
+        cache_dir = SmosProductCacheDir(
+            cache_path, max_bytes=cache_max_bytes, eviction_policy=cache_eviction_policy
+        )
+        local_file = cache_dir.get_file(source_file)
+        if local_file is not None:
+            LOG.debug("Opening dataset from %s", local_file)
+            try:
+                return xr.open_dataset(local_file, **open_dataset_kwargs)
+            except OSError as e:
+                # E.g., evicted by another process after the lookup
+                LOG.debug("Failed to open %s, downloading again: %s", local_file, e)
+        local_file = cache_dir.get_path(source_file)
+        os.makedirs(os.path.dirname(local_file), exist_ok=True)
+        # Unique names, so that concurrent downloads of the same file
+        # do not interfere and the file appears only once written
+        temp_prefix = f"{local_file}.{uuid.uuid4().hex}"
+        download_file = temp_prefix + ".download"
+        filtered_file = temp_prefix + ".temp"
+        try:
+            LOG.debug("Downloading %s to %s", source_file, download_file)
+            remote_fs.get(source_file, download_file)
+            LOG.debug("Opening dataset from %s", download_file)
+            with xr.open_dataset(download_file, **open_dataset_kwargs) as ds:
                 dataset = filter_dataset(ds, var_names)
                 LOG.debug("Writing %s", local_file)
-                dataset.to_netcdf(local_file)
-            os.remove(temp_file)
+                dataset.to_netcdf(filtered_file)
+            os.replace(filtered_file, local_file)
+        finally:
+            for temp_file in (download_file, filtered_file):
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+        # Open before recording, so that the file cannot be
+        # evicted in between
         LOG.debug("Opening dataset from %s", local_file)
-        return xr.open_dataset(local_file, **open_dataset_kwargs)
+        dataset = xr.open_dataset(local_file, **open_dataset_kwargs)
+        cache_dir.add_file(source_file)
+        return dataset
 
 
 def filter_dataset(ds: xr.Dataset, var_names: Set[str]) -> xr.Dataset:
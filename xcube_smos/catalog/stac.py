@@ -31,9 +31,11 @@ from .producttype import ProductTypeLike, ProductType
 from .types import DatasetOpener
 from .types import DatasetRecord
 from .types import DatasetFilter
+from ..cachedir import SmosProductCacheDir
 from .direct import SmosDirectCatalog
 from ..constants import DEFAULT_STAC_PAGE_LIMIT
 from ..constants import DEFAULT_STAC_SMOS_URL
+from ..sidecar import SmosProductSidecarStore
 
 FeatureFilter = Callable[[Dict[str, Any]], bool]
 
@@ -65,6 +67,12 @@ class SmosStacCatalog(SmosDirectCatalog):
     def get_dataset_opener(self) -> DatasetOpener:
         return self._direct_catalog.get_dataset_opener()
 
+    def get_cache_dir(self) -> Optional[SmosProductCacheDir]:
+        return self._direct_catalog.get_cache_dir()
+
+    def get_sidecar_store(self) -> Optional[SmosProductSidecarStore]:
+        return self._direct_catalog.get_sidecar_store()
+
     def find_datasets(
         self,
         product_type: ProductTypeLike,
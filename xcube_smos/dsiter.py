@@ -26,8 +26,14 @@ import numpy as np
 import xarray as xr
 
 from xcube.core.mldataset import MultiLevelDataset
+from xcube_smos.mldataset.l2cube import DEFAULT_MAPPING_MODE
+from xcube_smos.mldataset.l2cube import MaskRules
+from xcube_smos.mldataset.l2cube import STATS_NAMES
+from xcube_smos.mldataset.l2cube import STATS_VAR_SUFFIX
 from xcube_smos.mldataset.l2cube import SmosL2Product
-from xcube_smos.mldataset.l2cube import get_dataset_spatial_subset
+from xcube_smos.mldataset.l2cube import get_bbox_region
+from xcube_smos.mldataset.l2cube import get_stats_attrs
+from xcube_smos.utils import BufferPool
 
 
 # TODO: Replace by new xcube "dsiter" type.
@@ -50,6 +56,10 @@ class SmosDatasetIterator(DatasetIterator):
         bbox: tuple[float, float, float, float] | None,
         res_level: int,
         var_names: set[str],
+        mapping_mode: str = DEFAULT_MAPPING_MODE,
+        parallel_mapping: bool = False,
+        compute_stats: bool = False,
+        mask_rules: MaskRules | None = None,
     ):
         self._dgg = dgg
         self._dataset_opener = dataset_opener
@@ -59,6 +69,11 @@ class SmosDatasetIterator(DatasetIterator):
         self._bbox = bbox
         self._res_level = res_level
         self._var_names = var_names
+        self._mapping_mode = mapping_mode
+        self._parallel_mapping = parallel_mapping
+        self._compute_stats = compute_stats
+        self._mask_rules = mask_rules
+        self._buffer_pool = BufferPool()
         self._current_index = 0
 
     @property
@@ -80,20 +95,48 @@ class SmosDatasetIterator(DatasetIterator):
         res_level = self._res_level
 
         l2_dataset = self._dataset_opener(dataset_path, **self._dataset_opener_kwargs)
-        l2_product = SmosL2Product(dgg, l2_dataset)
+        l2_product = SmosL2Product(
+            dgg,
+            l2_dataset,
+            mapping_mode=self._mapping_mode,
+            parallel_mapping=self._parallel_mapping,
+            buffer_pool=self._buffer_pool,
+            mask_rules=self._mask_rules,
+        )
+
+        dgg_ds = dgg.get_dataset(self._res_level)
+        # We map the region of the bbox only, rather than
+        # mapping globally and subsetting afterwards
+        region = (
+            None
+            if bbox is None
+            else get_bbox_region(
+                bbox, dgg_ds.lon.values, dgg_ds.lat.values, dgg.grid_mapping
+            )
+        )
+        if region is not None:
+            y_slice, x_slice = region
+            dgg_ds = dgg_ds.isel(lat=y_slice, lon=x_slice)
 
-        mapped_l2_product = l2_product.get_mapped_s2_product(res_level)
+        mapped_l2_product = l2_product.get_mapped_s2_product(res_level, region=region)
 
         mapped_dims = "time", "lat", "lon"
 
-        dgg_ds = dgg.get_dataset(self._res_level)
         h, w = dgg_ds.seqnum.shape
         mapped_chunks = 1, h, w
 
+        mapped_var_data_dict = mapped_l2_product.map_l2_vars(
+            [
+                var_name
+                for var_name in l2_dataset.data_vars
+                if var_name in self._var_names
+            ]
+        )
+
         mapped_data_vars = {}
         for var_name, var in l2_dataset.data_vars.items():
-            if var_name in self._var_names:
-                mapped_var_data = mapped_l2_product.map_l2_var(var_name)
+            if var_name in mapped_var_data_dict:
+                mapped_var_data = mapped_var_data_dict[var_name]
                 mapped_var = xr.DataArray(
                     mapped_var_data, dims=mapped_dims, attrs=var.attrs
                 )
@@ -103,6 +146,12 @@ class SmosDatasetIterator(DatasetIterator):
                     "preferred_chunks": dict(zip(mapped_dims, mapped_chunks)),
                 }
                 mapped_data_vars[var_name] = mapped_var
+                if self._compute_stats:
+                    mapped_data_vars[var_name + STATS_VAR_SUFFIX] = xr.DataArray(
+                        mapped_l2_product.compute_l2_var_stats(var_name)[None, :],
+                        dims=("time", "stat"),
+                        attrs=get_stats_attrs(var_name),
+                    )
 
         time_encoding = {
             "calendar": "proleptic_gregorian",
@@ -126,18 +175,16 @@ class SmosDatasetIterator(DatasetIterator):
         )
         time.encoding.update(time_encoding)
 
+        coords = {**dgg_ds.coords, "time": time, "time_bnds": time_bnds}
+        if self._compute_stats:
+            coords["stat"] = xr.DataArray(np.array(STATS_NAMES), dims="stat")
+
         mapped_l2_dataset = xr.Dataset(
             mapped_data_vars,
-            coords={**dgg_ds.coords, "time": time, "time_bnds": time_bnds},
+            coords=coords,
             attrs=l2_dataset.attrs,
         )
 
-        mapped_l2_dataset = (
-            mapped_l2_dataset
-            if bbox is None
-            else get_dataset_spatial_subset(mapped_l2_dataset, bbox, dgg.grid_mapping)
-        )
-
         self._current_index += 1
 
         return mapped_l2_dataset
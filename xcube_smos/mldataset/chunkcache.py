@@ -0,0 +1,358 @@
+# The MIT License (MIT)
+# Copyright (c) 2023 by the xcube development team and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""Shared cache of mapped chunks of SMOS L2 cubes.
+
+Chunks are stored in a cache backend, see :class:CacheBackend,
+one value per SMOS L2 product, resolution level, variable and
+spatial chunk, using the key::
+
+    v<version>/<variant>/<product>/<level>/<variable>/<y0>-<y1>-<x0>-<x1>
+
+where the spatial chunk is given by its bounds in the global raster
+of the level, so that cached chunks are shared by all cubes,
+irrespective of their bounding box and tile size. The version is
+the :const:CHUNK_FORMAT_VERSION, the variant identifies the settings
+that affect the mapped values, such as the mapping mode and quality
+mask rules, see :func:get_chunk_cache_variant. The version of the
+SMOS L2 product is part of its file name.
+
+A value comprises a single line JSON header with the array's data type
+and shape, followed by the array data compressed by Blosc.
+
+Backends are available for process memory, a local directory,
+which can be shared by the processes on a host, and a Redis server,
+which can be shared by the dask workers of a cluster. The size of
+the memory and directory backends can be bounded by a maximum number
+of bytes, the size of a Redis server by a time-to-live of the values
+or by the server's own memory policy.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import numcodecs
+import numpy as np
+
+from ..cachedir import DEFAULT_EVICTION_POLICY
+from ..cachedir import SmosProductCacheDir
+from ..utils import LruCache
+from ..utils import new_default_codec
+
+DEFAULT_VARIANT = "default"
+
+# Version of the format of cached chunks and of the way they are mapped.
+# Must be incremented whenever either changes, so that chunks
+# cached by other versions are not used anymore.
+CHUNK_FORMAT_VERSION = 1
+
+
+class CacheBackend(ABC):
+    """A store of binary values addressed by string keys.
+    Keys comprise path components separated by slashes.
+
+    Backends used by :class:SmosChunkCache are passed to dask workers,
+    hence they must be serializable.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Get the value for *key*, or None, if there is none."""
+
+    @abstractmethod
+    def put(self, key: str, value: bytes):
+        """Put the *value* for *key*."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """A backend that keeps the least recently used values in the
+    memory of the current process. When serialized, the values
+    are not included, so that every process has its own values.
+
+    :param max_bytes: Maximum number of bytes of the values.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._values = self._new_values()
+
+    def _new_values(self) -> LruCache[str, bytes]:
+        return LruCache[str, bytes](
+            max_size=sys.maxsize, max_bytes=self.max_bytes, get_value_size=len
+        )
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_values"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]):
+        self.__dict__.update(state)
+        self._values = self._new_values()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._values.get(key)
+
+    def put(self, key: str, value: bytes):
+        self._values.put(key, value)
+
+
+class DiskCacheBackend(CacheBackend):
+    """A backend that stores values as files in a local directory,
+    one file per key. Files are written atomically, so the
+    directory can be shared by multiple processes.
+
+    If *max_bytes* is given, the files are recorded in an index
+    in the directory and evicted once their total size exceeds
+    *max_bytes*, see :class:cachedir.SmosProductCacheDir.
+    Otherwise, the directory grows without bound and must be
+    cleaned up externally.
+
+    :param root: Root directory. Created on first write,
+        if it does not exist.
+    :param max_bytes: Optional maximum number of bytes of the files.
+    :param eviction_policy: Eviction policy, one of
+        :const:cachedir.EVICTION_POLICIES.
+        Used only if *max_bytes* is given.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        max_bytes: Optional[int] = None,
+        eviction_policy: str = DEFAULT_EVICTION_POLICY,
+    ):
+        self.root = Path(os.path.expanduser(str(root)))
+        self.max_bytes = max_bytes
+        self.cache_dir = (
+            SmosProductCacheDir(
+                self.root, max_bytes=max_bytes, eviction_policy=eviction_policy
+            )
+            if max_bytes is not None
+            else None
+        )
+
+    def get_path(self, key: str) -> Path:
+        """Get the path of the file for *key*."""
+        return self.root.joinpath(*key.split("/"))
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            value = self.get_path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+        if self.cache_dir is not None:
+            # Misses are not recorded and hits are written to
+            # the index in batches, so reads rarely write it
+            self.cache_dir.record_access(key, len(value))
+        return value
+
+    def put(self, key: str, value: bytes):
+        path = self.get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.temp")
+        temp_path.write_bytes(value)
+        os.replace(temp_path, path)
+        if self.cache_dir is not None:
+            self.cache_dir.add_file(key)
+
+
+class RedisCacheBackend(CacheBackend):
+    """A backend that stores values in a Redis server, or any other
+    key-value store that speaks the Redis protocol.
+    Requires the package ``redis``.
+
+    :param url: Redis URL, e.g., "redis://localhost:6379/0".
+    :param key_prefix: Prefix of all keys.
+    :param ttl: Optional time-to-live of values in seconds.
+    :param client: Optional Redis client, e.g., for testing.
+        If given, the backend is not serializable.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        key_prefix: str = "xcube-smos/chunks/",
+        ttl: Optional[int] = None,
+        client: Any = None,
+    ):
+        if url is None and client is None:
+            raise ValueError("Either url or client must be given")
+        self.url = url
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self._client = client
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        if self.url is None:
+            raise RuntimeError("Redis backends given a client are not serializable")
+        state = self.__dict__.copy()
+        del state["_client"]
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]):
+        self.__dict__.update(state)
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Any:
+        """The Redis client, created on first access."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    try:
+                        import redis
+                    except ImportError as e:
+                        raise ImportError(
+                            "RedisCacheBackend requires the package 'redis'"
+                        ) from e
+                    self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.key_prefix + key)
+
+    def put(self, key: str, value: bytes):
+        self.client.set(self.key_prefix + key, value, ex=self.ttl)
+
+
+class SmosChunkCache:
+    """A shared cache of mapped chunks.
+
+    Instances are serializable, if their backend is, so that
+    the cache can be used by dask workers.
+
+    :param backend: The cache backend, or the root directory
+        of a :class:DiskCacheBackend.
+    :param variant: Identifies the settings that affect the mapped
+        values, see :func:get_chunk_cache_variant.
+    :param codec: Optional codec used for compression,
+        defaults to :func:utils.new_default_codec.
+    """
+
+    def __init__(
+        self,
+        backend: Union[CacheBackend, str, Path],
+        variant: str = DEFAULT_VARIANT,
+        codec: Optional[numcodecs.abc.Codec] = None,
+    ):
+        if not isinstance(backend, CacheBackend):
+            backend = DiskCacheBackend(backend)
+        self.backend = backend
+        self.variant = variant
+        self.codec = codec if codec is not None else new_default_codec()
+
+    def get_chunk_key(
+        self,
+        product_name: str,
+        level: int,
+        var_name: str,
+        bounds: tuple[int, int, int, int],
+    ) -> str:
+        """Get the key of a chunk.
+
+        :param product_name: File name of the SMOS L2 product.
+        :param level: Resolution level.
+        :param var_name: Variable name.
+        :param bounds: Chunk bounds (y_start, y_stop, x_start, x_stop)
+            in the global raster of the level.
+        """
+        return "/".join(
+            (
+                f"v{CHUNK_FORMAT_VERSION}",
+                self.variant,
+                product_name,
+                str(level),
+                var_name,
+                "-".join(map(str, bounds)),
+            )
+        )
+
+    def get_chunk(
+        self,
+        product_name: str,
+        level: int,
+        var_name: str,
+        bounds: tuple[int, int, int, int],
+    ) -> Optional[np.ndarray]:
+        """Get a cached chunk, see :meth:get_chunk_key for the parameters.
+
+        :return: The chunk, or None, if it is not cached.
+        """
+        value = self.backend.get(
+            self.get_chunk_key(product_name, level, var_name, bounds)
+        )
+        if value is None:
+            return None
+        header, data = value.split(b"\n", 1)
+        header = json.loads(header)
+        array = np.empty(header["shape"], dtype=np.dtype(header["dtype"]))
+        if array.size > 0:
+            self.codec.decode(data, out=array)
+        return array
+
+    def put_chunk(
+        self,
+        product_name: str,
+        level: int,
+        var_name: str,
+        bounds: tuple[int, int, int, int],
+        array: np.ndarray,
+    ):
+        """Put a chunk, see :meth:get_chunk_key for the parameters.
+
+        :param array: The chunk. An empty array may be used as a marker,
+            e.g., for chunks known to contain fill values only.
+        """
+        header = {"dtype": array.dtype.str, "shape": list(array.shape)}
+        data = b""
+        if array.size > 0:
+            data = self.codec.encode(np.ascontiguousarray(array))
+        self.backend.put(
+            self.get_chunk_key(product_name, level, var_name, bounds),
+            json.dumps(header).encode("utf-8") + b"\n" + bytes(data),
+        )
+
+
+def get_chunk_cache_variant(**settings: Any) -> str:
+    """Get the name of the variant of a chunk cache
+    for the given *settings* that affect the mapped values.
+    All such settings must be given, e.g., *mapping_mode*
+    and *mask_rules*. Settings whose value is None are ignored.
+
+    :return: "default", if no settings are given,
+        otherwise a hash of the settings.
+    """
+    settings = {k: v for k, v in settings.items() if v is not None}
+    if not settings:
+        return DEFAULT_VARIANT
+    text = json.dumps(settings, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
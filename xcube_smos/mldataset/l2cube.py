@@ -1,26 +1,48 @@
+import contextlib
 import logging
-import warnings
+import math
+import sys
+import threading
 from typing import Dict, Any, Callable, List
-from typing import Hashable, Union
+from typing import Hashable, Iterable, Sequence, Union
 
 import numba as nb
 import numpy as np
+import scipy.sparse as sp
 import xarray as xr
+from xarray.backends import BackendArray
+from xarray.core import indexing
 from xcube.core.gridmapping import GridMapping
 from xcube.core.mldataset import LazyMultiLevelDataset
 from xcube.core.mldataset import MultiLevelDataset
 from xcube.core.zarrstore import GenericArray
 from xcube.core.zarrstore import GenericZarrStore
+from xcube.core.zarrstore.generic import get_array_slices
 
+from .chunkcache import SmosChunkCache
 from .dgg import SmosDiscreteGlobalGrid
 from .newdgg import MAX_HEIGHT
 from .newdgg import MAX_WIDTH
 from .newdgg import MIN_PIXEL_SIZE
+from .newdgg import get_dgg_level_array
+from .newdgg import get_dgg_level_object
+from .newdgg import get_dgg_seqnum
 from .newdgg import new_dgg
+from .sparse import map_seqnum_columns
+from .sparse import new_selection_matrix
+from .sparse import select_window_rows
 from ..constants import OS_VAR_NAMES
 from ..constants import SM_VAR_NAMES
+from ..sidecar import ProductSidecar
+from ..sidecar import SmosProductSidecarStore
+from ..sidecar import get_l2_fill_values
+from ..sidecar import get_product_name
+from ..sidecar import new_product_sidecar
+from ..utils import BufferPool
+from ..utils import CompressedArrayCache
 from ..utils import LruCache
 from ..utils import NotSerializable
+from ..utils import SingleFlight
 
 LOG = logging.getLogger("xcube-smos")
 
@@ -40,6 +62,55 @@ LOG = logging.getLogger("xcube-smos")
 
 DATASET_VAR_NAMES = {"SMOS-L2C-OS": OS_VAR_NAMES, "SMOS-L2C-SM": SM_VAR_NAMES}
 
+# Mapping modes:
+#   - "index": materialize a per-product, per-level index raster
+#     that maps every pixel to an L2 index. Fast, but memory-intensive.
+#   - "compact": keep only the per-product seqnum-to-index table and
+#     resolve the static DGG seqnum raster on the fly during mapping.
+#   - "sparse": map values using a static, per-level sparse selection
+#     matrix, see module sparse. Values of multiple variables and
+#     products can be mapped at once, see map_l2_products_vars().
+MAPPING_MODE_INDEX = "index"
+MAPPING_MODE_COMPACT = "compact"
+MAPPING_MODE_SPARSE = "sparse"
+MAPPING_MODES = (MAPPING_MODE_INDEX, MAPPING_MODE_COMPACT, MAPPING_MODE_SPARSE)
+DEFAULT_MAPPING_MODE = MAPPING_MODE_INDEX
+
+# L2 product cache modes:
+#   - "lru": keep the l2_product_cache_size least recently used products.
+#   - "consumption": keep a product until all chunks of its time step
+#     expected for a level have been requested, then dispose it,
+#     see SmosL2ProductConsumption.
+L2_PRODUCT_CACHE_MODE_LRU = "lru"
+L2_PRODUCT_CACHE_MODE_CONSUMPTION = "consumption"
+L2_PRODUCT_CACHE_MODES = (L2_PRODUCT_CACHE_MODE_LRU, L2_PRODUCT_CACHE_MODE_CONSUMPTION)
+DEFAULT_L2_PRODUCT_CACHE_MODE = L2_PRODUCT_CACHE_MODE_LRU
+
+# Maximum number of bytes of mapped chunks kept until requested
+# by sibling variables, see SmosTimeStepLoader.load_time_step()
+DEFAULT_SIBLING_CACHE_BYTES = 256 * 1024 * 1024
+# Maximum number of chunk windows remembered to have been mapped
+# along with sibling variables, see SmosTimeStepLoader.load_time_step()
+MAX_SIBLING_WINDOWS = 4096
+
+# A window given as pair of slices (y, x) into a raster
+Window = tuple[slice, slice]
+
+# Schema of an L2 variable given as triple (dtype, attrs, fill_value)
+L2VarSchema = tuple[np.dtype, Dict[str, Any], Union[int, float]]
+
+# Names of the per-time-step statistics of a variable,
+# see SmosMappedL2Product.compute_l2_var_stats()
+STATS_NAMES = ("count", "min", "max", "mean", "sum_sq")
+# Suffix of the names of variables that provide statistics
+STATS_VAR_SUFFIX = "_stats"
+
+# Quality mask rules map variable names to rules, where
+# a rule is a mapping with the optional keys "min" and "max",
+# see compute_l2_mask()
+MaskRules = Dict[str, Dict[str, float]]
+MASK_RULE_KEYS = ("min", "max")
+
 
 class SmosL2Cube(NotSerializable, LazyMultiLevelDataset):
     """
@@ -51,6 +122,18 @@ class SmosL2Cube(NotSerializable, LazyMultiLevelDataset):
         time has the same length as *dataset_paths*.
     :param time_step_loader: Serializable class that can load data
         for time steps.
+    :param tile_size: Optional size of spatial chunks in pixels.
+        If not given, variables are not chunked in spatial dimensions.
+    :param lazy_indexing: Whether to represent variables by lazily
+        indexed arrays of type :class:SmosL2Array rather than by
+        chunked arrays. If so, only the pixels of the time steps
+        selected by indexing are mapped.
+    :param compute_stats: Whether to provide for every variable
+        an additional variable "<var_name>_stats" with dimensions
+        (time, stat), see :meth:SmosMappedL2Product.compute_l2_var_stats.
+    :param product_sidecar: Optional sidecar of the first product,
+        see :func:new_product_sidecar. If given, the variables are
+        described using the sidecar rather than the opened product.
     """
 
     def __init__(
@@ -60,6 +143,10 @@ class SmosL2Cube(NotSerializable, LazyMultiLevelDataset):
         time_bounds: np.array,
         bbox: tuple[float, float, float, float] | None,
         time_step_loader: "SmosTimeStepLoader",
+        tile_size: int | None = None,
+        lazy_indexing: bool = False,
+        compute_stats: bool = False,
+        product_sidecar: ProductSidecar | None = None,
     ):
         super().__init__()
         self.dgg = dgg
@@ -67,6 +154,10 @@ class SmosL2Cube(NotSerializable, LazyMultiLevelDataset):
         self.time_bounds = time_bounds
         self.bbox = bbox
         self.time_step_loader = time_step_loader
+        self.tile_size = tile_size
+        self.lazy_indexing = lazy_indexing
+        self.compute_stats = compute_stats
+        self.product_sidecar = product_sidecar
 
     def _get_num_levels_lazily(self) -> int:
         return self.dgg.num_levels
@@ -84,37 +175,104 @@ class SmosL2Cube(NotSerializable, LazyMultiLevelDataset):
         height = MAX_HEIGHT // scale
         spatial_res = MIN_PIXEL_SIZE * scale
 
-        # Load prototype product (cached)
-        l2_product = self.time_step_loader.load_l2_product(0)
+        lon = np.linspace(-180 + spatial_res / 2, +180 - spatial_res / 2, width)
+        lat = np.linspace(
+            +height * spatial_res / 2 - spatial_res / 2,
+            -height * spatial_res / 2 + spatial_res / 2,
+            height,
+        )
+        # We map the region of the bbox only, rather than
+        # mapping globally and subsetting afterwards
+        region = (
+            None
+            if self.bbox is None
+            else get_bbox_region(self.bbox, lon, lat, self.dgg.grid_mapping)
+        )
+        if region is not None:
+            y_slice, x_slice = region
+            lon = lon[x_slice]
+            lat = lat[y_slice]
+            height, width = len(lat), len(lon)
+
+        l2_var_schemas = self._get_l2_var_schemas()
 
         time_bounds = self.time_bounds
         time_start = time_bounds[:, 0]
         time_stop = time_bounds[:, 1]
         time = time_start + (time_stop - time_start) / 2
 
+        if self.lazy_indexing:
+            return self._get_lazy_dataset(level, region, l2_var_schemas, time, lon, lat)
+
+        if self.tile_size:
+            chunks = 1, min(self.tile_size, height), min(self.tile_size, width)
+        else:
+            chunks = 1, height, width
+        # Zarr requires chunk sizes > 0, even for empty regions
+        chunks = tuple(max(1, c) for c in chunks)
+
         # Note, it is important that the get_data function and its parameters
         # get_data_params is serializable and slim when serialized.
         # Therefore, we pack the stuff that we need to fetch L2 data into
         # a separate, serializable data class TimeStepLoader.
 
+        l2_var_names = tuple(l2_var_schemas.keys())
         global_l2_vars = [
             GenericArray(
                 name=var_name,
-                dtype=var.dtype.str,
+                dtype=dtype.str,
                 dims=("time", "lat", "lon"),
                 shape=(len(time), height, width),
-                chunks=(1, height, width),
+                chunks=chunks,
                 get_data=self.time_step_loader.load_time_step,
-                get_data_params=dict(level=level),
-                fill_value=_sanitize_attr_value(l2_product.l2_fill_values[var_name]),
+                get_data_params=dict(
+                    level=level, region=region, var_names=l2_var_names
+                ),
+                fill_value=_sanitize_attr_value(fill_value),
                 chunk_encoding="ndarray",
-                attrs=_sanitize_attrs(var.attrs),
+                attrs=_sanitize_attrs(attrs),
             )
-            for var_name, var in l2_product.l2_dataset.data_vars.items()
-            if var_name in DATASET_VAR_NAMES[self.dataset_id]
+            for var_name, (dtype, attrs, fill_value) in l2_var_schemas.items()
         ]
 
-        zarr_store = GenericZarrStore(
+        stats_vars = []
+        if self.compute_stats:
+            stats_vars = [
+                GenericArray(
+                    name="stat",
+                    dims="stat",
+                    data=np.array(STATS_NAMES),
+                ),
+                *(
+                    GenericArray(
+                        name=var_name + STATS_VAR_SUFFIX,
+                        dtype=np.dtype(np.float64).str,
+                        dims=("time", "stat"),
+                        shape=(len(time), len(STATS_NAMES)),
+                        chunks=(1, len(STATS_NAMES)),
+                        get_data=self.time_step_loader.load_time_step_stats,
+                        get_data_params=dict(
+                            level=level, region=region, l2_var_name=var_name
+                        ),
+                        fill_value=float(np.nan),
+                        chunk_encoding="ndarray",
+                        attrs=get_stats_attrs(var_name),
+                    )
+                    for var_name in l2_var_names
+                ),
+            ]
+
+        # Every time step of a level is requested once per chunk
+        # of a variable, so products can be disposed once consumed
+        num_tiles = math.ceil(height / chunks[1]) * math.ceil(width / chunks[2])
+        num_requests = len(global_l2_vars) * num_tiles
+        if self.compute_stats:
+            # Statistics have a single chunk per time step
+            num_requests += len(global_l2_vars)
+        self.time_step_loader.set_num_time_step_requests(level, num_requests)
+
+        zarr_store = SmosL2CubeZarrStore(
+            self.time_step_loader,
             GenericArray(
                 name="time",
                 dims="time",
@@ -133,7 +291,7 @@ class SmosL2Cube(NotSerializable, LazyMultiLevelDataset):
             GenericArray(
                 name="lon",
                 dims="lon",
-                data=np.linspace(-180 + spatial_res / 2, +180 - spatial_res / 2, width),
+                data=lon,
                 attrs={
                     "long_name": "longitude",
                     "standard_name": "longitude",
@@ -143,11 +301,7 @@ class SmosL2Cube(NotSerializable, LazyMultiLevelDataset):
             GenericArray(
                 name="lat",
                 dims="lat",
-                data=np.linspace(
-                    +height * spatial_res / 2 - spatial_res / 2,
-                    -height * spatial_res / 2 + spatial_res / 2,
-                    height,
-                ),
+                data=lat,
                 attrs={
                     "long_name": "latitude",
                     "standard_name": "latitude",
@@ -155,6 +309,7 @@ class SmosL2Cube(NotSerializable, LazyMultiLevelDataset):
                 },
             ),
             *global_l2_vars,
+            *stats_vars,
             attrs={
                 "coordinates": "lon lat time time_bnds",
             },
@@ -162,9 +317,110 @@ class SmosL2Cube(NotSerializable, LazyMultiLevelDataset):
 
         dataset = xr.open_zarr(zarr_store)
         dataset.zarr_store.set(zarr_store)
-        return (
-            dataset if self.bbox is None else self._get_dataset_spatial_subset(dataset)
+        return dataset
+
+    def _get_l2_var_schemas(self) -> Dict[str, L2VarSchema]:
+        """Get the schemas of the cube's L2 variables from the
+        product sidecar, if given, otherwise from the first product.
+        """
+        var_names = DATASET_VAR_NAMES[self.dataset_id]
+        if self.product_sidecar is not None:
+            return {
+                var_name: (np.dtype(var["dtype"]), var["attrs"], var["fill_value"])
+                for var_name, var in self.product_sidecar["variables"].items()
+                if var_name in var_names
+            }
+        # Load prototype product (cached)
+        l2_product = self.time_step_loader.load_l2_product(0)
+        return {
+            var_name: (var.dtype, var.attrs, l2_product.l2_fill_values[var_name])
+            for var_name, var in l2_product.l2_dataset.data_vars.items()
+            if var_name in var_names
+        }
+
+    def _get_lazy_dataset(
+        self,
+        level: int,
+        region: Window | None,
+        l2_var_schemas: Dict[str, L2VarSchema],
+        time: np.ndarray,
+        lon: np.ndarray,
+        lat: np.ndarray,
+    ) -> xr.Dataset:
+        shape = len(time), len(lat), len(lon)
+        l2_vars = {
+            var_name: xr.Variable(
+                ("time", "lat", "lon"),
+                indexing.LazilyIndexedArray(
+                    SmosL2Array(
+                        self.time_step_loader,
+                        var_name,
+                        dtype,
+                        shape,
+                        level,
+                        region=region,
+                    )
+                ),
+                attrs={
+                    **_sanitize_attrs(attrs),
+                    "_FillValue": _sanitize_attr_value(fill_value),
+                },
+            )
+            for var_name, (dtype, attrs, fill_value) in l2_var_schemas.items()
+        }
+        coords = {}
+        if self.compute_stats:
+            coords["stat"] = xr.Variable("stat", np.array(STATS_NAMES))
+            for var_name in list(l2_vars.keys()):
+                l2_vars[var_name + STATS_VAR_SUFFIX] = xr.Variable(
+                    ("time", "stat"),
+                    indexing.LazilyIndexedArray(
+                        SmosL2StatsArray(
+                            self.time_step_loader,
+                            var_name,
+                            len(time),
+                            level,
+                            region=region,
+                        )
+                    ),
+                    attrs=get_stats_attrs(var_name),
+                )
+        dataset = xr.Dataset(
+            l2_vars,
+            coords=dict(
+                time=xr.Variable(
+                    "time",
+                    time,
+                    attrs={
+                        "long_name": "time",
+                        "standard_name": "time",
+                        "bounds": "time_bnds",
+                    },
+                ),
+                time_bnds=xr.Variable(("time", "bnds"), self.time_bounds),
+                lon=xr.Variable(
+                    "lon",
+                    lon,
+                    attrs={
+                        "long_name": "longitude",
+                        "standard_name": "longitude",
+                        "units": "degrees_east",
+                    },
+                ),
+                lat=xr.Variable(
+                    "lat",
+                    lat,
+                    attrs={
+                        "long_name": "latitude",
+                        "standard_name": "latitude",
+                        "units": "degrees_north",
+                    },
+                ),
+                **coords,
+            ),
         )
+        # Decode fill values the same way as xr.open_zarr() does
+        return xr.decode_cf(dataset)
 
     def _get_dataset_spatial_subset(self, dataset: xr.Dataset) -> xr.Dataset:
         return get_dataset_spatial_subset(dataset, self.bbox, self.dgg.grid_mapping)
@@ -173,18 +429,238 @@ class SmosL2Cube(NotSerializable, LazyMultiLevelDataset):
 def get_dataset_spatial_subset(
     dataset: xr.Dataset, bbox: tuple[float, float, float, float], global_gm: GridMapping
 ) -> xr.Dataset:
+    if is_global_bbox(bbox, global_gm):
+        return dataset
+    x_min, y_min, x_max, y_max = bbox
+    return dataset.sel(lon=slice(x_min, x_max), lat=slice(y_max, y_min))
+
+
+def get_bbox_region(
+    bbox: tuple[float, float, float, float],
+    lon: np.ndarray,
+    lat: np.ndarray,
+    global_gm: GridMapping,
+) -> Window | None:
+    """Get the region of a raster covered by *bbox*.
+
+    The region is the same as selected by :func:get_dataset_spatial_subset
+    for a dataset with the given coordinates.
+
+    :param bbox: Bounding box (x_min, y_min, x_max, y_max)
+        in geographical coordinates
+    :param lon: 1D array of ascending longitudes of the raster
+    :param lat: 1D array of descending latitudes of the raster
+    :param global_gm: Global grid mapping of the DGG
+    :return: Region given as pair of slices (y, x) or None,
+        if *bbox* covers the globe.
+    """
+    if is_global_bbox(bbox, global_gm):
+        return None
+    x_min, y_min, x_max, y_max = bbox
+    x_start = np.searchsorted(lon, x_min, side="left")
+    x_stop = np.searchsorted(lon, x_max, side="right")
+    # Latitudes are descending
+    y_start = np.searchsorted(-lat, -y_max, side="left")
+    y_stop = np.searchsorted(-lat, -y_min, side="right")
+    return slice(int(y_start), int(y_stop)), slice(int(x_start), int(x_stop))
+
+
+def is_global_bbox(
+    bbox: tuple[float, float, float, float], global_gm: GridMapping
+) -> bool:
+    """Test whether *bbox* covers the entire DGG.
+
+    :param bbox: Bounding box (x_min, y_min, x_max, y_max)
+        in geographical coordinates
+    :param global_gm: Global grid mapping of the DGG
+    :return: True, if so.
+    """
     assert isinstance(bbox, (tuple, list))
     assert len(bbox) == 4
     x_min, y_min, x_max, y_max = bbox
     eps = MIN_PIXEL_SIZE
-    if (
+    return (
         x_min < global_gm.x_min + eps
         and x_max > global_gm.x_max - eps
         and y_min < global_gm.y_min + eps
         and y_max > global_gm.y_max - eps
+    )
+
+
+class SmosL2Array(BackendArray):
+    """A lazily indexed array that represents a SMOS L2 variable
+    mapped onto the DGG at a given resolution level.
+
+    The array supports orthogonal indexing. Only the pixels of the
+    time steps selected by indexing are mapped, which makes it
+    efficient to extract small windows or time series of points.
+
+    :param time_step_loader: Loader for the SMOS L2 products.
+    :param var_name: The L2 variable name.
+    :param dtype: The data type of the L2 variable.
+    :param shape: The array shape (time, lat, lon).
+    :param level: Resolution level.
+    :param region: Optional region given as pair of slices (y, x),
+        see :meth:SmosL2Product.get_mapped_s2_product.
+    """
+
+    def __init__(
+        self,
+        time_step_loader: "SmosTimeStepLoader",
+        var_name: str,
+        dtype: np.dtype,
+        shape: tuple[int, int, int],
+        level: int,
+        region: Window | None = None,
     ):
-        return dataset
-    return dataset.sel(lon=slice(x_min, x_max), lat=slice(y_max, y_min))
+        self.time_step_loader = time_step_loader
+        self.var_name = var_name
+        self.dtype = np.dtype(dtype)
+        self.shape = shape
+        self.level = level
+        self.region = region
+
+    def __getitem__(self, key: indexing.ExplicitIndexer) -> np.ndarray:
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.OUTER, self._get_values
+        )
+
+    def _get_values(self, key: tuple) -> np.ndarray:
+        time_indexes, y_indexes, x_indexes = (
+            np.atleast_1d(np.arange(size)[k]) for k, size in zip(key, self.shape)
+        )
+        values = np.empty(
+            (len(time_indexes), len(y_indexes), len(x_indexes)), dtype=self.dtype
+        )
+        if values.size > 0:
+            # Map the smallest window that contains all selected pixels
+            y_start, x_start = y_indexes.min(), x_indexes.min()
+            window = (
+                slice(y_start, y_indexes.max() + 1),
+                slice(x_start, x_indexes.max() + 1),
+            )
+            window_indexes = np.ix_(y_indexes - y_start, x_indexes - x_start)
+            for i, time_idx in enumerate(time_indexes):
+                l2_product = self.time_step_loader.load_l2_product(time_idx)
+                mapped_l2_product = l2_product.get_mapped_s2_product(
+                    self.level, region=self.region
+                )
+                if mapped_l2_product.is_window_empty(window):
+                    values[i] = l2_product.l2_fill_values[self.var_name]
+                    continue
+                window_values = mapped_l2_product.map_l2_var(
+                    self.var_name, window=window
+                )
+                values[i] = window_values[0][window_indexes]
+        # Drop dimensions indexed by integers
+        return values[
+            tuple(0 if isinstance(k, (int, np.integer)) else slice(None) for k in key)
+        ]
+
+
+class SmosL2StatsArray(BackendArray):
+    """A lazily indexed array of shape (time, stat) that represents
+    the per-time-step statistics of a SMOS L2 variable mapped onto
+    the DGG at a given resolution level.
+    See :meth:SmosMappedL2Product.compute_l2_var_stats.
+
+    :param time_step_loader: Loader for the SMOS L2 products.
+    :param var_name: The L2 variable name.
+    :param num_times: The number of time steps.
+    :param level: Resolution level.
+    :param region: Optional region given as pair of slices (y, x),
+        see :meth:SmosL2Product.get_mapped_s2_product.
+    """
+
+    def __init__(
+        self,
+        time_step_loader: "SmosTimeStepLoader",
+        var_name: str,
+        num_times: int,
+        level: int,
+        region: Window | None = None,
+    ):
+        self.time_step_loader = time_step_loader
+        self.var_name = var_name
+        self.dtype = np.dtype(np.float64)
+        self.shape = num_times, len(STATS_NAMES)
+        self.level = level
+        self.region = region
+
+    def __getitem__(self, key: indexing.ExplicitIndexer) -> np.ndarray:
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.BASIC, self._get_values
+        )
+
+    def _get_values(self, key: tuple) -> np.ndarray:
+        time_key, stat_key = key
+        time_indexes = np.atleast_1d(np.arange(self.shape[0])[time_key])
+        values = np.empty((len(time_indexes), len(STATS_NAMES)), dtype=self.dtype)
+        for i, time_idx in enumerate(time_indexes):
+            l2_product = self.time_step_loader.load_l2_product(time_idx)
+            mapped_l2_product = l2_product.get_mapped_s2_product(
+                self.level, region=self.region
+            )
+            values[i] = mapped_l2_product.compute_l2_var_stats(self.var_name)
+        values = values[:, stat_key]
+        # Drop time dimension if indexed by an integer
+        return values[0] if isinstance(time_key, (int, np.integer)) else values
+
+
+class SmosL2CubeZarrStore(GenericZarrStore):
+    """Zarr store of a SMOS L2 cube at a given resolution level.
+
+    Chunks of the variables loaded by the *time_step_loader*
+    that contain fill values only are reported as absent when
+    testing for their keys, see
+    :meth:SmosTimeStepLoader.is_time_step_chunk_empty, and
+    raise a KeyError when read. Zarr readers test a chunk key
+    right before reading it, so the test loads the L2 product
+    the read requires anyway.
+
+    Listing the keys of this store never loads L2 products,
+    hence, listings include the keys of empty chunks.
+
+    :param time_step_loader: Loader of the time steps.
+    :param arrays: Arrays to be added.
+    :param attrs: Optional attributes of the top-level group.
+    """
+
+    def __init__(
+        self,
+        time_step_loader: "SmosTimeStepLoader",
+        *arrays: GenericArray,
+        attrs: Dict[str, Any] | None = None,
+    ):
+        self._time_step_loader = time_step_loader
+        super().__init__(*arrays, attrs=attrs)
+
+    def __contains__(self, key: str) -> bool:
+        if not super().__contains__(key):
+            return False
+        if "/" not in key:
+            return True
+        array_name, value_id = key.rsplit("/", maxsplit=1)
+        if value_id in (".zarray", ".zattrs"):
+            return True
+        chunk_index = self._get_array_chunk_index(array_name, value_id)
+        return not self._is_chunk_empty(array_name, chunk_index)
+
+    def _is_chunk_empty(self, array_name: str, chunk_index: tuple[int, ...]) -> bool:
+        array = self._arrays[array_name]
+        if array["get_data"] != self._time_step_loader.load_time_step:
+            return False
+        get_data_params = array["get_data_params"]
+        return self._time_step_loader.is_time_step_chunk_empty(
+            get_data_params["level"],
+            {
+                "index": chunk_index,
+                "slices": get_array_slices(
+                    array["shape"], array["chunks"], chunk_index
+                ),
+            },
+            region=get_data_params.get("region"),
+        )
 
 
 class SmosTimeStepLoader:
@@ -202,6 +678,39 @@ class SmosTimeStepLoader:
         passed to *dataset_opener*.
     :param dataset_paths: SMOS L2 dataset paths (from catalog).
     :param l2_product_cache_size: Product cache size for L2 products.
+    :param mapping_mode: Mapping mode, one of :const:MAPPING_MODES.
+    :param parallel_mapping: Whether to use the parallel mapping kernels.
+    :param mask_rules: Optional quality mask rules,
+        see :func:compute_l2_mask.
+    :param l2_product_cache_mode: L2 product cache mode, one of
+        :const:L2_PRODUCT_CACHE_MODES. In mode "consumption", a product
+        is kept until all requests expected for its time step at a level,
+        see :meth:set_num_time_step_requests, have been served.
+        Products of levels without expected requests are cached
+        as in mode "lru".
+    :param l2_product_cache_bytes: Optional maximum number of bytes
+        used by the cached L2 products, see :attr:SmosL2Product.nbytes.
+        If given, an *l2_product_cache_size* of zero means that the
+        number of cached products is not limited.
+    :param mapped_cache_bytes: Optional maximum number of compressed
+        bytes used by a cache of mapped chunks, which is independent
+        of the L2 products. If given, chunks are kept compressed in
+        memory once mapped, see :class:CompressedArrayCache,
+        so that requesting them again requires no L2 products.
+    :param chunk_cache: Optional persistent cache of mapped chunks.
+        If given, chunks are looked up in the cache first and written
+        to it once mapped.
+    :param sidecar_store: Optional store of product sidecars.
+        If given, the DGG seqnums of a product are taken from the
+        store, if available, and written to it otherwise.
+        The sidecar of a product is written to the store as well,
+        if missing, see :func:new_product_sidecar.
+    :param sibling_cache_bytes: Maximum number of bytes used by the
+        chunks of sibling variables that have been mapped along with
+        a requested chunk, but not yet been requested themselves,
+        see :meth:load_time_step. Zero disables mapping of siblings.
+        Siblings are only mapped, if all their chunks fit into this
+        budget.
     """
 
     def __init__(
@@ -211,19 +720,93 @@ class SmosTimeStepLoader:
         dataset_opener_kwargs: Dict[str, Any],
         dataset_paths: List[str],
         l2_product_cache_size: int,
+        mapping_mode: str = DEFAULT_MAPPING_MODE,
+        parallel_mapping: bool = False,
+        mask_rules: MaskRules | None = None,
+        l2_product_cache_mode: str = DEFAULT_L2_PRODUCT_CACHE_MODE,
+        l2_product_cache_bytes: int | None = None,
+        mapped_cache_bytes: int | None = None,
+        chunk_cache: SmosChunkCache | None = None,
+        sidecar_store: SmosProductSidecarStore | None = None,
+        sibling_cache_bytes: int = DEFAULT_SIBLING_CACHE_BYTES,
     ):
+        if l2_product_cache_mode not in L2_PRODUCT_CACHE_MODES:
+            raise ValueError(f"Invalid L2 product cache mode {l2_product_cache_mode!r}")
         self.dgg = dgg
         self.dataset_paths = dataset_paths
         self.dataset_opener = dataset_opener
         self.dataset_opener_kwargs = dataset_opener_kwargs or {}
         self.l2_product_cache_size = l2_product_cache_size
+        self.l2_product_cache_bytes = l2_product_cache_bytes
+        self.mapped_cache_bytes = mapped_cache_bytes
+        self.chunk_cache = chunk_cache
+        self.sidecar_store = sidecar_store
+        self.sibling_cache_bytes = sibling_cache_bytes
+        self.mapping_mode = mapping_mode
+        self.parallel_mapping = parallel_mapping
+        self.l2_product_cache_mode = l2_product_cache_mode
+        self.mask_rules = mask_rules
+        # Maps levels to the number of requests expected per time step
+        self.num_time_step_requests: Dict[int, int] = {}
         self.l2_product_cache = self.new_l2_product_cache()
+        self.l2_product_flight = self.new_l2_product_flight()
+        self.l2_product_consumption = self.new_l2_product_consumption()
+        self.mapped_cache = self.new_mapped_cache()
+        self.sibling_cache = self.new_sibling_cache()
+        self.sibling_flight = self.new_sibling_flight()
+        self.sibling_windows = self.new_sibling_windows()
+        self.buffer_pool = BufferPool()
 
     def new_l2_product_cache(self):
+        max_size = self.l2_product_cache_size
+        if self.l2_product_cache_bytes is not None and not max_size:
+            max_size = len(self.dataset_paths)
         return LruCache[int, SmosL2Product](
-            max_size=self.l2_product_cache_size, dispose_value=self.dispose_l2_product
+            max_size=max_size,
+            dispose_value=self.dispose_l2_product,
+            max_bytes=self.l2_product_cache_bytes,
+            get_value_size=self.get_l2_product_size,
+        )
+
+    @classmethod
+    def get_l2_product_size(cls, l2_product: "SmosL2Product") -> int:
+        return l2_product.nbytes
+
+    def new_l2_product_flight(self):
+        # If the product cache is disabled, retaining the two most
+        # recent products lets the chunks of neighboring time steps,
+        # which dask threads request in an interleaved manner, share
+        # their products. Otherwise, products must not be retained,
+        # because the cache disposes the products it evicts.
+        retain = (
+            2
+            if not self.l2_product_cache.max_size
+            and self.l2_product_cache_mode == L2_PRODUCT_CACHE_MODE_LRU
+            else 0
+        )
+        return SingleFlight[int, SmosL2Product](retain=retain)
+
+    def new_mapped_cache(self) -> CompressedArrayCache[Hashable] | None:
+        if self.mapped_cache_bytes is None:
+            return None
+        return CompressedArrayCache[Hashable](max_bytes=self.mapped_cache_bytes)
+
+    def new_sibling_cache(self) -> LruCache[Hashable, np.ndarray]:
+        return LruCache[Hashable, np.ndarray](
+            max_size=sys.maxsize, max_bytes=self.sibling_cache_bytes
         )
 
+    @classmethod
+    def new_sibling_flight(cls) -> SingleFlight[Hashable, Dict[str, np.ndarray]]:
+        return SingleFlight[Hashable, Dict[str, np.ndarray]]()
+
+    @classmethod
+    def new_sibling_windows(cls) -> LruCache[Hashable, bool]:
+        return LruCache[Hashable, bool](max_size=MAX_SIBLING_WINDOWS)
+
+    def new_l2_product_consumption(self):
+        return SmosL2ProductConsumption(dispose_l2_product=self.dispose_l2_product)
+
     @classmethod
     def dispose_l2_product(cls, l2_product: "SmosL2Product"):
         l2_product.dispose()
@@ -233,6 +816,13 @@ class SmosTimeStepLoader:
 
         state = self.__dict__.copy()
         del state["l2_product_cache"]
+        del state["l2_product_flight"]
+        del state["l2_product_consumption"]
+        del state["mapped_cache"]
+        del state["sibling_cache"]
+        del state["sibling_flight"]
+        del state["sibling_windows"]
+        del state["buffer_pool"]
         del state["dgg"]
 
         return state
@@ -244,186 +834,1546 @@ class SmosTimeStepLoader:
 
         self.dgg = new_dgg()
         self.l2_product_cache = self.new_l2_product_cache()
+        self.l2_product_flight = self.new_l2_product_flight()
+        self.l2_product_consumption = self.new_l2_product_consumption()
+        self.mapped_cache = self.new_mapped_cache()
+        self.sibling_cache = self.new_sibling_cache()
+        self.sibling_flight = self.new_sibling_flight()
+        self.sibling_windows = self.new_sibling_windows()
+        self.buffer_pool = BufferPool()
 
     @property
     def _class_name(self):
         return self.__class__.__name__
 
+    def set_num_time_step_requests(self, level: int, num_requests: int):
+        """Set the number of requests expected for every time step
+        at the given *level*, that is, the number of chunks of all
+        variables of a time step. Used in L2 product cache mode
+        "consumption" only.
+
+        :param level: Resolution level.
+        :param num_requests: Number of requests per time step.
+        """
+        self.num_time_step_requests[level] = num_requests
+
+    def _get_num_consumed_requests(self, level: int) -> int | None:
+        if self.l2_product_cache_mode != L2_PRODUCT_CACHE_MODE_CONSUMPTION:
+            return None
+        return self.num_time_step_requests.get(level)
+
+    @contextlib.contextmanager
+    def _consume_time_step(self, time_idx: int, level: int):
+        num_requests = self._get_num_consumed_requests(level)
+        if not num_requests:
+            yield
+            return
+        self.l2_product_consumption.begin(time_idx, level, num_requests)
+        try:
+            yield
+        finally:
+            self.l2_product_consumption.end(time_idx, level)
+
     def load_time_step(
-        self, level: int, array_info: Dict[str, Any], chunk_info: Dict[str, Any]
+        self,
+        level: int,
+        array_info: Dict[str, Any],
+        chunk_info: Dict[str, Any],
+        region: Window | None = None,
+        var_names: Sequence[str] | None = None,
     ) -> np.ndarray:
+        """Load the chunk of a variable of a time step.
+
+        If *var_names* names further variables, the chunks of all
+        variables are mapped at once, see
+        :meth:SmosMappedL2Product.map_l2_vars. The chunks of the
+        sibling variables are then kept in a byte-bounded cache
+        until they are requested, so that requests for them
+        do not require mapping again. This happens only once per
+        chunk window and only if the chunks of all siblings fit into
+        the cache. Otherwise, chunks are mapped one by one.
+
+        :param level: Resolution level.
+        :param array_info: Array information, provides the variable name.
+        :param chunk_info: Chunk information, provides chunk index
+            and slices.
+        :param region: Optional region given as pair of slices (y, x).
+        :param var_names: Optional names of the variables of the cube,
+            whose chunks are mapped along with the requested one.
+        :return: Chunk of shape (1, height, width).
+        :raise KeyError: If the chunk is missing,
+            so that the fill value must be used instead.
+        """
         var_name = array_info["name"]
-        time_idx, lat_idx, lon_idx = chunk_info["index"]
-        assert (
-            lat_idx == 0 and lon_idx == 0
-        ), "should not be chunked in spatial dimensions"
-        l2_product = self.load_l2_product(time_idx)
-        mapped_l2_product = l2_product.get_mapped_s2_product(level)
-        return mapped_l2_product.map_l2_var(var_name)
+        time_idx = chunk_info["index"][0]
+        # Chunk slices are relative to region, if any
+        _, y_slice, x_slice = chunk_info["slices"]
+        window = y_slice, x_slice
+        chunk_key = f"{var_name}/{'.'.join(map(str, chunk_info['index']))}"
+        with self._consume_time_step(time_idx, level):
+            sibling_names = self._get_sibling_names(var_name, var_names)
+            chunk_bounds = None
+            values = None
+            if (
+                sibling_names
+                or self.mapped_cache is not None
+                or self.chunk_cache is not None
+            ):
+                chunk_bounds = self.get_chunk_bounds(level, window, region=region)
+                values = self._get_cached_chunk(time_idx, level, var_name, chunk_bounds)
+            if values is None:
+                l2_product = self.load_l2_product(time_idx)
+                mapped_l2_product = l2_product.get_mapped_s2_product(
+                    level, region=region
+                )
+                if mapped_l2_product.is_window_empty(window):
+                    # An empty array marks a missing chunk
+                    values = np.empty(0, dtype=np.uint8)
+                    if chunk_bounds is not None:
+                        self._put_cached_chunk(
+                            time_idx, level, var_name, chunk_bounds, values
+                        )
+                elif self._can_map_siblings(
+                    mapped_l2_product, time_idx, level, sibling_names, chunk_bounds
+                ):
+                    values = self._map_chunk_with_siblings(
+                        mapped_l2_product,
+                        time_idx,
+                        level,
+                        var_name,
+                        sibling_names,
+                        window,
+                        chunk_bounds,
+                    )
+                else:
+                    values = mapped_l2_product.map_l2_var(var_name, window=window)
+                    if chunk_bounds is not None:
+                        self._put_cached_chunk(
+                            time_idx, level, var_name, chunk_bounds, values
+                        )
+            if values.size == 0:
+                # Report the chunk as missing, so it is neither computed nor
+                # encoded. Zarr readers will use the array's fill value instead.
+                raise KeyError(chunk_key)
+            return values
+
+    def _get_sibling_names(
+        self, var_name: str, var_names: Sequence[str] | None
+    ) -> list[str]:
+        if not var_names or not self.sibling_cache_bytes:
+            return []
+        return [n for n in var_names if n != var_name]
+
+    def _can_map_siblings(
+        self,
+        mapped_l2_product: "SmosMappedL2Product",
+        time_idx: int,
+        level: int,
+        sibling_names: list[str],
+        chunk_bounds: tuple[int, int, int, int],
+    ) -> bool:
+        if not sibling_names:
+            return False
+        if self.sibling_windows.get((time_idx, level, chunk_bounds)):
+            # Siblings of this window have already been mapped. They have
+            # been served or evicted since, so they must not be put again.
+            return False
+        y_start, y_stop, x_start, x_stop = chunk_bounds
+        l2_dataset = mapped_l2_product.l2_product.l2_dataset
+        nbytes = (
+            (y_stop - y_start)
+            * (x_stop - x_start)
+            * sum(l2_dataset[name].dtype.itemsize for name in sibling_names)
+        )
+        # Sibling chunks that don't fit would be evicted
+        # before they are requested
+        return nbytes <= self.sibling_cache_bytes
+
+    def _map_chunk_with_siblings(
+        self,
+        mapped_l2_product: "SmosMappedL2Product",
+        time_idx: int,
+        level: int,
+        var_name: str,
+        sibling_names: list[str],
+        window: Window,
+        chunk_bounds: tuple[int, int, int, int],
+    ) -> np.ndarray:
+        def map_chunks() -> Dict[str, np.ndarray]:
+            mapped_l2_vars = mapped_l2_product.map_l2_vars(
+                [var_name, *sibling_names], window=window
+            )
+            for name, mapped_values in mapped_l2_vars.items():
+                if name != var_name:
+                    self.sibling_cache.put(
+                        (time_idx, level, name, chunk_bounds), mapped_values
+                    )
+                self._put_cached_chunk(
+                    time_idx, level, name, chunk_bounds, mapped_values
+                )
+            self.sibling_windows.put((time_idx, level, chunk_bounds), True)
+            return mapped_l2_vars
+
+        # Concurrent requests for chunks of the same window, but
+        # different variables, share a single mapping. A sibling chunk
+        # served this way is removed from the cache, so that it doesn't
+        # take the room of sibling chunks that are still to be requested.
+        mapped_chunks = self.sibling_flight.do(
+            (time_idx, level, chunk_bounds), map_chunks
+        )
+        self.sibling_cache.pop((time_idx, level, var_name, chunk_bounds))
+        return mapped_chunks[var_name]
+
+    def _get_cached_chunk(
+        self,
+        time_idx: int,
+        level: int,
+        var_name: str,
+        chunk_bounds: tuple[int, int, int, int],
+    ) -> np.ndarray | None:
+        mapped_cache_key = time_idx, level, var_name, chunk_bounds
+        values = self.sibling_cache.pop(mapped_cache_key)
+        if values is not None:
+            return values
+        if self.mapped_cache is not None:
+            values = self.mapped_cache.get(mapped_cache_key)
+            if values is not None:
+                return values
+        if self.chunk_cache is not None:
+            values = self.chunk_cache.get_chunk(
+                self.get_product_name(time_idx), level, var_name, chunk_bounds
+            )
+            if values is not None:
+                if self.mapped_cache is not None:
+                    self.mapped_cache.put(mapped_cache_key, values)
+                return values
+        return None
+
+    def _put_cached_chunk(
+        self,
+        time_idx: int,
+        level: int,
+        var_name: str,
+        chunk_bounds: tuple[int, int, int, int],
+        values: np.ndarray,
+    ):
+        if self.mapped_cache is not None:
+            self.mapped_cache.put((time_idx, level, var_name, chunk_bounds), values)
+        if self.chunk_cache is not None:
+            self.chunk_cache.put_chunk(
+                self.get_product_name(time_idx), level, var_name, chunk_bounds, values
+            )
+
+    def get_product_name(self, time_idx: int) -> str:
+        """Get the file name of the SMOS L2 product for *time_idx*."""
+        return get_product_name(self.dataset_paths[time_idx])
+
+    def get_chunk_bounds(
+        self, level: int, window: Window, region: Window | None = None
+    ) -> tuple[int, int, int, int]:
+        """Get the bounds (y_start, y_stop, x_start, x_stop) of
+        the given *window* in the global raster of given *level*.
+
+        :param level: Resolution level.
+        :param window: Window given as pair of slices (y, x),
+            relative to *region*, if given.
+        :param region: Optional region given as pair of slices (y, x).
+        """
+        height, width = get_dgg_seqnum(self.dgg, level).shape
+        y_offset, y_stop, x_offset, x_stop = get_window_bounds(
+            region, (height, width)
+        ) or (0, height, 0, width)
+        y_start, y_stop, x_start, x_stop = get_window_bounds(
+            window, (y_stop - y_offset, x_stop - x_offset)
+        ) or (0, y_stop - y_offset, 0, x_stop - x_offset)
+        return (
+            y_offset + y_start,
+            y_offset + y_stop,
+            x_offset + x_start,
+            x_offset + x_stop,
+        )
+
+    def is_time_step_chunk_empty(
+        self,
+        level: int,
+        chunk_info: Dict[str, Any],
+        region: Window | None = None,
+    ) -> bool:
+        """Test whether the chunk given by *chunk_info* contains
+        fill values only, so that :meth:load_time_step reports it
+        as missing. The L2 product of its time step is loaded,
+        but no values are mapped.
+
+        In L2 product cache mode "consumption", the test of an
+        empty chunk counts as a request, because readers will
+        not request the chunk anymore.
+
+        :param level: Resolution level.
+        :param chunk_info: Chunk information, provides chunk index
+            and slices.
+        :param region: Optional region given as pair of slices (y, x).
+        :return: True, if so.
+        """
+        time_idx = chunk_info["index"][0]
+        _, y_slice, x_slice = chunk_info["slices"]
+        window = y_slice, x_slice
+        num_requests = self._get_num_consumed_requests(level)
+        if num_requests:
+            self.l2_product_consumption.begin(time_idx, level, num_requests)
+        is_empty = False
+        try:
+            l2_product = self.load_l2_product(time_idx)
+            mapped_l2_product = l2_product.get_mapped_s2_product(level, region=region)
+            is_empty = mapped_l2_product.is_window_empty(window)
+            return is_empty
+        finally:
+            if num_requests:
+                self.l2_product_consumption.end(time_idx, level, served=is_empty)
+
+    def load_time_step_stats(
+        self,
+        level: int,
+        l2_var_name: str,
+        chunk_info: Dict[str, Any],
+        region: Window | None = None,
+    ) -> np.ndarray:
+        time_idx = chunk_info["index"][0]
+        with self._consume_time_step(time_idx, level):
+            l2_product = self.load_l2_product(time_idx)
+            mapped_l2_product = l2_product.get_mapped_s2_product(level, region=region)
+            stats = mapped_l2_product.compute_l2_var_stats(l2_var_name)
+            return stats.reshape((1, len(STATS_NAMES)))
 
     def load_l2_product(self, time_idx: int) -> "SmosL2Product":
-        """Load the SMOS L2 product for the given *time_idx*."""
+        """Load the SMOS L2 product for the given *time_idx*.
+
+        Concurrent and closely following calls for the same
+        *time_idx* share a single product, hence the product's
+        dataset is opened only once and its mappings are shared.
+        """
+        l2_product = self.l2_product_consumption.get(time_idx)
+        if l2_product is not None:
+            return l2_product
         l2_product = self.l2_product_cache.get(time_idx)
         if l2_product is not None:
             return l2_product
+        return self.l2_product_flight.do(
+            time_idx, lambda: self._open_l2_product(time_idx)
+        )
+
+    def _open_l2_product(self, time_idx: int) -> "SmosL2Product":
         dataset_path = self.dataset_paths[time_idx]
         l2_dataset = self.dataset_opener(dataset_path, **self.dataset_opener_kwargs)
         l2_dataset = l2_dataset.chunk()  # Wrap numpy arrays into dask arrays
         LOG.debug("Opening L2 product %s for time index %d", dataset_path, time_idx)
-        l2_product = SmosL2Product(self.dgg, l2_dataset)
-        self.l2_product_cache.put(time_idx, l2_product)
+        l2_seqnum = None
+        if self.sidecar_store is not None:
+            product_name = self.get_product_name(time_idx)
+            l2_seqnum = self.sidecar_store.get_seqnum(product_name)
+            if (
+                l2_seqnum is not None
+                and l2_seqnum.size != l2_dataset.Grid_Point_ID.size
+            ):
+                # Stale seqnums, e.g., the product has been reprocessed
+                l2_seqnum = None
+        l2_product = SmosL2Product(
+            self.dgg,
+            l2_dataset,
+            mapping_mode=self.mapping_mode,
+            parallel_mapping=self.parallel_mapping,
+            buffer_pool=self.buffer_pool,
+            mask_rules=self.mask_rules,
+            l2_seqnum=l2_seqnum,
+        )
+        if self.sidecar_store is not None:
+            if l2_seqnum is None:
+                self.sidecar_store.put_seqnum(product_name, l2_product.l2_seqnum)
+            if self.sidecar_store.get_sidecar(product_name) is None:
+                self.sidecar_store.put_sidecar(
+                    product_name, new_product_sidecar(l2_dataset)
+                )
+        if not self.l2_product_consumption.put(time_idx, l2_product):
+            self.l2_product_cache.put(time_idx, l2_product)
         return l2_product
 
 
+class SmosL2ProductConsumption(NotSerializable):
+    """Keeps SMOS L2 products while requests for their time steps
+    are expected, and disposes them, once all of them have been served.
+
+    A request for a time step at a given level begins with
+    :meth:begin and ends with :meth:end. The number of requests
+    expected for a time step and level is given by the first request.
+    Once this number of requests has ended for all levels of a
+    time step and no other request is in progress, the product of
+    the time step, including its mapped products, is disposed.
+    Requests beyond the expected number start a new round.
+
+    :param dispose_l2_product: Function that disposes a product.
+    """
+
+    def __init__(self, dispose_l2_product: Callable[["SmosL2Product"], Any]):
+        self._dispose_l2_product = dispose_l2_product
+        # Maps time indexes to time step states, see _TimeStepState
+        self._time_steps: Dict[int, _TimeStepState] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Number of products kept."""
+        return sum(1 for t in self._time_steps.values() if t.l2_product is not None)
+
+    def begin(self, time_idx: int, level: int, num_requests: int):
+        """Begin a request for the given time step at given level."""
+        with self._lock:
+            time_step = self._time_steps.get(time_idx)
+            if time_step is None:
+                time_step = self._time_steps[time_idx] = _TimeStepState()
+            if level not in time_step.num_pending:
+                time_step.num_pending[level] = num_requests
+            time_step.num_active += 1
+
+    def end(self, time_idx: int, level: int, served: bool = True):
+        """End a request for the given time step at given level.
+
+        :param served: Whether the request counts as served.
+            If not, the number of pending requests remains the same.
+        """
+        with self._lock:
+            time_step = self._time_steps[time_idx]
+            time_step.num_active -= 1
+            if served:
+                num_pending = time_step.num_pending.pop(level, 0) - 1
+                if num_pending > 0:
+                    time_step.num_pending[level] = num_pending
+            if time_step.num_active > 0 or time_step.num_pending:
+                return
+            del self._time_steps[time_idx]
+        if time_step.l2_product is not None:
+            self._dispose_l2_product(time_step.l2_product)
+
+    def get(self, time_idx: int) -> Union["SmosL2Product", None]:
+        """Get the product kept for the given time step, if any."""
+        time_step = self._time_steps.get(time_idx)
+        return time_step.l2_product if time_step is not None else None
+
+    def put(self, time_idx: int, l2_product: "SmosL2Product") -> bool:
+        """Keep the product for the given time step, if requests
+        for it are in progress.
+
+        :return: True, if the product is kept.
+        """
+        with self._lock:
+            time_step = self._time_steps.get(time_idx)
+            if time_step is None:
+                return False
+            time_step.l2_product = l2_product
+            return True
+
+
+class _TimeStepState:
+    def __init__(self):
+        # Maps levels to the number of pending requests
+        self.num_pending: Dict[int, int] = {}
+        # Number of requests in progress
+        self.num_active = 0
+        self.l2_product: Union["SmosL2Product", None] = None
+
+
 class SmosL2Product:
-    def __init__(self, dgg: MultiLevelDataset, l2_dataset: xr.Dataset):
-        grid_point_id = l2_dataset.Grid_Point_ID.values
-        l2_seqnum = SmosDiscreteGlobalGrid.grid_point_id_to_seqnum(grid_point_id)
-        l2_min_seqnum = np.min(l2_seqnum)
-        l2_max_seqnum = np.max(l2_seqnum)
-        if not (
-            SmosDiscreteGlobalGrid.MIN_SEQNUM
-            <= l2_min_seqnum
-            <= SmosDiscreteGlobalGrid.MAX_SEQNUM
-        ):
-            raise ValueError()
-        if not (
-            SmosDiscreteGlobalGrid.MIN_SEQNUM
-            <= l2_max_seqnum
-            <= SmosDiscreteGlobalGrid.MAX_SEQNUM
-        ):
-            raise ValueError()
-
-        l2_missing_index = len(grid_point_id)
-        l2_seqnum_to_index = seqnum_to_index(
-            l2_seqnum, SmosDiscreteGlobalGrid.MAX_SEQNUM + 1, l2_missing_index
-        )
+    """A SMOS L2 product that can be mapped onto the DGG
+    at the different resolution levels.
 
-        l2_fill_values = {}
-        for l2_var_name, l2_var in l2_dataset.data_vars.items():
-            fill_value = l2_var.attrs.get("_FillValue")
-            if fill_value is None:
-                if np.issubdtype(l2_var.dtype, np.floating):
-                    fill_value = float(np.nan)
-                else:
-                    fill_value = 0
-                warnings.warn(
-                    f"Variable {l2_var_name!r}"
-                    f" is missing a fill value,"
-                    f" using {fill_value} instead."
+    :param dgg: SMOS discrete global grid.
+    :param l2_dataset: The SMOS L2 dataset.
+    :param mapping_mode: Mapping mode, one of :const:MAPPING_MODES.
+    :param parallel_mapping: Whether to use the parallel mapping kernels.
+    :param buffer_pool: Optional pool from which the
+        buffers for mapped L2 values are acquired.
+    :param mask_rules: Optional quality mask rules. L2 grid points
+        that do not pass the rules are treated as fill values by all
+        variables, see :func:compute_l2_mask.
+    :param l2_seqnum: Optional DGG seqnums of the L2 grid points,
+        e.g., from a product sidecar, see :class:SmosProductSidecarStore.
+        If given, the grid point IDs are not read.
+    """
+
+    def __init__(
+        self,
+        dgg: MultiLevelDataset,
+        l2_dataset: xr.Dataset,
+        mapping_mode: str = DEFAULT_MAPPING_MODE,
+        parallel_mapping: bool = False,
+        buffer_pool: BufferPool | None = None,
+        mask_rules: MaskRules | None = None,
+        l2_seqnum: np.ndarray | None = None,
+    ):
+        if mapping_mode not in MAPPING_MODES:
+            raise ValueError(f"Invalid mapping mode {mapping_mode!r}")
+
+        if l2_seqnum is None:
+            grid_point_id = l2_dataset.Grid_Point_ID.values
+            l2_seqnum, l2_seqnum_to_index = ingest_grid_point_ids(grid_point_id)
+        else:
+            if l2_seqnum.size != l2_dataset.Grid_Point_ID.size:
+                raise ValueError(
+                    f"Expected {l2_dataset.Grid_Point_ID.size} seqnums,"
+                    f" but got {l2_seqnum.size}"
                 )
-            l2_fill_values[l2_var_name] = fill_value
+            l2_seqnum_to_index = seqnum_to_index(
+                l2_seqnum,
+                SmosDiscreteGlobalGrid.MAX_SEQNUM + 1,
+                l2_seqnum.size,
+                parallel=parallel_mapping,
+            )
+        l2_missing_index = l2_seqnum.size
+
+        l2_fill_values = get_l2_fill_values(l2_dataset)
+
+        l2_mask = None
+        if mask_rules:
+            l2_mask = compute_l2_mask(l2_dataset, mask_rules, l2_fill_values)
 
         self.dgg = dgg
         self.l2_dataset = l2_dataset
+        self.mapping_mode = mapping_mode
+        self.parallel_mapping = parallel_mapping
+        self.buffer_pool = buffer_pool
+        self.l2_seqnum = l2_seqnum
         self.l2_fill_values = l2_fill_values
         self.l2_seqnum_to_index = l2_seqnum_to_index
         self.l2_missing_index = l2_missing_index
+        self.l2_mask = l2_mask
         self.mapped_l2_product_cache = LruCache[int, SmosMappedL2Product](
             max_size=dgg.num_levels, dispose_value=self.dispose_mapped_l2_product
         )
+        self.mapped_l2_product_flight = SingleFlight[Hashable, SmosMappedL2Product]()
+
+    def read_l2_values(self, l2_var_name: Hashable) -> np.ndarray:
+        """Read the values of the given L2 variable in native byte order.
+        Values of grid points masked out by the quality mask rules, if any,
+        are replaced by the variable's fill value.
+
+        :param l2_var_name: The L2 variable name.
+        :return: 1D array of shape (num_l2,)
+        """
+        l2_var = self.l2_dataset[l2_var_name]
+        # numba requires native byte order
+        dtype = l2_var.dtype.newbyteorder("=")
+        # effectively read data from L2 variable
+        l2_values = l2_var.values.astype(dtype, copy=False)
+        if self.l2_mask is not None:
+            l2_values = np.where(
+                self.l2_mask,
+                l2_values,
+                np.array(self.l2_fill_values[l2_var_name], dtype=dtype),
+            )
+        return l2_values
 
     @classmethod
     def dispose_mapped_l2_product(cls, mapped_l2_product: "SmosMappedL2Product"):
         mapped_l2_product.dispose()
 
+    @property
+    def nbytes(self) -> int:
+        """Estimated number of bytes used by this product,
+        including its mapped products.
+        """
+        nbytes = (
+            self.l2_dataset.nbytes
+            + self.l2_seqnum.nbytes
+            + self.l2_seqnum_to_index.nbytes
+        )
+        if self.l2_mask is not None:
+            nbytes += self.l2_mask.nbytes
+        nbytes += sum(m.nbytes for m in list(self.mapped_l2_product_cache.values()))
+        return nbytes
+
     def dispose(self):
         self.l2_dataset.close()
         self.mapped_l2_product_cache.clear()
 
-    def get_mapped_s2_product(self, level: int) -> "SmosMappedL2Product":
-        """Get the global, mapped L2 product for given *level*
-        LRU-cached access w.r.t. *level*.
+    def get_mapped_s2_product(
+        self, level: int, region: Window | None = None
+    ) -> "SmosMappedL2Product":
+        """Get the mapped L2 product for given *level*
+        LRU-cached access w.r.t. *level* and *region*.
+
+        :param level: Resolution level.
+        :param region: Optional region given as pair of slices (y, x).
+            If given, the L2 product is mapped onto this region of
+            the DGG only, otherwise globally.
         """
-        mapped_l2_product = self.mapped_l2_product_cache.get(level)
+        seqnum = get_dgg_seqnum(self.dgg, level)
+        bounds = get_window_bounds(region, seqnum.shape)
+        cache_key = level if bounds is None else (level, bounds)
+        mapped_l2_product = self.mapped_l2_product_cache.get(cache_key)
         if mapped_l2_product is not None:
             return mapped_l2_product
-        dgg_dataset = self.dgg.get_dataset(level)
-        seqnum = dgg_dataset.seqnum
+        return self.mapped_l2_product_flight.do(
+            cache_key,
+            lambda: self._new_mapped_l2_product(level, seqnum, bounds, cache_key),
+        )
+
+    def _new_mapped_l2_product(
+        self,
+        level: int,
+        seqnum: np.ndarray,
+        bounds: tuple[int, int, int, int] | None,
+        cache_key: Hashable,
+    ) -> "SmosMappedL2Product":
+        # Grid points masked out are mapped to fill values,
+        # so they need not be part of the footprint
+        l2_seqnum = (
+            self.l2_seqnum if self.l2_mask is None else self.l2_seqnum[self.l2_mask]
+        )
+        footprint = compute_l2_footprint(
+            l2_seqnum, get_dgg_seqnum_extents(self.dgg, level), seqnum.shape[0]
+        )
+        if bounds is not None:
+            y_start, y_stop, x_start, x_stop = bounds
+            seqnum = seqnum[y_start:y_stop, x_start:x_stop]
+            footprint = crop_footprint(footprint[y_start:y_stop], x_start, x_stop)
+        selection_matrix = None
+        if self.mapping_mode == MAPPING_MODE_SPARSE:
+            selection_matrix = get_dgg_level_object(
+                self.dgg,
+                level,
+                ("selection_matrix", bounds),
+                lambda: new_selection_matrix(
+                    seqnum, SmosDiscreteGlobalGrid.MAX_SEQNUM + 1
+                ),
+            )
         # from dask.distributed import print
         # print(f'creating global L2 product for level={level}', flush=True)
-        mapped_l2_product = SmosMappedL2Product(self, seqnum.values)
-        self.mapped_l2_product_cache.put(level, mapped_l2_product)
+        mapped_l2_product = SmosMappedL2Product(
+            self,
+            seqnum,
+            footprint,
+            selection_matrix=selection_matrix,
+            level=level,
+            bounds=bounds,
+        )
+        self.mapped_l2_product_cache.put(cache_key, mapped_l2_product)
         return mapped_l2_product
 
 
 class SmosMappedL2Product:
-    def __init__(self, l2_product: SmosL2Product, mapped_seqnum: np.ndarray):
+    """A SMOS L2 product mapped onto the DGG at a given resolution level.
+
+    In mapping mode "index" the L2 index raster is computed once
+    and used for all variables. In mapping mode "compact" the static,
+    shared *mapped_seqnum* raster is used instead and the L2 index is
+    resolved on the fly using the product's seqnum-to-index table.
+    In mapping mode "sparse" values are mapped by multiplying the
+    shared *selection_matrix* with the values in seqnum space.
+
+    Only pixels within the product's *footprint* are mapped,
+    all other pixels are set to the fill value.
+
+    :param l2_product: The SMOS L2 product.
+    :param mapped_seqnum: The DGG seqnum raster of the level,
+        or a region of it.
+    :param footprint: The footprint of the product in *mapped_seqnum*
+        as computed by :func:compute_l2_footprint.
+    :param selection_matrix: The selection matrix for *mapped_seqnum*
+        as computed by :func:new_selection_matrix.
+        Required for mapping mode "sparse".
+    :param level: The resolution level.
+    :param bounds: The bounds of the region of *mapped_seqnum*,
+        see :func:get_window_bounds, or None, if it is global.
+    """
+
+    def __init__(
+        self,
+        l2_product: SmosL2Product,
+        mapped_seqnum: np.ndarray,
+        footprint: np.ndarray,
+        selection_matrix: sp.csr_matrix | None = None,
+        level: int | None = None,
+        bounds: tuple[int, int, int, int] | None = None,
+    ):
         self.l2_product = l2_product
-        self.mapped_l2_index = map_seqnum_to_l2_index(
-            mapped_seqnum, self.l2_product.l2_seqnum_to_index
-        )
+        self.shape = mapped_seqnum.shape
+        self.mapped_seqnum = mapped_seqnum
+        self.footprint = footprint
+        self.selection_matrix = selection_matrix
+        self.level = level
+        self.bounds = bounds
+        self._mapped_l2_index: np.ndarray | None = None
+        self._lock = threading.Lock()
         # We could make the result LRU-cached with *l2_var_name* as key,
         # but most likely every L2 variable will only be read once, when
         # we write SMOS data cubes. This would look different when
         # visualising dynamic SMOS data cubes. Therefore, we set max_size=0.
         self.mapped_l2_values_cache = LruCache[Hashable, np.ndarray](max_size=0)
 
+    @property
+    def nbytes(self) -> int:
+        """Estimated number of bytes used by this mapped product.
+        The static DGG seqnum raster and selection matrix are shared,
+        hence not included.
+        """
+        nbytes = self.footprint.nbytes
+        if self._mapped_l2_index is not None:
+            nbytes += self._mapped_l2_index.nbytes
+        nbytes += sum(v.nbytes for v in list(self.mapped_l2_values_cache.values()))
+        return nbytes
+
     def dispose(self):
         self.mapped_l2_values_cache.clear()
 
-    def map_l2_var(self, l2_var_name: Hashable) -> np.ndarray:
+    @property
+    def mapped_l2_index(self) -> np.ndarray | None:
+        """The L2 index raster in mapping mode "index", otherwise None.
+        Computed on first access.
+        """
+        if self.l2_product.mapping_mode != MAPPING_MODE_INDEX:
+            return None
+        if self._mapped_l2_index is None:
+            with self._lock:
+                if self._mapped_l2_index is None:
+                    self._mapped_l2_index = map_seqnum_to_l2_index(
+                        self.mapped_seqnum,
+                        self.l2_product.l2_seqnum_to_index,
+                        self.footprint,
+                        self.l2_product.l2_missing_index,
+                        parallel=self.l2_product.parallel_mapping,
+                    )
+        return self._mapped_l2_index
+
+    def is_window_empty(self, window: Window | None = None) -> bool:
+        """Test whether the given *window* contains fill values only,
+        because it does not intersect the product's footprint.
+        This is cheap, as only the footprint rows of the window are visited.
+
+        :param window: Optional window given as pair of slices (y, x).
+            If not given, the entire raster is tested.
+        :return: True, if mapped values of the window are certainly
+            fill values only.
+        """
+        return is_footprint_empty(self.footprint, get_window_bounds(window, self.shape))
+
+    def compute_l2_var_stats(self, l2_var_name: Hashable) -> np.ndarray:
+        """Compute the statistics :const:STATS_NAMES of the valid values
+        of the given variable as they appear in the mapped raster.
+        Values are decoded using the variable's attributes
+        "scale_factor" and "add_offset", if any.
+
+        Rather than visiting the pixels of the raster, every L2 value
+        is weighted by the number of pixels its grid point is mapped to.
+        These pixel counts are static per level and region, hence the
+        statistics come at the cost of a single pass over the L2 values.
+
+        :param l2_var_name: The L2 variable name.
+        :return: 1D array of type float64 with the valid pixel count,
+            minimum, maximum, mean, and sum of squares. All but the count
+            are NaN if there are no valid pixels.
+        """
+        mapped_seqnum = self.mapped_seqnum
+        seqnum_counts = get_dgg_level_object(
+            self.l2_product.dgg,
+            self.level,
+            ("seqnum_counts", self.bounds),
+            lambda: count_seqnums(mapped_seqnum, SmosDiscreteGlobalGrid.MAX_SEQNUM + 1),
+        )
+        l2_var = self.l2_product.l2_dataset[l2_var_name]
+        l2_values = self.l2_product.read_l2_values(l2_var_name)
+        return compute_weighted_stats(
+            l2_values,
+            seqnum_counts[self.l2_product.l2_seqnum],
+            np.array(
+                self.l2_product.l2_fill_values[l2_var_name], dtype=l2_values.dtype
+            ),
+            float(l2_var.attrs.get("scale_factor", 1.0)),
+            float(l2_var.attrs.get("add_offset", 0.0)),
+        )
+
+    def new_mapped_buffer(
+        self, num_vars: int, dtype: np.dtype, shape: tuple[int, int] | None = None
+    ) -> np.ndarray:
+        """Get an uninitialized buffer for mapped values of shape
+        (num_vars, height, width), from the L2 product's buffer pool,
+        if any. If *shape* is not given, the full raster shape is used.
+        """
+        shape = (num_vars,) + (shape or self.shape)
+        buffer_pool = self.l2_product.buffer_pool
+        if buffer_pool is None:
+            return np.empty(shape, dtype=dtype)
+        return buffer_pool.acquire(shape, dtype)
+
+    def map_l2_var(
+        self, l2_var_name: Hashable, window: Window | None = None
+    ) -> np.ndarray:
         """Reproject L2 variable to global grid.
 
         :param l2_var_name: The L2 variable name
-        :return: 3D array of shape (1, height, width)
+        :param window: Optional window given as pair of slices (y, x).
+            If given, only the pixels within the window are mapped.
+        :return: 3D array of shape (1, height, width),
+            where height and width are the size of *window*, if given
         """
-        mapped_l2_values = self.mapped_l2_values_cache.get(l2_var_name)
-        if mapped_l2_values is not None:
-            return mapped_l2_values
-        l2_var = self.l2_product.l2_dataset[l2_var_name]
-        l2_values = l2_var.values  # effectively read data from L2 variable
-        l2_fill_value = self.l2_product.l2_fill_values[l2_var_name]
+        return self.map_l2_vars([l2_var_name], window=window)[l2_var_name]
+
+    def map_l2_vars(
+        self, l2_var_names: Iterable[Hashable], window: Window | None = None
+    ) -> Dict[Hashable, np.ndarray]:
+        """Reproject multiple L2 variables to global grid at once.
+
+        Variables that share the same data type are mapped in a single
+        pass over the index, so this is considerably faster than calling
+        :meth:map_l2_var for each variable.
+
+        :param l2_var_names: The L2 variable names
+        :param window: Optional window given as pair of slices (y, x).
+            If given, only the pixels within the window are mapped.
+        :return: Dictionary that maps each variable name to a 3D array
+            of shape (1, height, width), where height and width are
+            the size of *window*, if given
+        """
+        bounds = get_window_bounds(window, self.shape)
+        mapped_l2_vars = {}
+        l2_var_names_by_dtype: Dict[np.dtype, List[Hashable]] = {}
+        for l2_var_name in l2_var_names:
+            mapped_l2_values = self.mapped_l2_values_cache.get(
+                self._get_cache_key(l2_var_name, bounds)
+            )
+            if mapped_l2_values is not None:
+                mapped_l2_vars[l2_var_name] = mapped_l2_values
+            else:
+                l2_var = self.l2_product.l2_dataset[l2_var_name]
+                # numba requires native byte order
+                dtype = l2_var.dtype.newbyteorder("=")
+                l2_var_names_by_dtype.setdefault(dtype, []).append(l2_var_name)
+
+        if not l2_var_names_by_dtype:
+            return mapped_l2_vars
+
+        _, index_2d, footprint = self._get_window(window)
+        l2_fill_values = self.l2_product.l2_fill_values
         l2_missing_index = self.l2_product.l2_missing_index
-        mapped_l2_values = map_l2_values(
-            self.mapped_l2_index, l2_values, l2_missing_index, l2_fill_value
+        for dtype, dtype_var_names in l2_var_names_by_dtype.items():
+            l2_values = np.stack(
+                [self.l2_product.read_l2_values(n) for n in dtype_var_names]
+            )
+            fill_values = np.array(
+                [l2_fill_values[n] for n in dtype_var_names], dtype=dtype
+            )
+            mapped_l2_values = self.new_mapped_buffer(
+                len(dtype_var_names), dtype, index_2d.shape
+            )
+            if self.selection_matrix is not None:
+                map_seqnum_columns(
+                    self._get_selection_matrix(bounds),
+                    [
+                        (self.l2_product.l2_seqnum, l2_values[k], fill_values[k])
+                        for k in range(len(dtype_var_names))
+                    ],
+                    dtype,
+                    mapped_l2_values,
+                )
+            else:
+                map_l2_values_multi(
+                    index_2d,
+                    l2_values,
+                    l2_missing_index,
+                    fill_values,
+                    seqnum_to_index=(
+                        self.l2_product.l2_seqnum_to_index
+                        if self.l2_product.mapping_mode != MAPPING_MODE_INDEX
+                        else None
+                    ),
+                    footprint=footprint,
+                    parallel=self.l2_product.parallel_mapping,
+                    out=mapped_l2_values,
+                )
+            for k, l2_var_name in enumerate(dtype_var_names):
+                mapped_l2_var_values = mapped_l2_values[k : k + 1]
+                self.mapped_l2_values_cache.put(
+                    self._get_cache_key(l2_var_name, bounds), mapped_l2_var_values
+                )
+                mapped_l2_vars[l2_var_name] = mapped_l2_var_values
+
+        return mapped_l2_vars
+
+    def _get_window(
+        self, window: Window | None
+    ) -> tuple[tuple[int, int, int, int] | None, np.ndarray, np.ndarray]:
+        """Get the bounds, the index or seqnum raster, and the
+        footprint for given *window*. Bounds are None, if the
+        window is not given or covers the entire raster.
+        """
+        index_2d = self.mapped_l2_index
+        if index_2d is None:
+            index_2d = self.mapped_seqnum
+        bounds = get_window_bounds(window, self.shape)
+        if bounds is None:
+            return None, index_2d, self.footprint
+        y_start, y_stop, x_start, x_stop = bounds
+        return (
+            bounds,
+            index_2d[y_start:y_stop, x_start:x_stop],
+            crop_footprint(self.footprint[y_start:y_stop], x_start, x_stop),
+        )
+
+    def _get_selection_matrix(
+        self, bounds: tuple[int, int, int, int] | None
+    ) -> sp.csr_matrix:
+        if bounds is None:
+            return self.selection_matrix
+        return select_window_rows(self.selection_matrix, self.shape, bounds)
+
+    @staticmethod
+    def _get_cache_key(
+        l2_var_name: Hashable, bounds: tuple[int, int, int, int] | None
+    ) -> Hashable:
+        return l2_var_name if bounds is None else (l2_var_name, bounds)
+
+
+def compute_l2_mask(
+    l2_dataset: xr.Dataset,
+    mask_rules: MaskRules,
+    l2_fill_values: Dict[Hashable, Any],
+) -> np.ndarray:
+    """Compute the quality mask of the grid points of an L2 product.
+
+    A grid point passes the rule ``{"min": a, "max": b}`` given for
+    a variable, if the variable's value at the grid point is valid,
+    that is, neither a fill value nor NaN, and if the value decoded
+    using the variable's "scale_factor" and "add_offset" attributes is
+    within the inclusive range a to b. Both "min" and "max" are optional.
+
+    :param l2_dataset: The SMOS L2 dataset.
+    :param mask_rules: Maps variable names to rules.
+    :param l2_fill_values: Fill values of the variables.
+    :return: 1D boolean array of shape (num_l2,) that is True
+        for grid points that pass all rules.
+    """
+    l2_mask = np.ones(l2_dataset.Grid_Point_ID.size, dtype=np.bool_)
+    for l2_var_name, rule in mask_rules.items():
+        if l2_var_name not in l2_dataset.data_vars:
+            raise ValueError(
+                f"Variable {l2_var_name!r} of quality mask rules"
+                f" not found in SMOS L2 product"
+            )
+        invalid_keys = set(rule) - set(MASK_RULE_KEYS)
+        if invalid_keys:
+            raise ValueError(
+                f"Invalid keys in quality mask rule for variable"
+                f" {l2_var_name!r}: {', '.join(sorted(invalid_keys))}"
+            )
+        l2_var = l2_dataset[l2_var_name]
+        l2_values = l2_var.values
+        l2_mask &= l2_values != l2_fill_values[l2_var_name]
+        l2_values = l2_values * l2_var.attrs.get("scale_factor", 1.0)
+        l2_values = l2_values + l2_var.attrs.get("add_offset", 0.0)
+        l2_mask &= ~np.isnan(l2_values)
+        if rule.get("min") is not None:
+            l2_mask &= l2_values >= rule["min"]
+        if rule.get("max") is not None:
+            l2_mask &= l2_values <= rule["max"]
+    return l2_mask
+
+
+def get_bbox_seqnum_mask(
+    dgg: MultiLevelDataset,
+    bbox: tuple[float, float, float, float] | None,
+    levels: Iterable[int],
+) -> np.ndarray:
+    """Get a table that tells whether a seqnum is the seqnum of
+    a DGG pixel within *bbox* at any of the given *levels*.
+
+    :param dgg: SMOS discrete global grid.
+    :param bbox: Bounding box, or None for the entire DGG.
+    :param levels: The resolution levels.
+    :return: 1D boolean array of shape (MAX_SEQNUM + 1,)
+    """
+    seqnum_mask = np.zeros(SmosDiscreteGlobalGrid.MAX_SEQNUM + 1, dtype=np.bool_)
+    for level in levels:
+        seqnum = get_dgg_seqnum(dgg, level)
+        if bbox is not None:
+            dataset = dgg.get_dataset(level)
+            region = get_bbox_region(
+                bbox, dataset.lon.values, dataset.lat.values, dgg.grid_mapping
+            )
+            if region is not None:
+                seqnum = seqnum[region]
+        seqnum_mask[seqnum.ravel()] = True
+    # Seqnum zero is not used by grid points
+    seqnum_mask[0] = False
+    return seqnum_mask
+
+
+def has_seqnum_coverage(grid_point_id: np.ndarray, seqnum_mask: np.ndarray) -> bool:
+    """Test whether any of the given grid point IDs refers to
+    a seqnum in *seqnum_mask*, see :func:get_bbox_seqnum_mask.
+
+    :param grid_point_id: 1D array of grid point IDs of an L2 product.
+    :param seqnum_mask: 1D boolean array of shape (MAX_SEQNUM + 1,)
+    :return: True, if so.
+    """
+    seqnum = SmosDiscreteGlobalGrid.grid_point_id_to_seqnum(
+        grid_point_id.astype(np.int64)
+    )
+    seqnum = seqnum[(seqnum >= 0) & (seqnum < seqnum_mask.size)]
+    return bool(np.any(seqnum_mask[seqnum]))
+
+
+def has_grid_point_id_range_coverage(
+    grid_point_id_min: int, grid_point_id_max: int, seqnum_mask: np.ndarray
+) -> bool:
+    """Test whether any seqnum of the given range of grid point IDs
+    is in *seqnum_mask*, see :func:get_bbox_seqnum_mask.
+
+    Seqnums increase with grid point IDs, hence, if this test fails,
+    :func:has_seqnum_coverage fails for any grid point IDs in the range.
+
+    :param grid_point_id_min: Minimum grid point ID of an L2 product.
+    :param grid_point_id_max: Maximum grid point ID of an L2 product.
+    :param seqnum_mask: 1D boolean array of shape (MAX_SEQNUM + 1,)
+    :return: True, if so.
+    """
+    seqnum_min, seqnum_max = SmosDiscreteGlobalGrid.grid_point_id_to_seqnum(
+        np.array([grid_point_id_min, grid_point_id_max], dtype=np.int64)
+    )
+    seqnum_min = max(int(seqnum_min), 0)
+    seqnum_max = min(int(seqnum_max), seqnum_mask.size - 1)
+    return bool(np.any(seqnum_mask[seqnum_min : seqnum_max + 1]))
+
+
+def ingest_grid_point_ids(grid_point_id: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Convert the grid point IDs of an L2 product into DGG seqnums
+    and compute the table that maps seqnums to L2 indexes.
+
+    This is done in a single pass that also validates the seqnums.
+
+    :param grid_point_id: 1D array of grid point IDs
+    :return: A pair comprising a 1D array of seqnums of type uint32,
+        and a table of type uint32 that maps seqnums to indexes
+        into *grid_point_id*. Seqnums not in *grid_point_id*
+        are mapped to ``len(grid_point_id)``.
+    :raise ValueError: If a grid point ID is out of range or duplicated
+    """
+    min_seqnum = SmosDiscreteGlobalGrid.MIN_SEQNUM
+    max_seqnum = SmosDiscreteGlobalGrid.MAX_SEQNUM
+    l2_seqnum, l2_seqnum_to_index, error_index = _ingest_grid_point_ids(
+        grid_point_id, min_seqnum, max_seqnum
+    )
+    if error_index >= 0:
+        bad_grid_point_id = grid_point_id[error_index]
+        bad_seqnum = int(
+            SmosDiscreteGlobalGrid.grid_point_id_to_seqnum(np.int64(bad_grid_point_id))
+        )
+        if min_seqnum <= bad_seqnum <= max_seqnum:
+            raise ValueError(
+                f"Duplicate grid point ID {bad_grid_point_id}"
+                f" at indexes {l2_seqnum_to_index[bad_seqnum]} and {error_index}"
+            )
+        raise ValueError(
+            f"Grid point ID {bad_grid_point_id} at index {error_index}"
+            f" is out of range, its seqnum {bad_seqnum} is not"
+            f" in the range {min_seqnum} to {max_seqnum}"
         )
-        mapped_l2_values = np.expand_dims(mapped_l2_values, axis=0)
-        self.mapped_l2_values_cache.put(l2_var_name, mapped_l2_values)
-        return mapped_l2_values
+    return l2_seqnum, l2_seqnum_to_index
 
 
 @nb.jit(nopython=True)
+def _ingest_grid_point_ids(
+    grid_point_id: np.ndarray, min_seqnum: int, max_seqnum: int
+) -> tuple[np.ndarray, np.ndarray, int]:
+    # Returns the index of the first invalid grid point ID or -1
+    missing_index = grid_point_id.size
+    l2_seqnum = np.empty(grid_point_id.size, dtype=np.uint32)
+    l2_seqnum_to_index = np.full(max_seqnum + 1, missing_index, dtype=np.uint32)
+    for i in range(grid_point_id.size):
+        # See SmosDiscreteGlobalGrid.grid_point_id_to_seqnum()
+        gpid = np.int64(grid_point_id[i])
+        if gpid < 1000000:
+            seqnum = gpid
+        else:
+            seqnum = gpid - 737856 * ((gpid - 1) // 1000000) + 1
+        if seqnum < min_seqnum or seqnum > max_seqnum:
+            return l2_seqnum, l2_seqnum_to_index, i
+        if l2_seqnum_to_index[seqnum] != missing_index:
+            return l2_seqnum, l2_seqnum_to_index, i
+        l2_seqnum[i] = seqnum
+        l2_seqnum_to_index[seqnum] = i
+    return l2_seqnum, l2_seqnum_to_index, -1
+
+
 def seqnum_to_index(
+    seqnum: np.ndarray,
+    size: int,
+    fill_value: Union[int, float],
+    parallel: bool = False,
+) -> np.ndarray:
+    """Compute a table that maps seqnums to indexes into *seqnum*.
+
+    :param seqnum: 1D array of unique seqnums
+    :param size: Size of the table, must be greater than
+        the maximum seqnum
+    :param fill_value: Index value for seqnums not in *seqnum*
+    :param parallel: Whether to use the parallel kernel
+    :return: 1D array of shape (size,) of type uint32
+    """
+    kernel = _seqnum_to_index_par if parallel else _seqnum_to_index
+    return kernel(seqnum, size, fill_value)
+
+
+def map_seqnum_to_l2_index(
+    seqnum_values_2d: np.ndarray,
+    seqnum_to_index: np.ndarray,
+    footprint: np.ndarray | None = None,
+    missing_index: int = 0,
+    parallel: bool = False,
+) -> np.ndarray:
+    """Map a DGG seqnum raster to an L2 index raster.
+
+    :param seqnum_values_2d: 2D seqnum raster of shape (height, width)
+    :param seqnum_to_index: Table that maps DGG seqnums to L2 indexes
+    :param footprint: Optional footprint as computed by
+        :func:compute_l2_footprint. If given, only pixels
+        within the footprint are mapped, others are set
+        to *missing_index*.
+    :param missing_index: The L2 index value used for missing data
+    :param parallel: Whether to use the parallel kernel
+    :return: 2D array of shape (height, width) of type uint32
+    """
+    kernel = _map_seqnum_to_l2_index_par if parallel else _map_seqnum_to_l2_index
+    return kernel(seqnum_values_2d, seqnum_to_index, footprint, missing_index)
+
+
+def _seqnum_to_index_impl(
     seqnum: np.ndarray, size: int, fill_value: Union[int, float]
 ) -> np.ndarray:
     index = np.full(size, fill_value, dtype=np.uint32)
-    for i in range(len(seqnum)):
+    # Parallel writes are safe as long as seqnums are unique
+    for i in nb.prange(len(seqnum)):
         j = seqnum[i]
         index[j] = i
     return index
 
 
+def _map_seqnum_to_l2_index_impl(
+    seqnum_values_2d: np.ndarray,
+    seqnum_to_index: np.ndarray,
+    footprint: np.ndarray | None,
+    missing_index: int,
+) -> np.ndarray:
+    height, width = seqnum_values_2d.shape
+    index_values_2d = np.empty((height, width), dtype=np.uint32)
+    for y in nb.prange(height):
+        if footprint is None:
+            x_start, x_stop = 0, width
+        else:
+            x_start, x_stop = footprint[y, 0], footprint[y, 1]
+            # Pixels outside footprint are set to missing_index
+            index_values_2d[y, :x_start] = missing_index
+            index_values_2d[y, x_stop:] = missing_index
+        for x in range(x_start, x_stop):
+            index_values_2d[y, x] = seqnum_to_index[seqnum_values_2d[y, x]]
+    return index_values_2d
+
+
+def get_dgg_seqnum_extents(dgg: MultiLevelDataset, level: int) -> np.ndarray:
+    """Get the pixel extents of all seqnums of *dgg* at given *level*.
+    The extents are computed only once per DGG instance and level.
+
+    :param dgg: SMOS discrete global grid.
+    :param level: Resolution level.
+    :return: 2D array of shape (SmosDiscreteGlobalGrid.MAX_SEQNUM + 1, 4)
+        as computed by :func:compute_seqnum_extents.
+    """
+    return get_dgg_level_array(
+        dgg,
+        level,
+        "seqnum_extents",
+        lambda: compute_seqnum_extents(
+            get_dgg_seqnum(dgg, level), SmosDiscreteGlobalGrid.MAX_SEQNUM + 1
+        ),
+    )
+
+
 @nb.jit(nopython=True)
-def map_seqnum_to_l2_index(
-    seqnum_values_2d: np.ndarray, seqnum_to_index: np.ndarray
+def compute_seqnum_extents(seqnum_values_2d: np.ndarray, size: int) -> np.ndarray:
+    """Compute the pixel extents of all seqnums in given raster.
+
+    :param seqnum_values_2d: 2D seqnum raster of shape (height, width)
+    :param size: Size of the result, must be greater than the
+        maximum seqnum in *seqnum_values_2d*
+    :return: 2D array of shape (size, 4) which holds for every seqnum
+        the inclusive pixel extent (y_min, y_max, x_min, x_max).
+        Seqnums not present in *seqnum_values_2d*
+        have an empty extent with y_min > y_max.
+    """
+    height, width = seqnum_values_2d.shape
+    extents = np.empty((size, 4), dtype=np.int16)
+    extents[:, 0] = height
+    extents[:, 1] = -1
+    extents[:, 2] = width
+    extents[:, 3] = -1
+    for y in range(height):
+        for x in range(width):
+            seqnum = seqnum_values_2d[y, x]
+            if y < extents[seqnum, 0]:
+                extents[seqnum, 0] = y
+            if y > extents[seqnum, 1]:
+                extents[seqnum, 1] = y
+            if x < extents[seqnum, 2]:
+                extents[seqnum, 2] = x
+            if x > extents[seqnum, 3]:
+                extents[seqnum, 3] = x
+    return extents
+
+
+@nb.jit(nopython=True)
+def count_seqnums(seqnum_values_2d: np.ndarray, size: int) -> np.ndarray:
+    """Count the pixels of every seqnum in a seqnum raster.
+
+    :param seqnum_values_2d: 2D seqnum raster of shape (height, width)
+    :param size: Must be greater than the maximum seqnum
+    :return: 1D array of shape (size,) of type int32
+    """
+    counts = np.zeros(size, dtype=np.int32)
+    height, width = seqnum_values_2d.shape
+    for y in range(height):
+        for x in range(width):
+            counts[seqnum_values_2d[y, x]] += 1
+    return counts
+
+
+@nb.jit(nopython=True)
+def compute_weighted_stats(
+    var_data: np.ndarray,
+    weights: np.ndarray,
+    fill_value: np.ndarray,
+    scale_factor: float,
+    add_offset: float,
 ) -> np.ndarray:
-    seqnum_values_1d = seqnum_values_2d.flatten()
-    index_values_1d = np.zeros(seqnum_values_1d.size, dtype=np.uint32)
-    for i in range(index_values_1d.size):
-        seqnum = seqnum_values_1d[i]
-        index_values_1d[i] = seqnum_to_index[seqnum]
-    return index_values_1d.reshape(seqnum_values_2d.shape)
-
-
-# TODO (forman): fix new numba error
-#   No implementation of function Function(<built-in function getitem>)
-#   found for signature:
-#   >>> getitem(array(float32, 1d, C), array(int64, 2d, C))
-#
-# @nb.jit(nopython=True)
+    """Compute weighted statistics :const:STATS_NAMES of L2 values.
+
+    :param var_data: 1D array of L2 values of shape (num_l2,)
+    :param weights: 1D array of integer weights of shape (num_l2,),
+        usually the number of pixels the L2 values are mapped to
+    :param fill_value: The fill value as 0-D array. Fill values
+        and NaNs are not valid.
+    :param scale_factor: Scaling factor applied to the valid values
+    :param add_offset: Offset added to the scaled valid values
+    :return: 1D array of type float64 with the weighted count,
+        minimum, maximum, mean, and sum of squares
+    """
+    count = 0
+    v_min = np.inf
+    v_max = -np.inf
+    v_sum = 0.0
+    v_sum_sq = 0.0
+    for i in range(var_data.size):
+        w = weights[i]
+        if w == 0 or var_data[i] == fill_value[()]:
+            continue
+        v = var_data[i] * scale_factor + add_offset
+        if np.isnan(v):
+            continue
+        count += w
+        v_min = min(v_min, v)
+        v_max = max(v_max, v)
+        v_sum += w * v
+        v_sum_sq += w * v * v
+    stats = np.full(5, np.nan, dtype=np.float64)
+    stats[0] = count
+    if count > 0:
+        stats[1] = v_min
+        stats[2] = v_max
+        stats[3] = v_sum / count
+        stats[4] = v_sum_sq
+    return stats
+
+
+def get_stats_attrs(var_name: str) -> Dict[str, Any]:
+    """Get the attributes of the statistics variable of *var_name*."""
+    return {
+        "long_name": f"Per-time-step statistics of {var_name}",
+        "description": (
+            "Valid pixel count, minimum, maximum, mean, and sum of squares"
+            " of the valid pixel values"
+        ),
+    }
+
+
+def get_window_bounds(
+    window: Window | None, shape: tuple[int, int]
+) -> tuple[int, int, int, int] | None:
+    """Get the bounds (y_start, y_stop, x_start, x_stop) of *window*
+    in a raster of given *shape*. Bounds are hashable, other than slices.
+
+    :param window: Window given as pair of slices (y, x), may be None
+    :param shape: Raster shape (height, width)
+    :return: The bounds, or None, if *window* is None
+        or covers the entire raster
+    """
+    if window is None:
+        return None
+    height, width = shape
+    y_slice, x_slice = window
+    y_start, y_stop, _ = y_slice.indices(height)
+    x_start, x_stop, _ = x_slice.indices(width)
+    if (y_start, y_stop, x_start, x_stop) == (0, height, 0, width):
+        return None
+    return y_start, y_stop, x_start, x_stop
+
+
+def is_footprint_empty(
+    footprint: np.ndarray, bounds: tuple[int, int, int, int] | None = None
+) -> bool:
+    """Test whether *footprint* has no pixels within the window
+    given by *bounds*.
+
+    :param footprint: Footprint as computed by :func:compute_l2_footprint
+    :param bounds: Optional window bounds (y_start, y_stop, x_start, x_stop)
+    :return: True, if so
+    """
+    if bounds is not None:
+        y_start, y_stop, x_start, x_stop = bounds
+        footprint = crop_footprint(footprint[y_start:y_stop], x_start, x_stop)
+    return not np.any(footprint[:, 0] < footprint[:, 1])
+
+
+def crop_footprint(footprint: np.ndarray, x_start: int, x_stop: int) -> np.ndarray:
+    """Crop the column ranges of *footprint* to the window
+    given by *x_start* and *x_stop* and make them relative to it.
+
+    :param footprint: Footprint as computed by :func:compute_l2_footprint,
+        or a subset of its rows
+    :param x_start: Start column of the window
+    :param x_stop: Stop column of the window, exclusive
+    :return: 2D array of shape (height, 2) of column ranges (start, stop)
+    """
+    cropped = np.clip(footprint, x_start, x_stop) - x_start
+    cropped[cropped[:, 0] >= cropped[:, 1]] = 0
+    return cropped.astype(np.int32, copy=False)
+
+
+@nb.jit(nopython=True)
+def compute_l2_footprint(
+    l2_seqnum: np.ndarray, seqnum_extents: np.ndarray, height: int
+) -> np.ndarray:
+    """Compute the footprint of an L2 product in the pixel raster of a level.
+
+    The footprint is given by a column range for every row of the raster.
+    Rows not covered by the product have an empty column range.
+
+    :param l2_seqnum: 1D array of the product's seqnums
+    :param seqnum_extents: Seqnum extents as computed
+        by :func:compute_seqnum_extents for the level
+    :param height: Raster height of the level
+    :return: 2D array of shape (height, 2) of column ranges (start, stop)
+    """
+    footprint = np.zeros((height, 2), dtype=np.int32)
+    for i in range(l2_seqnum.size):
+        seqnum = l2_seqnum[i]
+        y_min, y_max, x_min, x_max = seqnum_extents[seqnum]
+        for y in range(y_min, y_max + 1):
+            x_start, x_stop = footprint[y]
+            if x_start == x_stop:
+                footprint[y, 0] = x_min
+                footprint[y, 1] = x_max + 1
+            else:
+                if x_min < x_start:
+                    footprint[y, 0] = x_min
+                if x_max + 1 > x_stop:
+                    footprint[y, 1] = x_max + 1
+    return footprint
+
+
 def map_l2_values(
     index_2d: np.ndarray,
     var_data: np.ndarray,
     missing_index: int,
     fill_value: Union[int, float],
+    footprint: np.ndarray | None = None,
+    parallel: bool = False,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """Map the values of a single L2 variable using an L2 index raster.
+
+    :param index_2d: 2D array of L2 indexes of shape (height, width)
+    :param var_data: 1D array of L2 values of shape (num_l2,)
+    :param missing_index: The L2 index value used for missing data
+    :param fill_value: The fill value, will be converted
+        into the data type of *var_data*
+    :param footprint: Optional footprint as computed by
+        :func:compute_l2_footprint. If given, only pixels
+        within the footprint are mapped, others are filled.
+    :param parallel: Whether to use the parallel kernel
+    :param out: Optional 2D output array of shape (height, width)
+        with the data type of *var_data* in native byte order
+    :return: 2D array of mapped values of shape (height, width)
+        with the data type of *var_data*, *out* if given
+    """
+    var_data = _to_native_byte_order(var_data)
+    fill_values = np.array([fill_value], dtype=var_data.dtype)
+    return map_l2_values_multi(
+        index_2d,
+        var_data.reshape((1, -1)),
+        missing_index,
+        fill_values,
+        footprint=footprint,
+        parallel=parallel,
+        out=None if out is None else out[np.newaxis],
+    )[0]
+
+
+def map_l2_values_multi(
+    index_2d: np.ndarray,
+    var_data_2d: np.ndarray,
+    missing_index: int,
+    fill_values: np.ndarray,
+    seqnum_to_index: np.ndarray | None = None,
+    footprint: np.ndarray | None = None,
+    parallel: bool = False,
+    out: np.ndarray | None = None,
 ) -> np.ndarray:
-    if index_2d.size == 0:
-        return index_2d.astype(var_data.dtype)
-    l2_mask_2d = index_2d != missing_index
-    l2_index_ok = np.where(l2_mask_2d, index_2d, 0)
-    mapped_l2_value = var_data[l2_index_ok]
-    return np.where(l2_mask_2d, mapped_l2_value, fill_value)
+    """Fused version of :func:map_l2_values that maps
+    multiple L2 variables of the same data type in one pass.
+
+    :param index_2d: 2D array of L2 indexes of shape (height, width),
+        or DGG seqnums, if *seqnum_to_index* is given
+    :param var_data_2d: 2D array of L2 values of shape (num_vars, num_l2)
+    :param missing_index: The L2 index value used for missing data
+    :param fill_values: 1D array of fill values of shape (num_vars,)
+    :param seqnum_to_index: Optional table that maps DGG seqnums to
+        L2 indexes, used to resolve *index_2d* on the fly
+    :param footprint: Optional footprint as computed by
+        :func:compute_l2_footprint. If given, only pixels
+        within the footprint are mapped, others are filled.
+    :param parallel: Whether to use the parallel kernel
+    :param out: Optional 3D output array of shape (num_vars, height, width)
+        with the data type of *var_data_2d*
+    :return: 3D array of mapped values of shape (num_vars, height, width),
+        *out* if given
+    """
+    height, width = index_2d.shape
+    shape = (var_data_2d.shape[0], height, width)
+    if out is None:
+        out = np.empty(shape, dtype=var_data_2d.dtype)
+    elif out.shape != shape or out.dtype != var_data_2d.dtype:
+        raise ValueError(
+            f"out must be of shape {shape} and type {var_data_2d.dtype},"
+            f" but got {out.shape} and {out.dtype}"
+        )
+    kernel = _map_l2_values_multi_par if parallel else _map_l2_values_multi
+    kernel(
+        index_2d,
+        var_data_2d,
+        missing_index,
+        fill_values,
+        seqnum_to_index,
+        footprint,
+        out,
+    )
+    return out
+
+
+def _map_l2_values_multi_impl(
+    index_2d: np.ndarray,
+    var_data_2d: np.ndarray,
+    missing_index: int,
+    fill_values: np.ndarray,
+    seqnum_to_index: np.ndarray | None,
+    footprint: np.ndarray | None,
+    mapped_values: np.ndarray,
+):
+    num_vars = var_data_2d.shape[0]
+    height, width = index_2d.shape
+    for y in nb.prange(height):
+        if footprint is None:
+            x_start, x_stop = 0, width
+        else:
+            x_start, x_stop = footprint[y, 0], footprint[y, 1]
+            for k in range(num_vars):
+                mapped_values[k, y, :x_start] = fill_values[k]
+                mapped_values[k, y, x_stop:] = fill_values[k]
+        for x in range(x_start, x_stop):
+            i = index_2d[y, x]
+            if seqnum_to_index is not None:
+                i = seqnum_to_index[i]
+            if i == missing_index:
+                for k in range(num_vars):
+                    mapped_values[k, y, x] = fill_values[k]
+            else:
+                for k in range(num_vars):
+                    mapped_values[k, y, x] = var_data_2d[k, i]
+
+
+# Every kernel is compiled twice: a sequential version and a
+# parallel version that distributes rows across all CPU cores.
+# In the sequential version, nb.prange() behaves like range().
+_seqnum_to_index = nb.njit(_seqnum_to_index_impl)
+_seqnum_to_index_par = nb.njit(parallel=True)(_seqnum_to_index_impl)
+_map_seqnum_to_l2_index = nb.njit(_map_seqnum_to_l2_index_impl)
+_map_seqnum_to_l2_index_par = nb.njit(parallel=True)(_map_seqnum_to_l2_index_impl)
+_map_l2_values_multi = nb.njit(_map_l2_values_multi_impl)
+_map_l2_values_multi_par = nb.njit(parallel=True)(_map_l2_values_multi_impl)
+
+
+def _to_native_byte_order(array: np.ndarray) -> np.ndarray:
+    # numba requires native byte order
+    return array.astype(array.dtype.newbyteorder("="), copy=False)
+
+
+def map_l2_products_vars(
+    mapped_l2_products: Sequence[SmosMappedL2Product],
+    l2_var_names: Iterable[Hashable],
+) -> List[Dict[Hashable, np.ndarray]]:
+    """Map multiple L2 variables of multiple L2 products at once.
+
+    All variables of the same data type of all products are mapped
+    by a single sparse matrix product, which amortizes the mapping
+    effort across time steps and variables, e.g., for batch writes.
+    Requires the products to be mapped in mapping mode "sparse"
+    onto the same level and region.
+
+    :param mapped_l2_products: The mapped L2 products
+    :param l2_var_names: The L2 variable names
+    :return: List of dictionaries, one for each product, that map
+        each variable name to a 3D array of shape (1, height, width)
+    """
+    if not mapped_l2_products:
+        return []
+    selection_matrix = mapped_l2_products[0].selection_matrix
+    if selection_matrix is None or any(
+        p.selection_matrix is not selection_matrix for p in mapped_l2_products
+    ):
+        raise ValueError(
+            "Mapped L2 products must use mapping mode"
+            f" {MAPPING_MODE_SPARSE!r} and the same level and region"
+        )
+    l2_var_names = list(l2_var_names)
+    columns_by_dtype: Dict[np.dtype, List[tuple[int, Hashable]]] = {}
+    for product_index, mapped_l2_product in enumerate(mapped_l2_products):
+        l2_dataset = mapped_l2_product.l2_product.l2_dataset
+        for l2_var_name in l2_var_names:
+            # numba requires native byte order
+            dtype = l2_dataset[l2_var_name].dtype.newbyteorder("=")
+            columns_by_dtype.setdefault(dtype, []).append((product_index, l2_var_name))
+
+    mapped_l2_vars = [{} for _ in mapped_l2_products]
+    for dtype, columns in columns_by_dtype.items():
+        mapped_l2_values = mapped_l2_products[0].new_mapped_buffer(len(columns), dtype)
+        seqnum_columns = []
+        for product_index, l2_var_name in columns:
+            l2_product = mapped_l2_products[product_index].l2_product
+            seqnum_columns.append(
+                (
+                    l2_product.l2_seqnum,
+                    l2_product.read_l2_values(l2_var_name),
+                    l2_product.l2_fill_values[l2_var_name],
+                )
+            )
+        map_seqnum_columns(selection_matrix, seqnum_columns, dtype, mapped_l2_values)
+        for k, (product_index, l2_var_name) in enumerate(columns):
+            mapped_l2_vars[product_index][l2_var_name] = mapped_l2_values[k : k + 1]
+    return mapped_l2_vars
 
 
 def _sanitize_attrs(attrs: Dict[str, Any]):
@@ -1,15 +1,17 @@
 import contextlib
+import threading
+import weakref
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Hashable, Optional, TypeVar
 
 import importlib_resources
 import atexit
+import numpy as np
 
 from xcube.core.mldataset import MultiLevelDataset
 from xcube.core.store import new_fs_data_store
 from .dgg import SmosDiscreteGlobalGrid
 
-
 # We don't use the first and the last level
 NUM_LEVELS = SmosDiscreteGlobalGrid.MAX_NUM_LEVELS - 2
 # Because we skip original level 0, resolution decreases by factor 2
@@ -19,6 +21,12 @@ MIN_PIXEL_SIZE = SmosDiscreteGlobalGrid.MIN_PIXEL_SIZE * 2
 
 _PACKAGE_PATH: Optional[str] = None
 
+_LEVEL_OBJECT_CACHE_LOCK = threading.RLock()
+# Maps DGG instances to dictionaries that map (name, level) to objects
+_LEVEL_OBJECT_CACHE = weakref.WeakKeyDictionary()
+
+T = TypeVar("T")
+
 
 def new_dgg() -> MultiLevelDataset:
     global _PACKAGE_PATH
@@ -35,3 +43,73 @@ def get_package_path() -> Path:
     atexit.register(file_manager.close)
     ref = importlib_resources.files("xcube_smos.mldataset")
     return file_manager.enter_context(importlib_resources.as_file(ref))
+
+
+def get_dgg_seqnum(dgg: MultiLevelDataset, level: int) -> np.ndarray:
+    """Get the seqnum raster of *dgg* at given *level* as numpy array.
+
+    The DGG is static, therefore the raster is loaded only once
+    per DGG instance and level and then shared by all callers.
+    The returned array is read-only.
+
+    :param dgg: SMOS discrete global grid.
+    :param level: Resolution level.
+    :return: 2D array of shape (height, width)
+    """
+    return get_dgg_level_array(
+        dgg, level, "seqnum", lambda: dgg.get_dataset(level).seqnum.values
+    )
+
+
+def get_dgg_level_array(
+    dgg: MultiLevelDataset,
+    level: int,
+    name: str,
+    compute_array: Callable[[], np.ndarray],
+) -> np.ndarray:
+    """Get a static array named *name* derived from *dgg* at given *level*.
+
+    The array is computed by *compute_array* only once per DGG instance,
+    level and name and then shared by all callers.
+    The returned array is read-only.
+
+    :param dgg: SMOS discrete global grid.
+    :param level: Resolution level.
+    :param name: Name of the derived array.
+    :param compute_array: Function that computes the array.
+    :return: The derived array.
+    """
+
+    def compute_read_only_array():
+        array = compute_array()
+        array.flags.writeable = False
+        return array
+
+    return get_dgg_level_object(dgg, level, name, compute_read_only_array)
+
+
+def get_dgg_level_object(
+    dgg: MultiLevelDataset,
+    level: int,
+    name: Hashable,
+    compute_object: Callable[[], T],
+) -> T:
+    """Get a static object named *name* derived from *dgg* at given *level*.
+
+    The object is computed by *compute_object* only once per DGG instance,
+    level and name and then shared by all callers.
+    Callers must not modify the returned object.
+
+    :param dgg: SMOS discrete global grid.
+    :param level: Resolution level.
+    :param name: Name of the derived object.
+    :param compute_object: Function that computes the object.
+    :return: The derived object.
+    """
+    with _LEVEL_OBJECT_CACHE_LOCK:
+        level_objects = _LEVEL_OBJECT_CACHE.setdefault(dgg, {})
+        obj = level_objects.get((name, level))
+        if obj is None:
+            obj = compute_object()
+            level_objects[(name, level)] = obj
+    return obj
@@ -0,0 +1,111 @@
+# The MIT License (MIT)
+# Copyright (c) 2023 by the xcube development team and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""Sparse-matrix based mapping of SMOS L2 values onto the DGG.
+
+The mapping of a DGG level (or a region of it) is expressed as a
+sparse matrix S of shape (num_pixels, num_seqnums), where S[p, s] is
+the weight of seqnum s for pixel p. Values of any number of variables
+and products, given in seqnum space as matrix V of shape
+(num_seqnums, num_columns), are then mapped by one product S @ V.
+
+Currently, only selection matrices are used, that is, every pixel
+has a single weight of one for its seqnum (nearest neighbour).
+"""
+
+from typing import Iterable, Tuple, Union
+
+import numpy as np
+import scipy.sparse as sp
+
+# A column of values in seqnum space, given as triple
+# (l2_seqnum, l2_values, fill_value)
+SeqnumColumn = Tuple[np.ndarray, np.ndarray, Union[int, float]]
+
+
+def new_selection_matrix(seqnum_2d: np.ndarray, num_seqnums: int) -> sp.csr_matrix:
+    """Create the selection matrix for the given seqnum raster.
+
+    :param seqnum_2d: 2D seqnum raster of shape (height, width)
+    :param num_seqnums: Number of seqnums, must be greater than
+        the maximum seqnum in *seqnum_2d*
+    :return: Sparse matrix of shape (height * width, num_seqnums)
+    """
+    num_pixels = seqnum_2d.size
+    return sp.csr_matrix(
+        (
+            # uint8 weights preserve the data type of mapped values
+            np.ones(num_pixels, dtype=np.uint8),
+            np.ascontiguousarray(seqnum_2d).ravel(),
+            np.arange(num_pixels + 1, dtype=np.int64),
+        ),
+        shape=(num_pixels, num_seqnums),
+    )
+
+
+def select_window_rows(
+    selection_matrix: sp.csr_matrix,
+    shape: Tuple[int, int],
+    bounds: Tuple[int, int, int, int],
+) -> sp.csr_matrix:
+    """Select the rows of *selection_matrix* that correspond
+    to the pixels within a window of a raster of given *shape*.
+
+    :param selection_matrix: Selection matrix of the raster
+    :param shape: Raster shape (height, width)
+    :param bounds: Window bounds (y_start, y_stop, x_start, x_stop)
+    :return: Sparse matrix of shape (window_size, num_seqnums)
+    """
+    y_start, y_stop, x_start, x_stop = bounds
+    width = shape[1]
+    rows = (
+        np.arange(y_start, y_stop)[:, np.newaxis] * width
+        + np.arange(x_start, x_stop)[np.newaxis, :]
+    )
+    return selection_matrix[rows.ravel()]
+
+
+def map_seqnum_columns(
+    selection_matrix: sp.csr_matrix,
+    columns: Iterable[SeqnumColumn],
+    dtype: np.dtype,
+    out: np.ndarray,
+):
+    """Map columns of L2 values using a selection matrix.
+
+    :param selection_matrix: Selection matrix of shape
+        (num_pixels, num_seqnums)
+    :param columns: The columns to be mapped. Every column is given
+        by the seqnums of an L2 product, the L2 values of a variable
+        and the fill value used for seqnums not in the product.
+    :param dtype: Data type of the values
+    :param out: Output array of shape (num_columns, height, width)
+        where height * width equals num_pixels
+    """
+    num_seqnums = selection_matrix.shape[1]
+    # Fortran order, so that columns are contiguous
+    seqnum_values = np.empty((num_seqnums, out.shape[0]), dtype=dtype, order="F")
+    for k, (l2_seqnum, l2_values, fill_value) in enumerate(columns):
+        seqnum_values[:, k] = fill_value
+        seqnum_values[l2_seqnum, k] = l2_values
+    mapped_values = selection_matrix @ seqnum_values
+    for k in range(out.shape[0]):
+        out[k] = mapped_values[:, k].reshape(out.shape[1:])
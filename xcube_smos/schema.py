@@ -20,11 +20,18 @@
 # DEALINGS IN THE SOFTWARE.
 
 from xcube.util.jsonschema import JsonArraySchema
+from xcube.util.jsonschema import JsonBooleanSchema
 from xcube.util.jsonschema import JsonDateSchema
 from xcube.util.jsonschema import JsonIntegerSchema
 from xcube.util.jsonschema import JsonNumberSchema
 from xcube.util.jsonschema import JsonObjectSchema
 from xcube.util.jsonschema import JsonStringSchema
+from .cachedir import DEFAULT_EVICTION_POLICY
+from .cachedir import EVICTION_POLICIES
+from .mldataset.l2cube import DEFAULT_L2_PRODUCT_CACHE_MODE
+from .mldataset.l2cube import DEFAULT_MAPPING_MODE
+from .mldataset.l2cube import L2_PRODUCT_CACHE_MODES
+from .mldataset.l2cube import MAPPING_MODES
 from .mldataset.newdgg import MIN_PIXEL_SIZE
 from .mldataset.newdgg import NUM_LEVELS
 
@@ -66,6 +73,25 @@ STORE_PARAMS_SCHEMA = JsonObjectSchema(
             ),
             examples=["~/.smos-nc-cache"],
         ),
+        cache_max_bytes=JsonIntegerSchema(
+            title="Quota of the local cache directory in bytes",
+            description=(
+                "If the product files in cache_path exceed the quota,"
+                " files are evicted according to cache_eviction_policy."
+                " If not given, files are never evicted."
+            ),
+            nullable=True,
+            minimum=0,
+        ),
+        cache_eviction_policy=JsonStringSchema(
+            enum=list(EVICTION_POLICIES),
+            title="Eviction policy of the local cache directory",
+            description=(
+                "'lru' evicts the least recently used product files first,"
+                " 'lfu' the least frequently used ones."
+            ),
+            default=DEFAULT_EVICTION_POLICY,
+        ),
         xarray_kwargs=JsonObjectSchema(
             additional_properties=True,
             title="Extra keyword arguments accepted by xarray.open_dataset.",
@@ -99,6 +125,140 @@ _COMMON_OPEN_PARAMS_PROPS = dict(
         ),
         title="Bounding box [x1,y1, x2,y2] in geographical coordinates",
     ),
+    mapping_mode=JsonStringSchema(
+        enum=list(MAPPING_MODES),
+        title="Mapping mode",
+        description=(
+            "How SMOS L2 products are mapped onto the DGG."
+            " 'index' computes an index raster per product and"
+            " resolution level, which is fast but memory-intensive."
+            " 'compact' resolves the static DGG on the fly and keeps"
+            " memory per product roughly constant."
+            " 'sparse' maps values using a static sparse selection"
+            " matrix per resolution level."
+        ),
+        default=DEFAULT_MAPPING_MODE,
+    ),
+    parallel_mapping=JsonBooleanSchema(
+        title="Parallel mapping",
+        description=(
+            "Whether to map SMOS L2 products onto the DGG using"
+            " multi-threaded kernels that use all CPU cores"
+            " of a process."
+        ),
+        default=False,
+    ),
+    tile_size=JsonIntegerSchema(
+        nullable=True,
+        minimum=1,
+        title="Tile size",
+        description=(
+            "Size of spatial chunks in pixels. If not given,"
+            " variables are not chunked in spatial dimensions and"
+            " every chunk covers an entire time step."
+            " Not used by dataset iterators."
+        ),
+    ),
+    lazy_indexing=JsonBooleanSchema(
+        title="Lazy indexing",
+        description=(
+            "Whether to represent variables by lazily indexed arrays"
+            " rather than by chunked arrays. If so, indexing, e.g.,"
+            " selecting a small window or a single point, maps only"
+            " the selected pixels of the selected time steps."
+            " Not used by dataset iterators."
+        ),
+        default=False,
+    ),
+    compute_stats=JsonBooleanSchema(
+        title="Compute statistics",
+        description=(
+            "Whether to provide for every variable an additional"
+            " variable '<var_name>_stats' with dimensions (time, stat)"
+            " that holds the valid pixel count, minimum, maximum, mean,"
+            " and sum of squares of the variable per time step."
+        ),
+        default=False,
+    ),
+    mask_rules=JsonObjectSchema(
+        title="Quality mask rules",
+        description=(
+            "Maps variable names to rules that L2 grid points must pass."
+            " A rule may provide an inclusive minimum and maximum of the"
+            " variable's decoded values. Grid points that do not pass all"
+            " rules or whose value is a fill value, are masked out, that is,"
+            " all variables will have fill values at these grid points."
+            " Example: {'Chi_2_P': {'min': 0.05}, 'RFI_Prob': {'max': 0.1}}"
+        ),
+        additional_properties=JsonObjectSchema(
+            properties=dict(
+                min=JsonNumberSchema(),
+                max=JsonNumberSchema(),
+            ),
+            additional_properties=False,
+        ),
+        nullable=True,
+    ),
+    skip_empty_time_steps=JsonBooleanSchema(
+        title="Skip empty time steps",
+        description=(
+            "Whether to skip time steps whose SMOS L2 product has no grid"
+            " points within the bounding box. Requires reading the grid"
+            " point IDs of every SMOS L2 product found for the time range."
+        ),
+        default=False,
+    ),
+    l2_product_cache_mode=JsonStringSchema(
+        enum=list(L2_PRODUCT_CACHE_MODES),
+        title="SMOS L2 product cache mode",
+        description=(
+            "How SMOS L2 products are cached."
+            " 'lru' keeps the least recently used products,"
+            " see l2_product_cache_size."
+            " 'consumption' keeps a product until all chunks of its"
+            " time step have been requested, which bounds memory use"
+            " by the time steps in progress, for example when writing"
+            " a data cube. Applies to variables represented by chunked"
+            " arrays, that is, if lazy_indexing is not set."
+        ),
+        default=DEFAULT_L2_PRODUCT_CACHE_MODE,
+    ),
+    chunk_cache_path=JsonStringSchema(
+        min_length=1,
+        title="Path to local chunk cache directory",
+        description=(
+            "If given, mapped chunks are cached persistently in the given"
+            " directory, keyed by SMOS L2 product, resolution level,"
+            " variable, and spatial chunk. Opening the same data again,"
+            " also after a restart, then reads the cached chunks instead"
+            " of downloading and mapping SMOS L2 products. Applies to"
+            " variables represented by chunked arrays, that is,"
+            " if lazy_indexing is not set."
+        ),
+        examples=["~/.smos-chunk-cache"],
+    ),
+    chunk_cache_max_bytes=JsonIntegerSchema(
+        title="Quota of the local chunk cache directory in bytes",
+        description=(
+            "If the cached chunks in chunk_cache_path exceed the quota,"
+            " the least recently used chunks are evicted. If not given,"
+            " chunks are never evicted and the directory must be cleaned"
+            " up externally."
+        ),
+        nullable=True,
+        minimum=0,
+    ),
+    chunk_cache_url=JsonStringSchema(
+        min_length=1,
+        title="URL of a Redis server used as chunk cache",
+        description=(
+            "Like chunk_cache_path, but mapped chunks are cached in the"
+            " given Redis server, so that they can be shared by the dask"
+            " workers of a cluster. Requires the package 'redis'."
+            " Must not be given together with chunk_cache_path."
+        ),
+        examples=["redis://localhost:6379/0"],
+    ),
     # TODO: support variable_names
     # variable_names=JsonArraySchema(
     #     items=JsonStringSchema(), title="Names of variables to be included"
@@ -113,6 +273,30 @@ _ML_DATASET_OPEN_PARAMS_PROPS = dict(
         default=0,
         minimum=0,
     ),
+    l2_product_cache_bytes=JsonIntegerSchema(
+        title="Memory budget of the SMOS L2 product cache",
+        description=(
+            "Maximum number of bytes used by the cached SMOS L2 products,"
+            " including the rasters computed when mapping them."
+            " If given, an l2_product_cache_size of zero means that"
+            " the number of cached products is not limited."
+        ),
+        nullable=True,
+        minimum=0,
+    ),
+    mapped_cache_bytes=JsonIntegerSchema(
+        title="Memory budget of the cache of mapped chunks",
+        description=(
+            "If given, chunks of variables are kept in memory in"
+            " compressed form once mapped, up to the given number of"
+            " compressed bytes. Requesting them again, for example when"
+            " animating time steps, then requires no SMOS L2 products."
+            " Applies to variables represented by chunked arrays,"
+            " that is, if lazy_indexing is not set."
+        ),
+        nullable=True,
+        minimum=0,
+    ),
 )
 
 _DATASET_OPEN_PARAMS_PROPS = dict(
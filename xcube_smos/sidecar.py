@@ -0,0 +1,215 @@
+# The MIT License (MIT)
+# Copyright (c) 2023 by the xcube development team and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+"""Persistent sidecars of SMOS L2 products.
+
+A sidecar holds the metadata of a product that is required to
+describe a SMOS L2 cube and to find the product's grid points,
+so that these can be provided without opening (and possibly
+downloading) the product again:
+
+* the global attributes,
+* the data type, attributes and fill value of every variable,
+* the extent of the grid point IDs.
+
+Optionally, the product's DGG seqnums are stored next to the
+sidecar, from which the table that maps seqnums to L2 indexes
+can be computed without reading and validating the grid point IDs.
+
+Sidecars are stored in a local directory, see
+:class:SmosProductSidecarStore, one JSON file per product
+named after the product's file name.
+"""
+
+import io
+import json
+import os
+import uuid
+import warnings
+from pathlib import Path
+from typing import Any, Dict, Hashable
+
+import numpy as np
+import xarray as xr
+
+# Version of the sidecar format.
+# Sidecars of other versions are ignored.
+SIDECAR_VERSION = 1
+
+# A product sidecar, see new_product_sidecar()
+ProductSidecar = Dict[str, Any]
+
+
+def get_product_name(dataset_path: str) -> str:
+    """Get the file name of the SMOS L2 product
+    given by its resolved *dataset_path*.
+    """
+    return dataset_path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def get_l2_fill_values(l2_dataset: xr.Dataset) -> Dict[Hashable, int | float]:
+    """Get the fill values of the variables of an L2 dataset.
+    Variables that are missing a fill value use NaN, if they
+    are of a floating point type, otherwise zero.
+
+    :param l2_dataset: The SMOS L2 dataset, not decoded.
+    :return: Mapping of variable names to fill values.
+    """
+    l2_fill_values = {}
+    for l2_var_name, l2_var in l2_dataset.data_vars.items():
+        fill_value = l2_var.attrs.get("_FillValue")
+        if fill_value is None:
+            if np.issubdtype(l2_var.dtype, np.floating):
+                fill_value = float(np.nan)
+            else:
+                fill_value = 0
+            warnings.warn(
+                f"Variable {l2_var_name!r}"
+                f" is missing a fill value,"
+                f" using {fill_value} instead."
+            )
+        l2_fill_values[l2_var_name] = fill_value
+    return l2_fill_values
+
+
+def new_product_sidecar(l2_dataset: xr.Dataset) -> ProductSidecar:
+    """Compute the sidecar of an L2 dataset.
+
+    Only the grid point IDs are read, if any.
+
+    :param l2_dataset: The SMOS L2 dataset, not decoded.
+    :return: A JSON-serializable dictionary.
+    """
+    l2_fill_values = get_l2_fill_values(l2_dataset)
+    grid_point_id = None
+    if "Grid_Point_ID" in l2_dataset.variables:
+        values = l2_dataset.Grid_Point_ID.values
+        grid_point_id = {
+            "count": int(values.size),
+            "min": int(values.min()) if values.size else None,
+            "max": int(values.max()) if values.size else None,
+        }
+    return {
+        "version": SIDECAR_VERSION,
+        "attrs": _to_json_attrs(l2_dataset.attrs),
+        "variables": {
+            str(var_name): {
+                "dtype": var.dtype.str,
+                "attrs": _to_json_attrs(var.attrs),
+                "fill_value": _to_json_value(l2_fill_values[var_name]),
+            }
+            for var_name, var in l2_dataset.data_vars.items()
+        },
+        "grid_point_id": grid_point_id,
+    }
+
+
+class SmosProductSidecarStore:
+    """A local directory of product sidecars.
+
+    For every product, the directory contains the sidecar
+    "<product_name>.json" and optionally the product's DGG
+    seqnums "<product_name>.seqnum.npy". Files are written
+    atomically, so the directory can be shared by multiple
+    processes. Instances are serializable.
+
+    :param root: Root directory. Created on first write,
+        if it does not exist.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(os.path.expanduser(str(root)))
+
+    def get_sidecar_path(self, product_name: str) -> Path:
+        """Get the path of the sidecar of the given product."""
+        return self.root / f"{product_name}.json"
+
+    def get_seqnum_path(self, product_name: str) -> Path:
+        """Get the path of the seqnums of the given product."""
+        return self.root / f"{product_name}.seqnum.npy"
+
+    def get_sidecar(self, product_name: str) -> ProductSidecar | None:
+        """Get the sidecar of the given product.
+
+        :param product_name: File name of the SMOS L2 product.
+        :return: The sidecar, or None, if there is none
+            or if it has been written by another version.
+        """
+        try:
+            sidecar = json.loads(self.get_sidecar_path(product_name).read_text())
+        except FileNotFoundError:
+            return None
+        if sidecar.get("version") != SIDECAR_VERSION:
+            return None
+        return sidecar
+
+    def put_sidecar(self, product_name: str, sidecar: ProductSidecar):
+        """Put the sidecar of the given product.
+
+        :param product_name: File name of the SMOS L2 product.
+        :param sidecar: The sidecar, see :func:new_product_sidecar.
+        """
+        self._write(
+            self.get_sidecar_path(product_name),
+            json.dumps(sidecar).encode("utf-8"),
+        )
+
+    def get_seqnum(self, product_name: str) -> np.ndarray | None:
+        """Get the DGG seqnums of the given product.
+
+        :param product_name: File name of the SMOS L2 product.
+        :return: 1D array of type uint32, or None, if there is none.
+        """
+        try:
+            return np.load(self.get_seqnum_path(product_name))
+        except FileNotFoundError:
+            return None
+
+    def put_seqnum(self, product_name: str, l2_seqnum: np.ndarray):
+        """Put the DGG seqnums of the given product.
+
+        :param product_name: File name of the SMOS L2 product.
+        :param l2_seqnum: 1D array of the seqnums of the product's
+            grid points, see :attr:SmosL2Product.l2_seqnum.
+        """
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(l2_seqnum, dtype=np.uint32))
+        self._write(self.get_seqnum_path(product_name), buffer.getvalue())
+
+    @classmethod
+    def _write(cls, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.temp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+
+
+def _to_json_attrs(attrs: Dict[Hashable, Any]) -> Dict[str, Any]:
+    return {str(k): _to_json_value(v) for k, v in attrs.items()}
+
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value
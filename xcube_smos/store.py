@@ -21,6 +21,7 @@
 
 from functools import cached_property
 from typing import Iterator, Any, Tuple, Container, Union, Dict, Optional
+from typing import Iterable
 
 import numpy as np
 import xarray as xr
@@ -35,6 +36,7 @@ from xcube.core.store import DatasetDescriptor
 from xcube.core.store import MULTI_LEVEL_DATASET_TYPE
 from xcube.core.store import MultiLevelDatasetDescriptor
 from xcube.util.jsonschema import JsonObjectSchema
+from .cachedir import DEFAULT_EVICTION_POLICY
 from .catalog import AbstractSmosCatalog
 from .catalog import SmosStacCatalog
 from .constants import DATASET_ATTRIBUTES
@@ -43,12 +45,23 @@ from .dsiter import SmosDatasetIterator
 from .mldataset.newdgg import MAX_HEIGHT, NUM_LEVELS
 from .mldataset.newdgg import MIN_PIXEL_SIZE
 from .mldataset.newdgg import new_dgg
+from .mldataset.chunkcache import DiskCacheBackend
+from .mldataset.chunkcache import RedisCacheBackend
+from .mldataset.chunkcache import SmosChunkCache
+from .mldataset.chunkcache import get_chunk_cache_variant
 from .mldataset.l2cube import SmosL2Cube
 from .mldataset.l2cube import SmosTimeStepLoader
 from .mldataset.l2cube import DATASET_VAR_NAMES
+from .mldataset.l2cube import DEFAULT_L2_PRODUCT_CACHE_MODE
+from .mldataset.l2cube import DEFAULT_MAPPING_MODE
+from .mldataset.l2cube import get_bbox_seqnum_mask
+from .mldataset.l2cube import has_grid_point_id_range_coverage
+from .mldataset.l2cube import has_seqnum_coverage
+from .mldataset.l2cube import is_global_bbox
 from .schema import DATASET_OPEN_PARAMS_SCHEMA
 from .schema import ML_DATASET_OPEN_PARAMS_SCHEMA
 from .schema import STORE_PARAMS_SCHEMA
+from .sidecar import get_product_name
 from .utils import NotSerializable
 from .utils import normalize_time_range
 
@@ -76,6 +89,11 @@ class SmosDataStore(NotSerializable, DataStore):
         source_storage_options: Storage options for accessing *index_path*.
         cache_path: Path to local cache directory.
             Must be given, if file caching is desired.
+        cache_max_bytes: Optional maximum number of bytes of the
+            product files in *cache_path*. If exceeded, files are
+            evicted according to *cache_eviction_policy*.
+        cache_eviction_policy: Eviction policy of the product files
+            in *cache_path*, either "lru" or "lfu".
         xarray_kwargs: Extra keyword arguments accepted by
             ``xarray.open_dataset``.
         extra_source_storage_options: Extra keyword arguments that override
@@ -91,6 +109,8 @@ class SmosDataStore(NotSerializable, DataStore):
         source_storage_options: Optional[Dict[str, Any]] = None,
         cache_path: Optional[str] = None,
         xarray_kwargs: Optional[Dict[str, Any]] = None,
+        cache_max_bytes: Optional[int] = None,
+        cache_eviction_policy: str = DEFAULT_EVICTION_POLICY,
         _catalog: Optional[AbstractSmosCatalog] = None,
         **extra_source_storage_options,
     ):
@@ -103,6 +123,8 @@ class SmosDataStore(NotSerializable, DataStore):
                 source_storage_options=source_storage_options,
                 cache_path=cache_path,
                 xarray_kwargs=xarray_kwargs,
+                cache_max_bytes=cache_max_bytes,
+                cache_eviction_policy=cache_eviction_policy,
                 **extra_source_storage_options,
             )
 
@@ -210,8 +232,23 @@ class SmosDataStore(NotSerializable, DataStore):
 
         time_range = open_params["time_range"]  # required
         l2_product_cache_size = open_params.get("l2_product_cache_size", 0)
+        l2_product_cache_bytes = open_params.get("l2_product_cache_bytes")
+        mapped_cache_bytes = open_params.get("mapped_cache_bytes")
+        chunk_cache_path = open_params.get("chunk_cache_path")
+        chunk_cache_max_bytes = open_params.get("chunk_cache_max_bytes")
+        chunk_cache_url = open_params.get("chunk_cache_url")
+        l2_product_cache_mode = open_params.get(
+            "l2_product_cache_mode", DEFAULT_L2_PRODUCT_CACHE_MODE
+        )
         res_level = open_params.get("res_level", 0)
         bbox = open_params.get("bbox")
+        mapping_mode = open_params.get("mapping_mode", DEFAULT_MAPPING_MODE)
+        parallel_mapping = open_params.get("parallel_mapping", False)
+        tile_size = open_params.get("tile_size")
+        lazy_indexing = open_params.get("lazy_indexing", False)
+        compute_stats = open_params.get("compute_stats", False)
+        mask_rules = open_params.get("mask_rules")
+        skip_empty_time_steps = open_params.get("skip_empty_time_steps", False)
 
         dataset_records = self.catalog.find_datasets(
             product_type, normalize_time_range(time_range), bbox=bbox
@@ -224,6 +261,21 @@ class SmosDataStore(NotSerializable, DataStore):
         dataset_paths = list(
             map(self.catalog.resolve_path, [path for path, _, _ in dataset_records])
         )
+        if skip_empty_time_steps:
+            levels = (
+                range(self.dgg.num_levels)
+                if data_type.is_sub_type_of(MULTI_LEVEL_DATASET_TYPE)
+                else [res_level]
+            )
+            dataset_records, dataset_paths = self._skip_empty_datasets(
+                dataset_records, dataset_paths, bbox, levels
+            )
+            if not dataset_records:
+                raise ValueError(
+                    f"No SMOS datasets of type {product_type!r}"
+                    f" with data in bounding box {bbox!r}"
+                    f" found for time range {time_range!r}"
+                )
         time_ranges = [(start, stop) for _, start, stop in dataset_records]
         time_bounds = np.array(time_ranges, dtype="datetime64[ns]")
 
@@ -237,22 +289,66 @@ class SmosDataStore(NotSerializable, DataStore):
                 bbox,
                 res_level,
                 DATASET_VAR_NAMES[data_id],
+                mapping_mode=mapping_mode,
+                parallel_mapping=parallel_mapping,
+                compute_stats=compute_stats,
+                mask_rules=mask_rules,
             )
 
+        chunk_cache = None
+        if chunk_cache_path and chunk_cache_url:
+            raise ValueError(
+                "chunk_cache_path and chunk_cache_url must not be given both"
+            )
+        if chunk_cache_path or chunk_cache_url:
+            chunk_cache = SmosChunkCache(
+                (
+                    DiskCacheBackend(chunk_cache_path, max_bytes=chunk_cache_max_bytes)
+                    if chunk_cache_path
+                    else RedisCacheBackend(chunk_cache_url)
+                ),
+                variant=get_chunk_cache_variant(
+                    mapping_mode=mapping_mode, mask_rules=mask_rules
+                ),
+            )
+
+        sidecar_store = self.catalog.get_sidecar_store()
         time_step_loader = SmosTimeStepLoader(
             self.dgg,
             self.catalog.get_dataset_opener(),
             self.catalog.get_dataset_opener_kwargs(),
             dataset_paths,
             l2_product_cache_size,
+            mapping_mode=mapping_mode,
+            parallel_mapping=parallel_mapping,
+            mask_rules=mask_rules,
+            l2_product_cache_mode=l2_product_cache_mode,
+            l2_product_cache_bytes=l2_product_cache_bytes,
+            mapped_cache_bytes=mapped_cache_bytes,
+            chunk_cache=chunk_cache,
+            sidecar_store=sidecar_store,
         )
 
+        # Describe the cube by the sidecar of the first product,
+        # if it is kept, so that the product need not be opened.
+        # Otherwise, the cube loads the product, which also keeps
+        # its sidecar, see SmosTimeStepLoader.
+        product_sidecar = None
+        if sidecar_store is not None:
+            product_sidecar = sidecar_store.get_sidecar(
+                get_product_name(dataset_paths[0])
+            )
+
         ml_dataset = SmosL2Cube(
             self.dgg,
             data_id,
             time_bounds,
             bbox,
             time_step_loader,
+            tile_size=tile_size,
+            lazy_indexing=lazy_indexing,
+            compute_stats=compute_stats,
+            product_sidecar=product_sidecar,
         )
 
         if data_type.is_sub_type_of(MULTI_LEVEL_DATASET_TYPE):
@@ -260,6 +356,63 @@ class SmosDataStore(NotSerializable, DataStore):
         else:
             return ml_dataset.get_dataset(res_level)
 
+    def _skip_empty_datasets(
+        self,
+        dataset_records: list[tuple[str, Any, Any]],
+        dataset_paths: list[str],
+        bbox: tuple[float, float, float, float] | None,
+        levels: Iterable[int],
+    ) -> tuple[list[tuple[str, Any, Any]], list[str]]:
+        """Remove the datasets that have no grid points within *bbox*
+        at any of the given *levels*. Only the grid point IDs of the
+        datasets are read.
+
+        If the catalog keeps sidecars, datasets are not read, unless
+        their sidecars are missing. The DGG seqnums kept for a dataset
+        are tested instead, if any, otherwise the extent of its grid
+        point IDs. The latter keeps a dataset whose grid points
+        are all outside *bbox*, if the extent intersects *bbox*.
+        """
+        if bbox is None or is_global_bbox(bbox, self.dgg.grid_mapping):
+            return dataset_records, dataset_paths
+        seqnum_mask = get_bbox_seqnum_mask(self.dgg, bbox, levels)
+        non_empty_records = []
+        non_empty_paths = []
+        for dataset_record, dataset_path in zip(dataset_records, dataset_paths):
+            if self._has_dataset_coverage(dataset_path, seqnum_mask):
+                non_empty_records.append(dataset_record)
+                non_empty_paths.append(dataset_path)
+        return non_empty_records, non_empty_paths
+
+    def _has_dataset_coverage(
+        self, resolved_path: str, seqnum_mask: np.ndarray
+    ) -> bool:
+        # Only existing sidecars are used here, because computing a
+        # missing one would open the entire product, whereas the
+        # fallback below reads the grid point IDs only.
+        sidecar_store = self.catalog.get_sidecar_store()
+        if sidecar_store is not None:
+            product_name = get_product_name(resolved_path)
+            sidecar = sidecar_store.get_sidecar(product_name)
+            grid_point_id = sidecar and sidecar.get("grid_point_id")
+            if grid_point_id is not None:
+                if not grid_point_id["count"]:
+                    return False
+                l2_seqnum = sidecar_store.get_seqnum(product_name)
+                if l2_seqnum is not None and l2_seqnum.size == grid_point_id["count"]:
+                    return bool(np.any(seqnum_mask[l2_seqnum]))
+                return has_grid_point_id_range_coverage(
+                    grid_point_id["min"], grid_point_id["max"], seqnum_mask
+                )
+        dataset_opener = self.catalog.get_dataset_opener()
+        dataset_opener_kwargs = self.catalog.get_dataset_opener_kwargs() or {}
+        l2_dataset = dataset_opener(resolved_path, **dataset_opener_kwargs)
+        try:
+            grid_point_id = l2_dataset.Grid_Point_ID.values
+        finally:
+            l2_dataset.close()
+        return has_seqnum_coverage(grid_point_id, seqnum_mask)
+
     @staticmethod
     def _debug_print(debug: bool, msg: str):
         if debug:
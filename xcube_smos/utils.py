@@ -21,8 +21,11 @@
 
 import collections
 import collections.abc
+import math
 import re
+import sys
 import threading
+import weakref
 from typing import (
     TypeVar,
     Generic,
@@ -30,12 +33,13 @@ from typing import (
     Any,
     Callable,
     Optional,
-    Deque,
     Iterator,
     Tuple,
     Union,
 )
 
+import numcodecs
+import numpy as np
 import pandas as pd
 
 from xcube.util.assertions import assert_instance, assert_true
@@ -56,12 +60,55 @@ KT = TypeVar("KT")
 VT = TypeVar("VT")
 
 
+def get_nbytes(value: Any) -> int:
+    """Get the number of bytes used by *value*, if it has
+    an attribute ``nbytes``, e.g., a numpy array, otherwise zero.
+    """
+    return int(getattr(value, "nbytes", 0))
+
+
 class LruCache(Generic[KT, VT], NotSerializable, collections.abc.Mapping):
+    """A thread-safe cache that disposes its least recently used values.
+
+    The cache is bounded by the number of values, *max_size*, and
+    optionally by the total number of bytes used by the values,
+    *max_bytes*. The size of a value in bytes is measured whenever it
+    is put into the cache or accessed, so values may grow while cached.
+    Values larger than *max_bytes* are not cached at all.
+
+    All operations take constant time, except for the measurement
+    of value sizes and the disposal of values.
+
+    The cache counts hits, misses, and evictions, see :attr:stats.
+
+    :param max_size: Maximum number of values.
+    :param dispose_value: Optional function called
+        for values removed from the cache.
+    :param max_bytes: Optional maximum number of bytes.
+    :param get_value_size: Optional function that returns the size
+        of a value in bytes. Defaults to :func:get_nbytes.
+    """
+
     def __init__(
-        self, max_size: int = 128, dispose_value: Optional[Callable[[VT], Any]] = None
+        self,
+        max_size: int = 128,
+        dispose_value: Optional[Callable[[VT], Any]] = None,
+        max_bytes: Optional[int] = None,
+        get_value_size: Optional[Callable[[VT], int]] = None,
     ):
         assert_instance(max_size, int, name="max_size")
         assert_true(max_size >= 0, message="max_size must be greater or equal zero")
+        if max_bytes is not None:
+            assert_instance(max_bytes, int, name="max_bytes")
+            assert_true(
+                max_bytes >= 0, message="max_bytes must be greater or equal zero"
+            )
+        if get_value_size is None:
+            get_value_size = get_nbytes
+        else:
+            assert_true(
+                callable(get_value_size), message="get_value_size must be callable"
+            )
         if dispose_value is None:
             dispose_value = self.dispose_value
         else:
@@ -69,9 +116,16 @@ class LruCache(Generic[KT, VT], NotSerializable, collections.abc.Mapping):
                 callable(dispose_value), message="dispose_value must be callable"
             )
         self._max_size = max_size
+        self._max_bytes = max_bytes
         self._dispose_value = dispose_value
-        self._keys: Deque[KT] = collections.deque([], max_size)
-        self._values: Dict[KT, VT] = {}
+        self._get_value_size = get_value_size
+        # Ordered from most to least recently used
+        self._values: collections.OrderedDict[KT, VT] = collections.OrderedDict()
+        self._value_sizes: Dict[KT, int] = {}
+        self._nbytes = 0
+        self._num_hits = 0
+        self._num_misses = 0
+        self._num_evictions = 0
         self._lock = threading.RLock()
         self._undefined = object()
 
@@ -85,7 +139,8 @@ class LruCache(Generic[KT, VT], NotSerializable, collections.abc.Mapping):
         yield from self.keys()
 
     def __contains__(self, key: KT) -> bool:
-        return key in self._values
+        with self._lock:
+            return key in self._values
 
     def __getitem__(self, key: KT) -> VT:
         value = self.get(key, self._undefined)
@@ -102,58 +157,453 @@ class LruCache(Generic[KT, VT], NotSerializable, collections.abc.Mapping):
 
     @property
     def size(self) -> int:
-        return len(self._keys)
+        return len(self._values)
+
+    @property
+    def max_bytes(self) -> Optional[int]:
+        return self._max_bytes
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the cached values in bytes,
+        if *max_bytes* is given, otherwise zero.
+        """
+        return self._nbytes
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Counters of this cache: "hits", "misses", and "evictions"
+        since creation or :meth:reset_stats, and the current "size"
+        and "nbytes".
+        """
+        with self._lock:
+            return {
+                "hits": self._num_hits,
+                "misses": self._num_misses,
+                "evictions": self._num_evictions,
+                "size": len(self._values),
+                "nbytes": self._nbytes,
+            }
+
+    def reset_stats(self):
+        """Reset the counters for hits, misses, and evictions."""
+        with self._lock:
+            self._num_hits = 0
+            self._num_misses = 0
+            self._num_evictions = 0
 
     def keys(self) -> Iterator[KT]:
-        yield from self._keys
+        with self._lock:
+            keys = list(self._values.keys())
+        yield from keys
 
     def values(self) -> Iterator[VT]:
-        for k in self._keys:
-            yield self._values[k]
+        with self._lock:
+            values = list(self._values.values())
+        yield from values
 
     def get(self, key: KT, default: Optional[VT] = None) -> VT:
-        if not self._max_size:
-            return default
-        value = self._values.get(key, self._undefined)
-        if value is self._undefined:
-            return default
-        if self._keys[0] != key:
-            # if not LRU yet, make it LRU
-            self.put(key, value)
+        with self._lock:
+            value = self._values.get(key, self._undefined)
+            if value is self._undefined:
+                self._num_misses += 1
+                return default
+            self._num_hits += 1
+            if self._max_bytes is None:
+                # Make it the most recently used one
+                self._values.move_to_end(key, last=False)
+                return value
+        # If weighted, also measure its size again
+        value_size = self._get_value_size(value)
+        disposed_values = []
+        with self._lock:
+            # Unless replaced or removed meanwhile
+            if self._values.get(key, self._undefined) is value:
+                self._put(key, value, value_size, disposed_values)
+        self._dispose_values(disposed_values)
         return value
 
+    def pop(self, key: KT, default: Optional[VT] = None) -> VT:
+        """Remove the value for *key* and return it without disposing it,
+        or return *default*, if there is no such value.
+        """
+        with self._lock:
+            value = self._values.pop(key, self._undefined)
+            if value is self._undefined:
+                self._num_misses += 1
+                return default
+            self._num_hits += 1
+            self._nbytes -= self._value_sizes.pop(key)
+            return value
+
     def put(self, key: KT, value: VT):
         if not self._max_size:
             return
+        value_size = 0
+        if self._max_bytes is not None:
+            value_size = self._get_value_size(value)
+        disposed_values = []
         with self._lock:
-            if key in self._values:
-                prev_value = self._values[key]
-                if prev_value is not value:
-                    self._dispose_value(prev_value)
-                self._keys.remove(key)
-            elif self.size == self.max_size:
-                oldest_key = self._keys.pop()
-                oldest_value = self._values.pop(oldest_key)
-                self._dispose_value(oldest_value)
-            self._keys.appendleft(key)
-            self._values[key] = value
+            self._put(key, value, value_size, disposed_values)
+        self._dispose_values(disposed_values)
+
+    def _put(self, key: KT, value: VT, value_size: int, disposed_values: list[VT]):
+        if key in self._values:
+            prev_value = self._values.pop(key)
+            if prev_value is not value:
+                disposed_values.append(prev_value)
+            self._nbytes -= self._value_sizes.pop(key)
+        elif len(self._values) == self._max_size:
+            disposed_values.append(self._evict_oldest())
+        if self._max_bytes is not None and value_size > self._max_bytes:
+            # Too large to be cached at all
+            return
+        self._values[key] = value
+        self._values.move_to_end(key, last=False)
+        self._value_sizes[key] = value_size
+        self._nbytes += value_size
+        while self._max_bytes is not None and self._nbytes > self._max_bytes:
+            disposed_values.append(self._evict_oldest())
+
+    def _evict_oldest(self) -> VT:
+        oldest_key, oldest_value = self._values.popitem(last=True)
+        self._nbytes -= self._value_sizes.pop(oldest_key)
+        self._num_evictions += 1
+        return oldest_value
 
     def clear(self):
         with self._lock:
-            if self._dispose_value is not self.dispose_value:
-                values = list(self.values())
-            else:
-                values = []
-            self._keys.clear()
+            values = list(self._values.values())
             self._values.clear()
-            for value in values:
-                self._dispose_value(value)
+            self._value_sizes.clear()
+            self._nbytes = 0
+        self._dispose_values(values)
+
+    def _dispose_values(self, values: list[VT]):
+        # Called outside the lock, as disposal may take a while
+        for value in values:
+            self._dispose_value(value)
 
     def dispose_value(self, value: VT):
         """May be overridden by subclasses."""
         pass
 
 
+class SingleFlight(Generic[KT, VT], NotSerializable):
+    """Coalesces concurrent calls that compute a value for the same key.
+
+    While a value for a key is being computed, further calls for the
+    same key do not compute it again, but wait for the pending call
+    and share its value or its error.
+
+    Optionally, the values of the most recently completed calls are
+    retained, so that closely following calls for the same key share
+    them too.
+
+    :param retain: Number of most recently computed values retained.
+    """
+
+    def __init__(self, retain: int = 0):
+        assert_instance(retain, int, name="retain")
+        assert_true(retain >= 0, message="retain must be greater or equal zero")
+        self._retain = retain
+        self._calls: Dict[KT, _Call[VT]] = {}
+        self._values: collections.OrderedDict[KT, VT] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def retain(self) -> int:
+        return self._retain
+
+    def do(self, key: KT, compute_value: Callable[[], VT]) -> VT:
+        """Get the value for *key*.
+        The value is computed by *compute_value*, unless it is
+        retained or already being computed by another call.
+        """
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                return self._values[key]
+            call = self._calls.get(key)
+            if call is not None:
+                is_leader = False
+            else:
+                is_leader = True
+                call = self._calls[key] = _Call[VT]()
+        if not is_leader:
+            return call.wait()
+        try:
+            value = compute_value()
+        except BaseException as error:
+            with self._lock:
+                del self._calls[key]
+            call.set_error(error)
+            raise
+        with self._lock:
+            del self._calls[key]
+            if self._retain:
+                self._values[key] = value
+                while len(self._values) > self._retain:
+                    self._values.popitem(last=False)
+        call.set_value(value)
+        return value
+
+    def forget(self, key: KT):
+        """Forget the retained value for *key*, if any."""
+        with self._lock:
+            self._values.pop(key, None)
+
+    def clear(self):
+        """Forget all retained values."""
+        with self._lock:
+            self._values.clear()
+
+
+class _Call(Generic[VT]):
+    """A pending call of :class:SingleFlight."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._value: VT | None = None
+        self._error: BaseException | None = None
+
+    def set_value(self, value: VT):
+        self._value = value
+        self._event.set()
+
+    def set_error(self, error: BaseException):
+        self._error = error
+        self._event.set()
+
+    def wait(self) -> VT:
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+def new_default_codec() -> numcodecs.abc.Codec:
+    """Create the default codec of :class:CompressedArrayCache,
+    Blosc using zstd with byte shuffling.
+    """
+    return numcodecs.Blosc(cname="zstd", clevel=3, shuffle=numcodecs.Blosc.SHUFFLE)
+
+
+class CompressedArray:
+    """A numpy array held in compressed form.
+
+    :param array: The array to be compressed.
+    :param codec: The codec used for compression.
+    """
+
+    def __init__(self, array: np.ndarray, codec: numcodecs.abc.Codec):
+        self._shape = array.shape
+        self._dtype = array.dtype
+        self._codec = codec
+        self._data = codec.encode(np.ascontiguousarray(array))
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @property
+    def nbytes(self) -> int:
+        """Number of compressed bytes."""
+        return len(self._data)
+
+    def decompress(self) -> np.ndarray:
+        """Get a new, decompressed copy of the array."""
+        array = np.empty(self._shape, dtype=self._dtype)
+        if array.size > 0:
+            self._codec.decode(self._data, out=array)
+        return array
+
+
+class CompressedArrayCache(Generic[KT], NotSerializable):
+    """A thread-safe LRU cache that holds numpy arrays in compressed form.
+    It is bounded by the total number of compressed bytes.
+    Arrays are compressed when put and decompressed on every hit.
+
+    :param max_bytes: Maximum number of compressed bytes.
+    :param codec: Optional codec used for compression,
+        defaults to :func:new_default_codec.
+    """
+
+    def __init__(self, max_bytes: int, codec: Optional[numcodecs.abc.Codec] = None):
+        self._codec = codec if codec is not None else new_default_codec()
+        self._cache = LruCache[KT, CompressedArray](
+            max_size=sys.maxsize, max_bytes=max_bytes
+        )
+
+    @property
+    def max_bytes(self) -> int:
+        return self._cache.max_bytes
+
+    @property
+    def nbytes(self) -> int:
+        """Total number of compressed bytes held."""
+        return self._cache.nbytes
+
+    @property
+    def size(self) -> int:
+        return self._cache.size
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Counters of this cache, see :attr:LruCache.stats."""
+        return self._cache.stats
+
+    def get(self, key: KT) -> Optional[np.ndarray]:
+        """Get a decompressed copy of the array for *key*,
+        or None, if there is no such array.
+        """
+        compressed_array = self._cache.get(key)
+        if compressed_array is None:
+            return None
+        return compressed_array.decompress()
+
+    def put(self, key: KT, array: np.ndarray):
+        """Compress and put the given *array*."""
+        self._cache.put(key, CompressedArray(array, self._codec))
+
+    def clear(self):
+        self._cache.clear()
+
+
+# Default maximum number of bytes of the buffers pooled by a BufferPool
+DEFAULT_BUFFER_POOL_BYTES = 512 * 1024 * 1024
+
+
+class BufferPool(NotSerializable):
+    """A thread-safe pool of reusable numpy arrays.
+
+    Buffers are pooled by shape and data type. For mapped rasters
+    the shape is determined by the resolution level, so buffers are
+    effectively pooled per level and data type.
+
+    The memory of a pooled buffer is handed out as a new array.
+    Views of that array, including views of views, refer to it as
+    their base. A weak reference finalizer of the array returns the
+    memory to the pool, once the array and all its views are gone.
+
+    If all pooled buffers of a shape and data type are in use and
+    a limit is reached, a new, unpooled buffer is allocated.
+
+    :param max_size: Maximum number of buffers pooled per
+        shape and data type.
+    :param max_bytes: Maximum number of bytes of all pooled buffers,
+        whether in use or not. Buffers not in use are dropped to
+        make room for buffers of other shapes and data types.
+        If None, the number of bytes is not limited.
+    """
+
+    def __init__(
+        self, max_size: int = 4, max_bytes: Optional[int] = DEFAULT_BUFFER_POOL_BYTES
+    ):
+        assert_instance(max_size, int, name="max_size")
+        assert_true(max_size >= 0, message="max_size must be greater or equal zero")
+        if max_bytes is not None:
+            assert_instance(max_bytes, int, name="max_bytes")
+            assert_true(
+                max_bytes >= 0, message="max_bytes must be greater or equal zero"
+            )
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+        # Memory of the pooled buffers not in use
+        self._free: Dict[Tuple[Tuple[int, ...], np.dtype], list[bytearray]] = {}
+        # Number of pooled buffers, whether in use or not
+        self._counts: Dict[Tuple[Tuple[int, ...], np.dtype], int] = {}
+        self._nbytes = 0
+        # Incremented by clear(), so that buffers in use are not returned
+        self._generation = 0
+        # Reentrant, because finalizers may run whenever objects are freed
+        self._lock = threading.RLock()
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def max_bytes(self) -> Optional[int]:
+        return self._max_bytes
+
+    @property
+    def size(self) -> int:
+        """Total number of pooled buffers, whether in use or not."""
+        with self._lock:
+            return sum(self._counts.values())
+
+    @property
+    def nbytes(self) -> int:
+        """Total number of bytes of pooled buffers, whether in use or not."""
+        return self._nbytes
+
+    def acquire(self, shape: Tuple[int, ...], dtype: np.dtype) -> np.ndarray:
+        """Get an uninitialized buffer of given *shape* and *dtype*.
+        The buffer is returned to the pool, once neither the buffer
+        nor any view of it is referenced anymore.
+        """
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        key = shape, dtype
+        nbytes = math.prod(shape) * dtype.itemsize
+        memory = None
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                memory = free.pop()
+            elif (
+                0 < nbytes
+                and self._counts.get(key, 0) < self._max_size
+                and (self._max_bytes is None or nbytes <= self._max_bytes)
+            ):
+                self._drop_free(nbytes)
+                if self._max_bytes is None or self._nbytes + nbytes <= self._max_bytes:
+                    memory = bytearray(nbytes)
+                    self._counts[key] = self._counts.get(key, 0) + 1
+                    self._nbytes += nbytes
+            generation = self._generation
+        if memory is None:
+            return np.empty(shape, dtype=dtype)
+        buffer = np.frombuffer(memory, dtype=dtype)
+        finalizer = weakref.finalize(buffer, self._release, key, memory, generation)
+        finalizer.atexit = False
+        return buffer.reshape(shape)
+
+    def clear(self):
+        """Release all pooled buffers. Buffers in use are
+        no longer returned to the pool.
+        """
+        with self._lock:
+            self._free.clear()
+            self._counts.clear()
+            self._nbytes = 0
+            self._generation += 1
+
+    def _release(
+        self, key: Tuple[Tuple[int, ...], np.dtype], memory: bytearray, generation: int
+    ):
+        with self._lock:
+            if generation == self._generation:
+                self._free.setdefault(key, []).append(memory)
+
+    def _drop_free(self, nbytes: int):
+        """Drop buffers not in use, until *nbytes* more bytes fit."""
+        if self._max_bytes is None:
+            return
+        for key, free in list(self._free.items()):
+            while free and self._nbytes + nbytes > self._max_bytes:
+                free.pop()
+                self._counts[key] -= 1
+                self._nbytes -= math.prod(key[0]) * key[1].itemsize
+            if self._nbytes + nbytes <= self._max_bytes:
+                return
+
+
 TimestampLike = Union[pd.Timestamp, str]
 MIN_DATE = pd.Timestamp("2010-01-01 00:00:00", tz="UTC")
 MAX_DATE = pd.Timestamp("2100-01-01 00:00:00", tz="UTC")
@@ -163,7 +613,7 @@ ALMOST_ONE_DAY = pd.Timedelta("1D") - pd.Timedelta("1us")
 
 
 def normalize_time_range(
-    time_range: Tuple[Optional[TimestampLike], Optional[TimestampLike]]
+    time_range: Tuple[Optional[TimestampLike], Optional[TimestampLike]],
 ) -> Tuple[pd.Timestamp, pd.Timestamp]:
     """Normalize timestamp-like object pair into a pair of timestamps.
 